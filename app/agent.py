@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+import json
 import os
+import time
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional
-from .schemas import ClassifyLoteRequest, ClassifyLoteResponse, ClassifyLoteItemResponse
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from .schemas import ClassifyLoteRequest, ClassifyLoteResponse, ClassifyLoteItemResponse, ClassifyLoteItem
+from .schemas import SimplesCarteiraRequest, SimplesCarteiraResponse, SimplesCarteiraItem, SimplesResultado
+from .schemas import ConverterRequest, ConverterResponse
+from .schemas import SimulacaoRequest, SimulacaoResponse, SimulacaoItem, SimulacaoCelula
+from .schemas import AuditoriaRequest
+from .schemas import NcmBuscaItem, NcmBuscaResponse, SugestaoNcm, SugestaoNcmCandidato
+from .schemas import RevisaoLLM
 
 from .schemas import (
     ClassifyRequest,
@@ -30,37 +38,112 @@ from .schemas import (
     TotaisEstorno,
     ISTags,
 )
-from .rules import load_sources, classify, norm_ncm
-from .cache import TTLCache, make_cache_key
+from .rules import load_sources, classify, classify_anos, norm_code, norm_ncm, transicao_por_ano
+from .fiscal_simples import FaixaSimples, ResultadoSimples, is_simples, norm_anexo
+from .auditoria import CatalogoNcm, auditar_catalogo
+from .cache import SingleFlight, SQLiteCache, TTLCache, data_version, make_cache_key
+from .revisao_llm import RevisorLLM, revisor_from_env
+from .trilha import TrilhaAuditoria
+from .warmup import KeyLogRecorder, em_warmup
+from . import metrics
+
+# código que decide a classificação (e a carga das tabelas): entra na versão do
+# L2 junto com os CSVs, para um deploy de regra nova não servir decisão antiga
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CODIGO_DECISAO = tuple(
+    os.path.join(_APP_DIR, nome)
+    for nome in ("agent.py", "rules.py", "records.py", "loader.py", "fiscal_simples.py", "fiscal_conversao.py")
+)
+
+
+def _round_money(v):
+    if v is None:
+        return None
+    return round(float(v), 2)
+
+
+def _round_rate(v, ndigits: int = 6):
+    if v is None:
+        return None
+    return round(float(v), ndigits)
 
 
 class CClastribAgent:
-    def __init__(self, data_anexos_dir: str, cache_ttl_seconds: int = 3600):
+    def __init__(self, data_anexos_dir: str, cache_ttl_seconds: int = 3600, l2_path: Optional[str] = None):
         self.data_anexos_dir = data_anexos_dir
         self._cache = TTLCache(default_ttl_seconds=cache_ttl_seconds)
         self._sources = load_sources(data_anexos_dir)
+        self._catalogo: Optional[CatalogoNcm] = None
+        self._inflight = SingleFlight()
+        # grava as chaves novas para o warm-up da próxima subida (WARMUP_RECORD)
+        self.keylog: Optional[KeyLogRecorder] = None
+        # L2 em disco compartilhado entre workers/restarts (CACHE_L2_PATH)
+        self._l2: Optional[SQLiteCache] = None
+        if l2_path:
+            self._l2 = SQLiteCache(l2_path, self._data_version(), default_ttl_seconds=cache_ttl_seconds)
+        # trilha de auditoria das decisões (AUDIT_LOG); ligada por quem cria o agente
+        self.trilha: Optional[TrilhaAuditoria] = None
+        # revisão por LLM dos resultados de baixa confiança (LLM_BACKEND; None = desligada)
+        self.revisor: Optional[RevisorLLM] = revisor_from_env()
 
     def reload_sources(self) -> None:
         self._sources = load_sources(self.data_anexos_dir)
+        self._catalogo = None
         self._cache.clear()
+        if self._l2 is not None or self.trilha is not None:
+            versao = self._data_version()
+            if self._l2 is not None:
+                # CSVs iguais -> mesma versão e o L2 continua valendo
+                self._l2.version = versao
+            if self.trilha is not None:
+                self.trilha.versao_dados = versao
+
+    def materializar_fontes(self) -> None:
+        # carrega já as tabelas sob demanda (pre-fork: antes do fork dos workers)
+        self._sources.materializar()
+
+    def _data_version(self) -> str:
+        # mesmas pastas lidas pelo load_sources + código das regras + schema da resposta guardada no L2
+        base = os.path.join(self.data_anexos_dir, os.pardir)
+        schema = json.dumps(ClassifyResponse.model_json_schema(), sort_keys=True)
+        return data_version(
+            [self.data_anexos_dir, os.path.join(base, "simples"), os.path.join(base, "conversao"), *CODIGO_DECISAO],
+            schema,
+        )
 
-    def handle(self, req: ClassifyRequest) -> ClassifyResponse:
-        # Se você manda ano_emissao, use ele SEMPRE
-        # Data de emissão SEMPRE vem do ano_emissao
-        if req.ano_emissao:
-            data_emissao = date(int(req.ano_emissao), 1, 1)
-        else:
-            data_emissao = date.today()
-
-        ncm_digits = norm_ncm(req.ncm)
-        produzido_zfm = (req.produzido_zfm or "").strip().upper() == "S"
-        emitente_zfm = (req.emitente_zona_franca_manaus or "").strip().upper() == "S"
-        destinatario_zfm = (req.destinatario_zona_franca_manaus or "").strip().upper() == "S"
-        fornecimento_alimentacao = bool(req.fornecimento_alimentacao)
-
-        cadastro_suframa_emitente = (req.cadastro_suframa_emitente or "").strip()
-        cadastro_suframa_destinatario = (req.cadastro_suframa_destinatario or "").strip()
-
+    def _cache_get(self, cache_key: str) -> Optional[ClassifyResponse]:
+        # L1 (memória do worker) e, na falta, L2 (disco)
+        cached = self._cache.get(cache_key)
+        if cached is not None or self._l2 is None:
+            return cached
+        raw = self._l2.get(cache_key)
+        return self._l2_carrega({cache_key: raw} if raw is not None else {}, [cache_key]).get(cache_key)
+
+    def _l2_carrega(self, achados: Dict[str, str], pedidas: List[str]) -> Dict[str, ClassifyResponse]:
+        """
+        Desserializa os hits do L2 e promove para o L1.
+        """
+        out: Dict[str, ClassifyResponse] = {}
+        for key in pedidas:
+            raw = achados.get(key)
+            if raw is None:
+                metrics.CACHE_L2_TOTAL.inc("miss")
+                continue
+            try:
+                resp = ClassifyResponse.model_validate_json(raw)
+            except ValueError:
+                metrics.CACHE_L2_TOTAL.inc("erro")
+                continue
+            metrics.CACHE_L2_TOTAL.inc("hit")
+            self._cache.set(key, resp)
+            out[key] = resp
+        return out
+
+    @staticmethod
+    def _classify_args(req: ClassifyRequest) -> Dict[str, Any]:
+        """
+        Argumentos nomeados do classify (exceto data_emissao) a partir da requisição.
+        """
         def parse_sn(value: Optional[str]) -> Optional[bool]:
             if value is None:
                 return None
@@ -68,18 +151,63 @@ class CClastribAgent:
                 return value
             return str(value).strip().upper() == "S"
 
-        cadastro_suframa_emitente_ativo = parse_sn(req.cadastro_suframa_emitente_ativo)
-        cadastro_suframa_destinatario_ativo = parse_sn(req.cadastro_suframa_destinatario_ativo)
-
-        def round_money(v):
-            if v is None:
-                return None
-            return round(float(v), 2)
+        return {
+            "regime": req.regime_fiscal_emitente,
+            "cfop": req.cfop,
+            "uf_emit": req.uf_emitente,
+            "uf_dest": req.uf_destinatario,
+            "cst_icms": req.cst_icms,
+            "ncm": req.ncm,
+            "compra_gov": bool(req.compra_governo),
+            "ind_doacao": bool(req.ind_doacao),
+            "produzido_zfm": (req.produzido_zfm or "").strip().upper() == "S",
+            "emitente_zfm": (req.emitente_zona_franca_manaus or "").strip().upper() == "S",
+            "destinatario_zfm": (req.destinatario_zona_franca_manaus or "").strip().upper() == "S",
+            "cadastro_suframa_emitente": (req.cadastro_suframa_emitente or "").strip(),
+            "cadastro_suframa_emitente_ativo": parse_sn(req.cadastro_suframa_emitente_ativo),
+            "cadastro_suframa_destinatario": (req.cadastro_suframa_destinatario or "").strip(),
+            "cadastro_suframa_destinatario_ativo": parse_sn(req.cadastro_suframa_destinatario_ativo),
+            "cod_municipio_destinatario": req.cod_municipio_destinatario,
+            "fornecimento_alimentacao": bool(req.fornecimento_alimentacao),
+            "anexo_simples": req.anexo_simples,
+            "rbt12": req.rbt12,
+        }
+
+    def _cache_key(self, req: ClassifyRequest) -> Tuple[str, date, Dict[str, Any], Optional[FaixaSimples]]:
+        """
+        Chave fiscal da requisição + o que o handle precisa para classificar
+        (data de emissão, argumentos do classify e faixa do Simples).
+        """
+        # Se você manda ano_emissao, use ele SEMPRE
+        # Data de emissão SEMPRE vem do ano_emissao
+        if req.ano_emissao:
+            data_emissao = date(int(req.ano_emissao), 1, 1)
+        else:
+            data_emissao = date.today()
 
-        def round_rate(v, ndigits: int = 6):
-            if v is None:
-                return None
-            return round(float(v), ndigits)
+        ncm_digits = norm_ncm(req.ncm)
+        args = self._classify_args(req)
+        produzido_zfm = args["produzido_zfm"]
+        emitente_zfm = args["emitente_zfm"]
+        destinatario_zfm = args["destinatario_zfm"]
+        fornecimento_alimentacao = args["fornecimento_alimentacao"]
+        cadastro_suframa_emitente = args["cadastro_suframa_emitente"]
+        cadastro_suframa_destinatario = args["cadastro_suframa_destinatario"]
+        cadastro_suframa_emitente_ativo = args["cadastro_suframa_emitente_ativo"]
+        cadastro_suframa_destinatario_ativo = args["cadastro_suframa_destinatario_ativo"]
+
+        # Simples Nacional: a resposta é cacheada por (anexo, faixa da RBT12);
+        # a alíquota efetiva, que depende da RBT12 exata, é recalculada a cada chamada
+        simples_faixa: Optional[FaixaSimples] = None
+        simples_key = "NOSN"
+        if is_simples(req.regime_fiscal_emitente):
+            anexo_sn = norm_anexo(req.anexo_simples)
+            if self._sources.simples is not None and anexo_sn and req.rbt12 is not None:
+                simples_faixa = self._sources.simples.faixa(anexo_sn, data_emissao.year, req.rbt12)
+            if simples_faixa is not None:
+                simples_key = f"SN_{simples_faixa.anexo}_{simples_faixa.faixa}"
+            else:
+                simples_key = f"SN_{anexo_sn or 'NA'}_{'NA' if req.rbt12 is None else 'FORA'}"
 
         cache_key = make_cache_key(
             req.regime_fiscal_emitente,
@@ -97,33 +225,78 @@ class CClastribAgent:
             f"SUFE_{'P' if cadastro_suframa_emitente else 'NP'}_{'AT' if cadastro_suframa_emitente_ativo else 'IN' if cadastro_suframa_emitente_ativo is False else 'NA'}",
             f"SUFD_{'P' if cadastro_suframa_destinatario else 'NP'}_{'AT' if cadastro_suframa_destinatario_ativo else 'IN' if cadastro_suframa_destinatario_ativo is False else 'NA'}",
             "ALIM" if fornecimento_alimentacao else "NOALIM",
+            simples_key,
         )
+        return cache_key, data_emissao, args, simples_faixa
 
+    def handle(self, req: ClassifyRequest) -> ClassifyResponse:
+        return self._handle(req)
+
+    def ligar_trilha(self, trilha: Optional[TrilhaAuditoria] = None) -> Optional[TrilhaAuditoria]:
+        """
+        Liga a trilha de auditoria (default: AUDIT_LOG do ambiente) com a versão atual dos dados.
+        """
+        trilha = trilha or TrilhaAuditoria.from_env()
+        if trilha is not None:
+            trilha.versao_dados = self._l2.version if self._l2 is not None else self._data_version()
+        self.trilha = trilha
+        return trilha
+
+    def _handle(
+        self,
+        req: ClassifyRequest,
+        l2_pendentes: Optional[List[Tuple[str, str]]] = None,
+    ) -> ClassifyResponse:
+        """
+        Com l2_pendentes (lote), as respostas novas são acumuladas ali para
+        uma única escrita no L2 no fim do lote.
+        """
+        cache_key, data_emissao, args, simples_faixa = self._cache_key(req)
+
+        # no lote o L2 já foi consultado em bloco antes
+        cached = self._cache.get(cache_key) if l2_pendentes is not None else self._cache_get(cache_key)
+        if cached:
+            metrics.CACHE_TOTAL.inc("hit")
+            resp = self._com_valores(self._com_simples(cached, simples_faixa, req.rbt12), req)
+            return self._auditar(req, resp, "cache")
+        metrics.CACHE_TOTAL.inc("miss")
+        if self.keylog is not None:
+            self.keylog.record(cache_key, req)
+
+        # misses simultâneos da mesma chave (nota fanned-out pelo ERP) esperam uma única classificação
+        resp, coalescida = self._inflight.do(
+            cache_key, lambda: self._build(req, cache_key, data_emissao, args, l2_pendentes)
+        )
+        if coalescida:
+            metrics.COALESCED_TOTAL.inc()
+        resp = self._com_valores(self._com_simples(resp, simples_faixa, req.rbt12), req)
+        return self._auditar(req, resp, "classificada")
+
+    def _auditar(self, req: ClassifyRequest, resp: ClassifyResponse, origem: str) -> ClassifyResponse:
+        # só enfileira; quem monta e grava o registro é a thread da trilha
+        if self.trilha is not None and not em_warmup():
+            self.trilha.registrar(req, resp, origem)
+        return resp
+
+    def _build(
+        self,
+        req: ClassifyRequest,
+        cache_key: str,
+        data_emissao: date,
+        args: Dict[str, Any],
+        l2_pendentes: Optional[List[Tuple[str, str]]],
+    ) -> ClassifyResponse:
+        """
+        Classifica, monta o molde da resposta (sem os valores do documento) e grava no L1 (e no L2).
+        """
+        # a chamada anterior da mesma chave pode ter terminado entre o miss e o single-flight
         cached = self._cache.get(cache_key)
         if cached:
             return cached
 
-        result = classify(
-            self._sources,
-            regime=req.regime_fiscal_emitente,
-            cfop=req.cfop,
-            uf_emit=req.uf_emitente,
-            uf_dest=req.uf_destinatario,
-            cst_icms=req.cst_icms,
-            ncm=req.ncm,
-            data_emissao=data_emissao,
-            compra_gov=bool(req.compra_governo),
-            ind_doacao=bool(req.ind_doacao),
-            produzido_zfm=produzido_zfm,
-            emitente_zfm=emitente_zfm,
-            destinatario_zfm=destinatario_zfm,
-            cadastro_suframa_emitente=cadastro_suframa_emitente,
-            cadastro_suframa_emitente_ativo=cadastro_suframa_emitente_ativo,
-            cadastro_suframa_destinatario=cadastro_suframa_destinatario,
-            cadastro_suframa_destinatario_ativo=cadastro_suframa_destinatario_ativo,
-            cod_municipio_destinatario=req.cod_municipio_destinatario,
-            fornecimento_alimentacao=fornecimento_alimentacao,
-        )
+        t = time.perf_counter()
+        result = classify(self._sources, data_emissao=data_emissao, **args)
+        t = metrics.lap("classify", t)
 
         # -------------------------
         # Monta fundamentos estruturados
@@ -135,8 +308,8 @@ class CClastribAgent:
         # Aliquotas em base decimal (ex: 0.001). Mantemos para calculo, mas devolvemos em percentual (ex: 0.1).
         aliq_ibs_base = result["ibs"]["aliquota"]
         aliq_cbs_base = result["cbs"]["aliquota"]
-        aliq_ibs_exibicao = round_rate((aliq_ibs_base * 100.0) if aliq_ibs_base is not None else None)
-        aliq_cbs_exibicao = round_rate((aliq_cbs_base * 100.0) if aliq_cbs_base is not None else None)
+        aliq_ibs_exibicao = _round_rate((aliq_ibs_base * 100.0) if aliq_ibs_base is not None else None)
+        aliq_cbs_exibicao = _round_rate((aliq_cbs_base * 100.0) if aliq_cbs_base is not None else None)
 
         cclastrib = BlocoResultado(
             codigo=result["cclastrib"]["codigo"],
@@ -173,36 +346,17 @@ class CClastribAgent:
         )
 
         # -------------------------
-        # Monta payload "XML"
+        # Monta payload "XML" (só o que a chave determina; valores e ecos do
+        # documento entram em _com_valores, a cada chamada)
         # -------------------------
-        beneficio_zfm_ibs_zero = bool(result.get("beneficio_zfm_ibs_zero"))
-        tp_nf_debito = "tdNenhum" if beneficio_zfm_ibs_zero else "tdIntegral"
-
         ide = IdeTags(
             dPrevEntrega=(data_emissao + timedelta(days=10)).isoformat(),
-            cMunFGIBS=req.cod_municipio_fg_ibs,
-            tpNFDebito=tp_nf_debito,
             tpNFCredito="tcNenhum",
             gCompraGov=(
                 IdeCompraGov(tpEnteGov="tcgEstados", pRedutor=5, tpOperGov="togFornecimento")
                 if req.compra_governo
                 else None
             ),
-            gPagAntecipado=[IdePagAntecipado(refNFe=x) for x in (req.refs_pag_antecipado or [])],
-        )
-
-        dfe_ref = None
-        ch = (req.dfe_referenciado_chave or "").strip()
-        if ch:
-            dfe_ref = DFeReferenciado(
-                chaveAcesso=ch,
-                nItem=req.dfe_referenciado_nitem or 1,
-            )
-
-        produto = ProdutoTags(
-            indBemMovelUsado="tieNenhum",
-            vItem=round_money(req.valor_item),
-            DFeReferenciado=dfe_ref,
         )
 
         # IBS/CBS: preenche CST/cClassTrib e alíquotas em gIBSCBS
@@ -211,41 +365,16 @@ class CClastribAgent:
 
         ind_doacao_tag = "tieSim" if req.ind_doacao else "tieNao"
 
-        # Base de cálculo e valores (se valor_item vier)
-        vbc = float(req.valor_item) if req.valor_item is not None else None
-        vbc = round_money(vbc)
-        p_ibs = round_rate(float(aliq_ibs_base) * 100.0 if aliq_ibs_base is not None else None)
-        p_cbs = round_rate(float(aliq_cbs_base) * 100.0 if aliq_cbs_base is not None else None)
-
-        v_ibs = (vbc * (p_ibs / 100.0)) if (vbc is not None and p_ibs is not None) else None
-        v_cbs = (vbc * (p_cbs / 100.0)) if (vbc is not None and p_cbs is not None) else None
-        v_ibs = round_money(v_ibs)
-        v_cbs = round_money(v_cbs)
-
-        total_debito = sum(
-            v for v in [v_ibs, v_cbs]
-            if v is not None
-        ) if (v_ibs is not None or v_cbs is not None) else 0.0
-        total_credito = 0.0
-
-        g_ibscbs = GIBSCBS(
-            vBC=vbc,
-            gIBSUF=IBSUF(pIBSUF=p_ibs, vIBSUF=v_ibs),
-            gIBSMun=IBSMun(pIBSMun=None, vIBSMun=None),
-            vIBS=v_ibs,  # se você quiser dividir UF/Mun, ajuste aqui
-            gCBS=CBS(pCBS=p_cbs, vCBS=v_cbs),
-            gTribRegular=None,
-            gTribCompraGov=None,
-        )
+        p_ibs = _round_rate(float(aliq_ibs_base) * 100.0 if aliq_ibs_base is not None else None)
+        p_cbs = _round_rate(float(aliq_cbs_base) * 100.0 if aliq_cbs_base is not None else None)
 
         ibscbs_tags = IBSCBSTags(
             CST=cst_ibs_cbs,          # "000"
             cClassTrib=cclass_trib,   # "000001"
             indDoacao=ind_doacao_tag,
-            gIBSCBS=g_ibscbs,
+            gIBSCBS=GIBSCBS(gIBSUF=IBSUF(pIBSUF=p_ibs), gCBS=CBS(pCBS=p_cbs)),
         )
 
-
         # IS (se aplicável)
         isel = None
         if result["flags"].get("aplicar_is"):
@@ -253,15 +382,115 @@ class CClastribAgent:
             isel = ISTags(
                 CSTIS="cstis000",
                 cClassTribIS="000001",
-                vBCIS=vbc,
                 pIS=5.0,
                 pISEspec=5.0,
                 uTrib="UNIDAD",
                 qTrib=1.0,
-                vIS=(vbc * 0.05) if vbc is not None else None,
             )
 
-        imposto = ImpostoTags(isel=isel, ibscbs=ibscbs_tags)
+        xml_payload = XmlPayload(
+            ide=ide,
+            produto=ProdutoTags(indBemMovelUsado="tieNenhum"),
+            imposto=ImpostoTags(isel=isel, ibscbs=ibscbs_tags),
+            totais=TotaisTags(),
+        )
+
+        resp = ClassifyResponse(
+            cclastrib=cclastrib,
+            ibs=ibs,
+            cbs=cbs,
+            cst_ibs_cbs=cst_ibs_cbs,
+            cclass_trib=cclass_trib,
+            cfop_venda_industrializado=result.get("cfop_venda_industrializado"),
+            emitente_zfm=result.get("emitente_zfm"),
+            destinatario_zfm=result.get("destinatario_zfm"),
+            cadastro_suframa_emitente=result.get("cadastro_suframa_emitente"),
+            cadastro_suframa_emitente_ativo=result.get("cadastro_suframa_emitente_ativo"),
+            cadastro_suframa_destinatario=result.get("cadastro_suframa_destinatario"),
+            cadastro_suframa_destinatario_ativo=result.get("cadastro_suframa_destinatario_ativo"),
+            produzido_emitente=result.get("produzido_emitente"),
+            beneficio_zfm_ibs_zero=result.get("beneficio_zfm_ibs_zero"),
+            ncm_beneficiado_zfm=result.get("ncm_beneficiado_zfm"),
+            confianca=result["confianca"],
+            alertas=result.get("alertas", []),
+            pendencias=result.get("pendencias", []),
+            xml=xml_payload,
+            fundamentos_gerais=fundamentos_gerais,
+        )
+
+        metrics.lap("build_response", t)
+        self._cache.set(cache_key, resp)
+        if self._l2 is not None:
+            if l2_pendentes is not None:
+                l2_pendentes.append((cache_key, resp.model_dump_json()))
+            else:
+                self._l2.set(cache_key, resp.model_dump_json())
+        return resp
+
+    @staticmethod
+    def _simples_resultado(res: ResultadoSimples) -> SimplesResultado:
+        # percentuais, como ibs/cbs
+        return SimplesResultado(
+            anexo=res.anexo,
+            faixa=res.faixa,
+            receita_inicial=res.receita_inicial,
+            receita_final=res.receita_final,
+            aliquota_nominal=round(res.aliquota_nominal * 100.0, 6),
+            valor_deduzir=res.valor_deduzir,
+            aliquota_efetiva=round(res.aliquota_efetiva * 100.0, 6),
+        )
+
+    def _com_simples(
+        self,
+        resp: ClassifyResponse,
+        faixa: Optional[FaixaSimples],
+        rbt12: Optional[float],
+    ) -> ClassifyResponse:
+        if faixa is None or rbt12 is None:
+            return resp
+        return resp.model_copy(update={"simples": self._simples_resultado(faixa.resultado(rbt12))})
+
+    @staticmethod
+    def _com_valores(resp: ClassifyResponse, req: ClassifyRequest) -> ClassifyResponse:
+        """
+        Preenche, sobre a classificação cacheada, o que vem do documento: valor
+        do item (base, valores, totais) e os ecos (município, DF-e, pagamentos
+        antecipados). A chave de cache não inclui esses campos, então o L1/L2
+        guardam só o molde e o valor é recalculado a cada chamada.
+        """
+        xml = resp.xml
+        ibscbs = xml.imposto.ibscbs
+        p_ibs = ibscbs.gIBSCBS.gIBSUF.pIBSUF
+        p_cbs = ibscbs.gIBSCBS.gCBS.pCBS
+
+        # Base de cálculo e valores (se valor_item vier)
+        vbc = _round_money(req.valor_item)
+        v_ibs = _round_money(vbc * (p_ibs / 100.0)) if (vbc is not None and p_ibs is not None) else None
+        v_cbs = _round_money(vbc * (p_cbs / 100.0)) if (vbc is not None and p_cbs is not None) else None
+
+        total_debito = sum(
+            v for v in [v_ibs, v_cbs]
+            if v is not None
+        ) if (v_ibs is not None or v_cbs is not None) else 0.0
+        total_credito = 0.0
+
+        g_ibscbs = GIBSCBS(
+            vBC=vbc,
+            gIBSUF=IBSUF(pIBSUF=p_ibs, vIBSUF=v_ibs),
+            gIBSMun=IBSMun(pIBSMun=None, vIBSMun=None),
+            vIBS=v_ibs,  # se você quiser dividir UF/Mun, ajuste aqui
+            gCBS=CBS(pCBS=p_cbs, vCBS=v_cbs),
+            gTribRegular=None,
+            gTribCompraGov=None,
+        )
+
+        isel = xml.imposto.isel
+        if isel is not None:
+            isel = isel.model_copy(update={
+                "vBCIS": vbc,
+                "vIS": _round_money(vbc * 0.05) if vbc is not None else None,
+            })
+        v_is = isel.vIS if isel else None
 
         # Totais (mínimos coerentes)
         ibscbs_tot = IBSCBSTotTags(
@@ -284,10 +513,6 @@ class CClastribAgent:
             gEstornoCred=TotaisEstorno(),
         )
 
-        if isel:
-            isel.vBCIS = round_money(isel.vBCIS)
-            isel.vIS = round_money(isel.vIS)
-        v_is = isel.vIS if isel else None
         v_nf_tot = None
         if vbc is not None:
             v_nf_tot = vbc
@@ -297,96 +522,106 @@ class CClastribAgent:
                 v_nf_tot += v_cbs
             if v_is is not None:
                 v_nf_tot += v_is
-            v_nf_tot = round_money(v_nf_tot)
+            v_nf_tot = _round_money(v_nf_tot)
 
-        totais = TotaisTags(
-            isTot_vIS=v_is,
-            ibscbsTot=ibscbs_tot,
-            vNFTot=v_nf_tot,
-        )
+        dfe_ref = None
+        ch = (req.dfe_referenciado_chave or "").strip()
+        if ch:
+            dfe_ref = DFeReferenciado(
+                chaveAcesso=ch,
+                nItem=req.dfe_referenciado_nitem or 1,
+            )
 
-        beneficio_zfm_ibs_zero = bool(result.get("beneficio_zfm_ibs_zero"))
-        tp_nf_debito = "tdNenhum" if not total_debito or beneficio_zfm_ibs_zero else "tdIntegral"
+        tp_nf_debito = "tdNenhum" if not total_debito or resp.beneficio_zfm_ibs_zero else "tdIntegral"
         tp_nf_credito = "tcNenhum" if not total_credito else "tcIntegral"
 
         xml_payload = XmlPayload(
-            ide=IdeTags(
-                dPrevEntrega=ide.dPrevEntrega,
-                cMunFGIBS=ide.cMunFGIBS,
-                tpNFDebito=tp_nf_debito,
-                tpNFCredito=tp_nf_credito,
-                gCompraGov=ide.gCompraGov,
-                gPagAntecipado=ide.gPagAntecipado,
-            ),
-            produto=produto,
-            imposto=imposto,
-            totais=totais,
+            ide=xml.ide.model_copy(update={
+                "cMunFGIBS": req.cod_municipio_fg_ibs,
+                "tpNFDebito": tp_nf_debito,
+                "tpNFCredito": tp_nf_credito,
+                "gPagAntecipado": [IdePagAntecipado(refNFe=x) for x in (req.refs_pag_antecipado or [])],
+            }),
+            produto=xml.produto.model_copy(update={"vItem": vbc, "dfe_referenciado": dfe_ref}),
+            imposto=ImpostoTags(isel=isel, ibscbs=ibscbs.model_copy(update={"gIBSCBS": g_ibscbs})),
+            totais=TotaisTags(isTot_vIS=v_is, ibscbsTot=ibscbs_tot, vNFTot=v_nf_tot),
         )
-
-        resp = ClassifyResponse(
-            cclastrib=cclastrib,
-            ibs=ibs,
-            cbs=cbs,
-            cst_ibs_cbs=cst_ibs_cbs,
-            cclass_trib=cclass_trib,
-            cfop_venda_industrializado=result.get("cfop_venda_industrializado"),
-            emitente_zfm=result.get("emitente_zfm"),
-            destinatario_zfm=result.get("destinatario_zfm"),
-            cadastro_suframa_emitente=result.get("cadastro_suframa_emitente"),
-            cadastro_suframa_emitente_ativo=result.get("cadastro_suframa_emitente_ativo"),
-            cadastro_suframa_destinatario=result.get("cadastro_suframa_destinatario"),
-            cadastro_suframa_destinatario_ativo=result.get("cadastro_suframa_destinatario_ativo"),
-            produzido_emitente=result.get("produzido_emitente"),
-            beneficio_zfm_ibs_zero=result.get("beneficio_zfm_ibs_zero"),
-            ncm_beneficiado_zfm=result.get("ncm_beneficiado_zfm"),
-            total_debito=total_debito,
-            total_credito=total_credito,
-            confianca=result["confianca"],
-            alertas=result.get("alertas", []),
-            pendencias=result.get("pendencias", []),
-            xml=xml_payload,
-            fundamentos_gerais=fundamentos_gerais,
+        return resp.model_copy(update={
+            "total_debito": total_debito,
+            "total_credito": total_credito,
+            "xml": xml_payload,
+        })
+
+    def handle_simples_carteira(self, req: SimplesCarteiraRequest) -> SimplesCarteiraResponse:
+        engine = self._sources.simples
+        if engine is None:
+            raise RuntimeError("Tabelas do Simples Nacional não carregadas")
+        resultados = engine.calcular_carteira([(e.anexo, e.rbt12) for e in req.empresas], req.ano)
+        itens = [
+            SimplesCarteiraItem(
+                id=e.id,
+                anexo=e.anexo,
+                rbt12=e.rbt12,
+                resultado=self._simples_resultado(res) if res else None,
+                pendencia=None if res else "Anexo desconhecido ou RBT12 acima do limite do Simples Nacional",
+            )
+            for e, res in zip(req.empresas, resultados)
+        ]
+        return SimplesCarteiraResponse(ano=req.ano, empresas=itens)
+
+
+    def handle_converter(self, req: ConverterRequest) -> ConverterResponse:
+        engine = self._sources.conversao
+        if engine is None:
+            raise RuntimeError("Tabela de conversão (Anexo VII) não carregada")
+
+        fator = None
+        if req.anos is not None:
+            if len(req.anos) != len(req.valores):
+                raise ValueError("anos e valores devem ter o mesmo tamanho")
+            convertidos = engine.converter_por_ano(req.valores, req.anos, req.origem, req.destino, req.ano_base)
+        elif req.ano is not None:
+            fator = engine.fator(req.ano, req.origem, req.destino, req.ano_base)
+            convertidos = engine.converter(req.valores, req.ano, req.origem, req.destino, req.ano_base)
+        else:
+            raise ValueError("Informe ano ou anos")
+
+        # NaN (ano sem tabela / origem zerada) não existe em JSON
+        valores = [None if v != v else round(float(v), 6) for v in convertidos]
+        return ConverterResponse(
+            origem=req.origem.upper(),
+            destino=req.destino.upper(),
+            ano=req.ano if req.anos is None else None,
+            ano_base=req.ano_base,
+            fator=fator,
+            valores=valores,
         )
 
-        self._cache.set(cache_key, resp)
-        return resp
-    
-
     def handle_lote(self, req: ClassifyLoteRequest) -> ClassifyLoteResponse:
+        metrics.LOTE_ITENS.observe(len(req.itens), "/classificar-lote")
         resultados = []
+        reqs = [
+            self._item_request(req, item, self._valor_item(item), req.ano_emissao)
+            for item in req.itens
+        ]
 
-        for item in req.itens:
+        # L2: um SELECT para todas as chaves que faltam no L1 e um INSERT no fim
+        l2_pendentes: Optional[List[Tuple[str, str]]] = None
+        if self._l2 is not None:
+            l2_pendentes = []
+            faltam = list(dict.fromkeys(
+                k for k in (self._cache_key(r)[0] for r in reqs) if self._cache.get(k) is None
+            ))
+            if faltam:
+                self._l2_carrega(self._l2.get_many(faltam), faltam)
+
+        sugestoes = self._sugestoes_ncm(req.itens) if req.sugerir_ncm else [None] * len(req.itens)
+
+        for item, req_item, sugestao in zip(req.itens, reqs, sugestoes):
             quantidade = item.quantidade if item.quantidade is not None else 1
-            valor_item = item.valor_item
-            if valor_item is None and item.preco is not None and quantidade is not None:
-                valor_item = float(item.preco) * float(quantidade)
-
-            # Each item can have its own CFOP/CST, so use the item fields
-            req_item = ClassifyRequest(
-                ano_emissao=req.ano_emissao,
-                regime_fiscal_emitente=req.regime_fiscal_emitente,
-                cfop=item.cfop,
-                uf_emitente=req.uf_emitente,
-                uf_destinatario=req.uf_destinatario,
-                cst_icms=item.cst_icms,
-                cod_municipio_fg_ibs=req.cod_municipio_fg_ibs,
-                cod_municipio_destinatario=req.cod_municipio_destinatario,
-                emitente_zona_franca_manaus=req.emitente_zona_franca_manaus,
-                destinatario_zona_franca_manaus=req.destinatario_zona_franca_manaus,
-                cadastro_suframa_emitente=req.cadastro_suframa_emitente,
-                cadastro_suframa_emitente_ativo=req.cadastro_suframa_emitente_ativo,
-                cadastro_suframa_destinatario=req.cadastro_suframa_destinatario,
-                cadastro_suframa_destinatario_ativo=req.cadastro_suframa_destinatario_ativo,
-                compra_governo=req.compra_governo,
-                ind_doacao=req.ind_doacao,
-                produzido_zfm=item.produzido_zfm,
-                refs_pag_antecipado=req.refs_pag_antecipado,
-                ncm=item.ncm,
-                valor_item=valor_item,
-                fornecimento_alimentacao=req.fornecimento_alimentacao,
-            )
+            valor_item = req_item.valor_item
 
-            resultado = self.handle(req_item)
+            resultado = self._handle(req_item, l2_pendentes)
 
             resultados.append(
                 ClassifyLoteItemResponse(
@@ -401,11 +636,266 @@ class CClastribAgent:
                     cst_icms=item.cst_icms,
                     cfop=item.cfop,
                     produzido_zfm=item.produzido_zfm,
-                    resultado=resultado
+                    resultado=resultado,
+                    sugestao_ncm=sugestao,
                 )
             )
 
+        if l2_pendentes:
+            self._l2.set_many(l2_pendentes)
+
         return ClassifyLoteResponse(
             ano_emissao=req.ano_emissao,
             itens=resultados
         )
+
+    def sugestao_ncm_disponivel(self) -> bool:
+        # o índice exige numpy; no primeiro uso monta o índice (SobDemanda)
+        return self._sources.ncm_sugestor is not None
+
+    def _sugestoes_ncm(self, itens: List[ClassifyLoteItem]) -> List[Optional[SugestaoNcm]]:
+        """
+        Confere o NCM declarado de cada item com o deitem: o lote inteiro é
+        pontuado de uma vez (SugestorNcm.sugerir). Sem numpy, não há sugestão
+        (o endpoint recusa sugerir_ncm antes de chegar aqui).
+        """
+        sugestor = self._sources.ncm_sugestor
+        if sugestor is None:
+            return [None] * len(itens)
+        out: List[Optional[SugestaoNcm]] = []
+        for s in sugestor.sugerir([(item.deitem or "", item.ncm) for item in itens]):
+            if s is None:
+                metrics.NCM_SUGESTAO_TOTAL.inc("sem_descricao")
+                out.append(None)
+                continue
+            metrics.NCM_SUGESTAO_TOTAL.inc("divergente" if s.divergente else "confere")
+            out.append(SugestaoNcm(
+                divergente=s.divergente,
+                similaridade_declarado=s.similaridade_declarado,
+                candidatos=[
+                    SugestaoNcmCandidato(ncm=ncm, descricao=sugestor.descricao(ncm), similaridade=sim)
+                    for ncm, sim in s.candidatos
+                ],
+            ))
+        return out
+
+    @staticmethod
+    def _valor_item(item: ClassifyLoteItem) -> Optional[float]:
+        quantidade = item.quantidade if item.quantidade is not None else 1
+        valor_item = item.valor_item
+        if valor_item is None and item.preco is not None and quantidade is not None:
+            valor_item = float(item.preco) * float(quantidade)
+        return valor_item
+
+    @staticmethod
+    def _item_request(
+        req: ClassifyLoteRequest,
+        item: ClassifyLoteItem,
+        valor_item: Optional[float],
+        ano_emissao: int,
+    ) -> ClassifyRequest:
+        # Each item can have its own CFOP/CST, so use the item fields
+        return ClassifyRequest(
+            ano_emissao=ano_emissao,
+            regime_fiscal_emitente=req.regime_fiscal_emitente,
+            cfop=item.cfop,
+            uf_emitente=req.uf_emitente,
+            uf_destinatario=req.uf_destinatario,
+            cst_icms=item.cst_icms,
+            cod_municipio_fg_ibs=req.cod_municipio_fg_ibs,
+            cod_municipio_destinatario=req.cod_municipio_destinatario,
+            emitente_zona_franca_manaus=req.emitente_zona_franca_manaus,
+            destinatario_zona_franca_manaus=req.destinatario_zona_franca_manaus,
+            cadastro_suframa_emitente=req.cadastro_suframa_emitente,
+            cadastro_suframa_emitente_ativo=req.cadastro_suframa_emitente_ativo,
+            cadastro_suframa_destinatario=req.cadastro_suframa_destinatario,
+            cadastro_suframa_destinatario_ativo=req.cadastro_suframa_destinatario_ativo,
+            compra_governo=req.compra_governo,
+            ind_doacao=req.ind_doacao,
+            produzido_zfm=item.produzido_zfm,
+            refs_pag_antecipado=req.refs_pag_antecipado,
+            ncm=item.ncm,
+            valor_item=valor_item,
+            fornecimento_alimentacao=req.fornecimento_alimentacao,
+            anexo_simples=req.anexo_simples,
+            rbt12=req.rbt12,
+        )
+
+    def handle_simulacao(self, req: SimulacaoRequest) -> SimulacaoResponse:
+        """
+        Curva da transição (ano x item) em uma chamada. Itens com a mesma
+        operação (NCM, CFOP, CST, ZFM) são classificados uma vez só.
+        """
+        if req.ano_fim < req.ano_inicio:
+            raise ValueError("ano_fim anterior a ano_inicio")
+        anos = list(range(req.ano_inicio, req.ano_fim + 1))
+        transicao = transicao_por_ano(self._sources)
+        sn = self._sources.simples if is_simples(req.regime_fiscal_emitente) else None
+        metrics.LOTE_ITENS.observe(len(req.itens), "/simular")
+
+        por_operacao: Dict[tuple, List[Dict[str, Any]]] = {}
+        itens: List[SimulacaoItem] = []
+        colunas: List[List[SimulacaoCelula]] = []
+
+        for item in req.itens:
+            valor_item = self._valor_item(item)
+            args = self._classify_args(self._item_request(req, item, valor_item, anos[0]))
+            op = (norm_ncm(item.ncm), norm_code(item.cfop), norm_code(item.cst_icms), args["produzido_zfm"])
+            linhas = por_operacao.get(op)
+            if linhas is None:
+                linhas = por_operacao[op] = classify_anos(self._sources, anos, transicao=transicao, **args)
+
+            base = linhas[0]["resultado"]
+            itens.append(SimulacaoItem(
+                item=item.item,
+                cditem=item.cditem,
+                deitem=item.deitem,
+                ncm=item.ncm,
+                cfop=item.cfop,
+                cst_icms=item.cst_icms,
+                valor_item=valor_item,
+                cclastrib=base["cclastrib"]["codigo"],
+                cst_ibs_cbs=base["cst_ibs_cbs"],
+                cclass_trib=base["cclass_trib"],
+                categoria=base.get("categoria"),
+                alertas=base.get("alertas", []),
+                pendencias=base.get("pendencias", []),
+            ))
+
+            # mesmas contas (e arredondamentos) do _com_valores do /classificar
+            vbc = _round_money(valor_item)
+            coluna = []
+            for linha in linhas:
+                p_ibs = _round_rate(linha["aliquota_ibs"] * 100.0)
+                p_cbs = _round_rate(linha["aliquota_cbs"] * 100.0)
+                v_ibs = _round_money(vbc * (p_ibs / 100.0)) if vbc is not None else None
+                v_cbs = _round_money(vbc * (p_cbs / 100.0)) if vbc is not None else None
+                faixa = sn.faixa(req.anexo_simples or "", linha["ano"], req.rbt12) if sn and req.rbt12 is not None else None
+                coluna.append(SimulacaoCelula(
+                    aliquota_ibs=p_ibs,
+                    aliquota_cbs=p_cbs,
+                    valor_ibs=v_ibs,
+                    valor_cbs=v_cbs,
+                    total_tributos=round(v_ibs + v_cbs, 2) if vbc is not None else None,
+                    aplicar_is=linha["aplicar_is"],
+                    aliquota_efetiva_simples=(
+                        round(faixa.aliquota_efetiva(req.rbt12) * 100.0, 6) if faixa else None
+                    ),
+                ))
+            colunas.append(coluna)
+
+        # matriz[ano][item]
+        matriz = [[coluna[a] for coluna in colunas] for a in range(len(anos))]
+        return SimulacaoResponse(anos=anos, itens=itens, matriz=matriz)
+
+    def handle_auditoria(self, req: AuditoriaRequest) -> Iterator[Dict[str, str]]:
+        """
+        Problemas de NCM do catálogo, em streaming. O índice fica guardado até
+        o próximo reload (ou até mudar a data de referência).
+        """
+        data_ref = req.data_referencia or date.today()
+        cat = self._catalogo
+        if cat is None or cat.data_ref != data_ref or cat.sources is not self._sources:
+            cat = self._catalogo = CatalogoNcm.build(self._sources, data_ref)
+        workers = int(os.getenv("AUDITORIA_WORKERS", "1"))
+        itens = ((str(i.sku), i.ncm) for i in req.itens)
+        return auditar_catalogo(itens, self.data_anexos_dir, data_ref, workers=workers, catalogo=cat)
+
+    def handle_ncm_busca(self, consulta: str, pagina: int = 1, tamanho: int = 20) -> NcmBuscaResponse:
+        indice = self._sources.ncm_busca
+        res = indice.buscar(consulta, limite=tamanho, offset=(pagina - 1) * tamanho)
+        itens = [
+            NcmBuscaItem(
+                ncm=indice.codigos[doc],
+                descricao=indice.descricoes[doc],
+                caminho=indice.caminho(doc),
+                categoria=indice.categorias[doc],
+                score=round(score, 4),
+            )
+            for doc, score in res.itens
+        ]
+        return NcmBuscaResponse(
+            consulta=consulta, pagina=pagina, tamanho=tamanho, total=res.total, itens=itens, correcoes=res.correcoes
+        )
+
+    # -------------------------
+    # Revisão por LLM (baixa confiança)
+    # -------------------------
+    @staticmethod
+    def _contexto_llm(req: ClassifyRequest, resultado: ClassifyResponse, deitem: Optional[str]) -> Dict[str, Any]:
+        # só o que decide a classificação: itens iguais geram o mesmo prompt (e a mesma chave de cache)
+        return {
+            "ano_emissao": req.ano_emissao,
+            "regime_fiscal_emitente": req.regime_fiscal_emitente,
+            "cfop": req.cfop,
+            "uf_emitente": req.uf_emitente,
+            "uf_destinatario": req.uf_destinatario,
+            "cst_icms": req.cst_icms,
+            "ncm": norm_ncm(req.ncm),
+            "deitem": (deitem or "").strip() or None,
+            "resultado_regras": {
+                "cclastrib": {"codigo": resultado.cclastrib.codigo, "descricao": resultado.cclastrib.descricao},
+                "cst_ibs_cbs": resultado.cst_ibs_cbs,
+                "cclass_trib": resultado.cclass_trib,
+                "aliquota_ibs": resultado.ibs.aliquota,
+                "aliquota_cbs": resultado.cbs.aliquota,
+                "confianca": resultado.confianca,
+                "alertas": resultado.alertas,
+                "pendencias": resultado.pendencias,
+            },
+        }
+
+    async def revisar_llm(
+        self, pares: Sequence[Tuple[ClassifyRequest, ClassifyResponse, Optional[str]]]
+    ) -> List[ClassifyResponse]:
+        """
+        (requisição, resultado, deitem) -> resultado, com `revisao_llm` nos de
+        confiança abaixo do limiar. Uma chamada ao revisor para todos eles; os
+        resultados (possivelmente do cache) são copiados, nunca alterados.
+        """
+        out = [resultado for _, resultado, _ in pares]
+        revisor = self.revisor
+        if revisor is None:
+            return out
+        baixos = [i for i, (_, resultado, _) in enumerate(pares) if revisor.precisa(resultado.confianca)]
+        if not baixos:
+            return out
+        pareceres = await revisor.revisar([self._contexto_llm(*pares[i]) for i in baixos])
+        for i, parecer in zip(baixos, pareceres):
+            revisao = self._revisao(revisor, out[i], parecer)
+            if revisao is not None:
+                out[i] = out[i].model_copy(update={"revisao_llm": revisao})
+        return out
+
+    async def revisar_lote_llm(self, req: ClassifyLoteRequest, resp: ClassifyLoteResponse) -> ClassifyLoteResponse:
+        pares = [
+            (self._item_request(req, item, self._valor_item(item), req.ano_emissao), r.resultado, item.deitem)
+            for item, r in zip(req.itens, resp.itens)
+        ]
+        revisados = await self.revisar_llm(pares)
+        itens = [
+            r if novo is r.resultado else r.model_copy(update={"resultado": novo})
+            for r, novo in zip(resp.itens, revisados)
+        ]
+        return resp.model_copy(update={"itens": itens})
+
+    @staticmethod
+    def _revisao(revisor: RevisorLLM, resultado: ClassifyResponse, parecer: Optional[Dict[str, Any]]) -> Optional[RevisaoLLM]:
+        if parecer is None:
+            return None
+        try:
+            cclastrib = BlocoResultado.model_validate(parecer["cclastrib"]) if parecer.get("cclastrib") else None
+            return RevisaoLLM(
+                backend=revisor.backend.nome,
+                origem=parecer.get("origem", "modelo"),
+                concorda=cclastrib is not None and cclastrib.codigo == resultado.cclastrib.codigo,
+                cclastrib=cclastrib,
+                cst_ibs_cbs=parecer.get("cst_ibs_cbs"),
+                cclass_trib=parecer.get("cclass_trib"),
+                fundamento=parecer.get("fundamento") or [],
+                pendencias=parecer.get("pendencias") or [],
+            )
+        except (ValueError, TypeError):
+            # resposta fora do formato pedido: o item fica sem revisão
+            metrics.LLM_ITENS_TOTAL.inc("erro")
+            return None
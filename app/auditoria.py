@@ -0,0 +1,251 @@
+"""
+Auditoria em lote de NCMs de um catálogo de produtos.
+
+    python -m app.auditoria catalogo.csv [--saida relatorio.csv] [--workers N] [--data 2026-01-01]
+
+Entrada: CSV com ";" e colunas sku;ncm (descricao opcional).
+Saída: uma linha por SKU com problema, gravada à medida que os blocos ficam prontos:
+
+  - formato_invalido: NCM sem 8 dígitos
+  - inexistente: código fora da Tabela NCM vigente
+  - expirado / nao_vigente: código existe, mas fora da vigência na data de referência
+  - sem_categoria: vigente, mas sem linha em ncm_master/ncm_excecoes
+    (no /classificar vira pendência e cai na regra geral)
+
+Para os três primeiros, sugere os irmãos válidos mais próximos na hierarquia
+(mesmo subitem, depois subposição, posição e capítulo).
+
+O índice (dicionários por NCM + lista ordenada dos códigos vigentes) é montado
+uma vez por processo; os SKUs são auditados em blocos, em paralelo, e cada
+NCM repetido no catálogo é verificado uma vez por bloco.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import sys
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .rules import DataSources, find_beneficio_anexo, load_sources, norm_ncm
+
+REPORT_HEADER = ["sku", "ncm", "problema", "detalhe", "sugestoes", "anexo"]
+BLOCO = 2000
+MAX_SUGESTOES = 3
+# do mais específico para o mais genérico: subitem, subposição, posição, capítulo
+NIVEIS = (7, 6, 4, 2)
+
+
+@dataclass
+class CatalogoNcm:
+    """
+    Índice da Tabela NCM + ncm_master/ncm_excecoes para consultas por código.
+    """
+    data_ref: date
+    # código de 8 dígitos -> [(início, fim, descrição)]
+    oficial: Dict[str, List[Tuple[Optional[date], Optional[date], str]]] = field(default_factory=dict)
+    # códigos de 8 dígitos vigentes na data de referência, ordenados
+    vigentes: List[str] = field(default_factory=list)
+    vigentes_set: frozenset = frozenset()
+    categorizados: Dict[str, str] = field(default_factory=dict)
+    sources: Optional[DataSources] = None
+
+    @classmethod
+    def build(cls, sources: DataSources, data_ref: Optional[date] = None) -> "CatalogoNcm":
+        cat = cls(data_ref=data_ref or date.today(), sources=sources)
+        for r in sources.ncm_oficial:
+            if len(r.ncm) != 8:
+                continue
+            cat.oficial.setdefault(r.ncm, []).append((r.data_inicio, r.data_fim, r.descricao))
+
+        cat.vigentes = sorted(c for c, vig in cat.oficial.items() if any(cat._vale(v) for v in vig))
+        cat.vigentes_set = frozenset(cat.vigentes)
+
+        for rows in (sources.ncm_master, sources.ncm_excecoes):
+            for r in rows:
+                if r.ncm:
+                    cat.categorizados.setdefault(r.ncm, r.categoria or r.tipo)
+        return cat
+
+    def _vale(self, vig: Tuple[Optional[date], Optional[date], str]) -> bool:
+        ini, fim, _ = vig
+        return (ini is None or ini <= self.data_ref) and (fim is None or self.data_ref <= fim)
+
+    def descricao(self, codigo: str) -> str:
+        vig = self.oficial.get(codigo)
+        return vig[-1][2] if vig else ""
+
+    def sugestoes(self, codigo: str, limite: int = MAX_SUGESTOES) -> List[str]:
+        """
+        Códigos vigentes mais próximos (numericamente) dentro do menor nível
+        hierárquico que tenha algum; categorizados no master vêm primeiro.
+        """
+        if not codigo.isdigit():
+            return []
+        alvo = int(codigo.ljust(8, "0")[:8])
+        for n in NIVEIS:
+            prefixo = codigo[:n]
+            if len(prefixo) < n:
+                continue
+            i = bisect_left(self.vigentes, prefixo)
+            irmaos = []
+            while i < len(self.vigentes) and self.vigentes[i].startswith(prefixo):
+                if self.vigentes[i] != codigo:
+                    irmaos.append(self.vigentes[i])
+                i += 1
+            if irmaos:
+                irmaos.sort(key=lambda c: (c not in self.categorizados, abs(int(c) - alvo)))
+                return irmaos[:limite]
+        return []
+
+    def auditar(self, ncm: str) -> Optional[Dict[str, str]]:
+        """
+        Problema do NCM na data de referência, ou None se estiver tudo certo.
+        """
+        codigo = norm_ncm(ncm or "")
+        anexo = ""
+        if self.sources is not None and len(codigo) == 8:
+            beneficio = find_beneficio_anexo(self.sources, codigo)
+            anexo = beneficio.anexo if beneficio else ""
+
+        if len(codigo) != 8:
+            problema, detalhe = "formato_invalido", f"NCM com {len(codigo)} dígitos"
+        elif codigo not in self.oficial:
+            problema, detalhe = "inexistente", "Código fora da Tabela NCM vigente"
+        elif codigo not in self.vigentes_set:
+            fins = [fim for _, fim, _ in self.oficial[codigo] if fim]
+            if fins and max(fins) < self.data_ref:
+                problema, detalhe = "expirado", f"Vigência encerrada em {max(fins).isoformat()}"
+            else:
+                problema, detalhe = "nao_vigente", f"Fora da vigência em {self.data_ref.isoformat()}"
+        elif codigo not in self.categorizados:
+            return {
+                "problema": "sem_categoria",
+                "detalhe": f"Sem categoria em ncm_master/ncm_excecoes ({self.descricao(codigo)})",
+                "sugestoes": "",
+                "anexo": anexo,
+            }
+        else:
+            return None
+
+        return {
+            "problema": problema,
+            "detalhe": detalhe,
+            "sugestoes": ",".join(self.sugestoes(codigo)),
+            "anexo": anexo,
+        }
+
+
+# -------------------------
+# Execução em blocos (in-process ou em processos)
+# -------------------------
+_catalogo: Optional[CatalogoNcm] = None
+
+
+def _init_worker(data_dir: str, data_ref: date) -> None:
+    # com fork o índice do processo pai já vem pronto
+    global _catalogo
+    if _catalogo is None or _catalogo.data_ref != data_ref:
+        _catalogo = CatalogoNcm.build(load_sources(data_dir), data_ref)
+
+
+def auditar_bloco(itens: List[Tuple[str, str]], catalogo: Optional[CatalogoNcm] = None) -> List[Dict[str, str]]:
+    cat = catalogo or _catalogo
+    vistos: Dict[str, Optional[Dict[str, str]]] = {}
+    out: List[Dict[str, str]] = []
+    for sku, ncm in itens:
+        if ncm not in vistos:
+            vistos[ncm] = cat.auditar(ncm)
+        problema = vistos[ncm]
+        if problema is not None:
+            out.append({"sku": sku, "ncm": ncm, **problema})
+    return out
+
+
+def _blocos(itens: Iterable[Tuple[str, str]], tamanho: int) -> Iterator[List[Tuple[str, str]]]:
+    bloco: List[Tuple[str, str]] = []
+    for item in itens:
+        bloco.append(item)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def auditar_catalogo(
+    itens: Iterable[Tuple[str, str]],
+    data_dir: str,
+    data_ref: Optional[date] = None,
+    workers: Optional[int] = None,
+    bloco: int = BLOCO,
+    catalogo: Optional[CatalogoNcm] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Problemas de cada (sku, ncm), na ordem da entrada, à medida que os blocos terminam.
+    Com vários workers, no máximo 2 blocos por worker ficam em voo (memória limitada
+    mesmo para catálogos enormes).
+    """
+    global _catalogo
+    data_ref = data_ref or date.today()
+    if catalogo is None or catalogo.data_ref != data_ref:
+        _init_worker(data_dir, data_ref)
+        catalogo = _catalogo
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    if workers == 1:
+        for b in _blocos(itens, bloco):
+            yield from auditar_bloco(b, catalogo)
+        return
+
+    # fork: os workers herdam o índice já montado
+    _catalogo = catalogo
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data_dir, data_ref)) as pool:
+        pendentes = []
+        for b in _blocos(itens, bloco):
+            pendentes.append(pool.submit(auditar_bloco, b))
+            if len(pendentes) >= workers * 2:
+                yield from pendentes.pop(0).result()
+        for fut in pendentes:
+            yield from fut.result()
+
+
+def ler_catalogo(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for r in csv.DictReader(f, delimiter=";"):
+            r = {(k or "").strip().lower(): (v or "").strip() for k, v in r.items()}
+            yield r.get("sku") or r.get("cditem") or "", r.get("ncm", "")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.auditoria", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("catalogo", help="CSV ; com colunas sku;ncm")
+    parser.add_argument("--saida", default="-", help="relatório CSV (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="processos (default: nº de CPUs)")
+    parser.add_argument("--data", default=None, help="data de referência AAAA-MM-DD (default: hoje)")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "data/anexos"))
+    args = parser.parse_args(argv)
+
+    data_ref = date.fromisoformat(args.data) if args.data else date.today()
+    out = sys.stdout if args.saida == "-" else open(args.saida, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.DictWriter(out, fieldnames=REPORT_HEADER, delimiter=";")
+        writer.writeheader()
+        total = 0
+        for linha in auditar_catalogo(ler_catalogo(args.catalogo), args.data_dir, data_ref, args.workers):
+            writer.writerow(linha)
+            total += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"🔎 SKUs com problema: {total}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
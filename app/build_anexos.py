@@ -0,0 +1,367 @@
+"""
+Regeneração incremental dos anexos da LC 214/2025.
+
+    python -m app.build_anexos [--fonte data/lei/lc214_2025.html|.pdf] [--force] [--dry-run] [--adotar]
+
+O conteúdo de cada seção "ANEXO X" da lei é hasheado (sha256) durante a
+passada única do extrator. Só os anexos cujo hash mudou em relação ao
+data/manifest.json são regravados; as etapas derivadas registradas em STAGES
+(normalização, índices compilados) só rodam para entradas cujo hash mudou.
+
+O manifesto guarda, para cada arquivo gerado, a etapa, a seção/arquivo de
+origem com o respectivo hash e a proveniência de cada linha
+(linha no CSV -> tabela e <tr> dentro da seção). O data/manifest.json é
+versionado junto com os CSVs: um build sem mudança na fonte não regrava nada.
+Com --adotar, os CSVs já versionados entram no manifesto como estão (sem
+proveniência por linha) e só as seções sem arquivo são geradas.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .extract_anexos import BASE_DIR, HTML_FILE, AnexoRow, scan_anexos, write_anexo_csv
+from .extract_anexos_pdf import PDF_FILE, scan_anexos_pdf
+from .normalize_anexos import compile_beneficios, is_normalized_anexo, is_raw_anexo, normalize_file
+
+MANIFEST_PATH = os.path.join(BASE_DIR, "data/manifest.json")
+MANIFEST_VERSION = 1
+
+# -------------------------
+# Para onde vai cada seção (mesma organização das pastas já existentes)
+# -------------------------
+# Chave = identidade da seção (secao_id), não o numeral: data/simples e
+# data/conversao guardam os anexos da LC 123 reproduzidos nos ANEXOS XVIII-XXIII
+# da LC 214, não os ANEXOS I-V e VII da própria LC 214.
+DESTINOS = {
+    "LC 123 ANEXO I": "data/simples/ANEXO_I.csv",
+    "LC 123 ANEXO II": "data/simples/ANEXO_II.csv",
+    "LC 123 ANEXO III": "data/simples/ANEXO_III.csv",
+    "LC 123 ANEXO IV": "data/simples/ANEXO_IV.csv",
+    "LC 123 ANEXO V": "data/simples/ANEXO_V.csv",
+    "LC 123 ANEXO VII": "data/conversao/ANEXO_VII.csv",
+    "ANEXO VI": "data/reservas/ANEXO_VI.csv",
+    "ANEXO X": "data/reservas/ANEXO_X.csv",
+    "ANEXO XI": "data/reservas/ANEXO_XI.csv",
+    "ANEXO XIII": "data/reservas/ANEXO_XIII.csv",
+    "ANEXO XIV": "data/reservas/ANEXO_XIV.csv",
+}
+DESTINO_PADRAO = "data/csv"
+
+
+def destino_csv(secao: str) -> str:
+    rel = DESTINOS.get(secao) or f"{DESTINO_PADRAO}/{secao.replace(' ', '_')}.csv"
+    return os.path.join(BASE_DIR, rel)
+
+
+# -------------------------
+# Leitores da lei por extensão: caminho -> ({anexo: linhas}, {anexo: sha256 da seção})
+# -------------------------
+SourceReader = Callable[[str], Tuple[Dict[str, List[AnexoRow]], Dict[str, str]]]
+SOURCE_READERS: Dict[str, SourceReader] = {
+    ".html": scan_anexos,
+    ".htm": scan_anexos,
+    ".pdf": scan_anexos_pdf,
+}
+
+
+def register_source(ext: str, reader: SourceReader) -> None:
+    SOURCE_READERS[ext.lower()] = reader
+
+
+# -------------------------
+# Etapas derivadas
+# -------------------------
+@dataclass
+class Stage:
+    """
+    Etapa que consome arquivos já gerados (presentes no manifesto).
+
+    select(rel_path) escolhe as entradas; run(abs_path) processa uma entrada e
+    devolve {caminho_saida: proveniência extra (ex: {"linhas": [...]})}.
+    Com per_file=False, run recebe a lista de todas as entradas de uma vez
+    (índices compilados que dependem de vários anexos).
+    """
+    name: str
+    select: Callable[[str], bool]
+    run: Callable[[Any], Dict[str, Dict[str, Any]]]
+    per_file: bool = True
+
+
+STAGES: List[Stage] = []
+
+
+def register_stage(stage: Stage) -> Stage:
+    STAGES[:] = [s for s in STAGES if s.name != stage.name] + [stage]
+    return stage
+
+
+# bruto (data/reservas, data/csv) -> data/normalizado -> data/anexos/beneficios_anexos.csv
+register_stage(Stage("normalize", is_raw_anexo, normalize_file))
+register_stage(Stage("compile", is_normalized_anexo, compile_beneficios, per_file=False))
+
+
+# -------------------------
+# Manifesto
+# -------------------------
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), BASE_DIR).replace(os.sep, "/")
+
+
+def _abs(rel: str) -> str:
+    return os.path.join(BASE_DIR, rel)
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"versao": MANIFEST_VERSION, "fonte": {}, "secoes": {}, "arquivos": {}, "etapas": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for k in ("fonte", "secoes", "arquivos", "etapas"):
+        manifest.setdefault(k, {})
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any], path: str = MANIFEST_PATH) -> None:
+    manifest["versao"] = MANIFEST_VERSION
+    manifest["atualizado_em"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def _sem_data(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in manifest.items() if k != "atualizado_em"}
+
+
+def _arquivo_intacto(manifest: Dict[str, Any], rel: str) -> bool:
+    info = manifest["arquivos"].get(rel)
+    path = _abs(rel)
+    return bool(info) and os.path.exists(path) and file_sha256(path) == info["sha256"]
+
+
+# -------------------------
+# Build
+# -------------------------
+@dataclass
+class BuildReport:
+    gerados: List[str] = field(default_factory=list)
+    inalterados: List[str] = field(default_factory=list)
+    removidos: List[str] = field(default_factory=list)
+    etapas: Dict[str, List[str]] = field(default_factory=dict)
+
+    def linhas(self) -> List[str]:
+        out = [
+            f"anexos regravados: {len(self.gerados)} {self.gerados}",
+            f"anexos inalterados: {len(self.inalterados)}",
+        ]
+        if self.removidos:
+            out.append(f"seções que sumiram da fonte: {self.removidos}")
+        for nome, entradas in self.etapas.items():
+            out.append(f"etapa {nome}: {len(entradas)} entrada(s) reprocessada(s)")
+        return out
+
+
+def _extract(
+    manifest: Dict[str, Any],
+    fonte: str,
+    force: bool,
+    dry_run: bool,
+    report: BuildReport,
+    adotar: bool = False,
+) -> List[str]:
+    """
+    Regrava os anexos com hash de seção diferente. Retorna os caminhos (rel) alterados.
+    Com `adotar`, seção ainda fora do manifesto cujo CSV já existe é registrada sem regravar.
+    """
+    ext = os.path.splitext(fonte)[1].lower()
+    reader = SOURCE_READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Formato de fonte não suportado: {ext} (conhecidos: {sorted(SOURCE_READERS)})")
+
+    fonte_sha = file_sha256(fonte)
+    secoes = manifest["secoes"]
+    fonte_ant = manifest["fonte"]
+
+    # atalho: mesma fonte e todos os arquivos gerados intactos -> nem parseia
+    if (
+        not force
+        and not adotar
+        and fonte_ant.get("sha256") == fonte_sha
+        and secoes
+        and all(_arquivo_intacto(manifest, s["saida"]) for s in secoes.values())
+    ):
+        report.inalterados.extend(sorted(secoes))
+        return []
+
+    por_anexo, hashes = reader(fonte)
+    alterados: List[str] = []
+
+    for anexo, rows in por_anexo.items():
+        sha = hashes.get(anexo, "")
+        rel = _rel(destino_csv(anexo))
+        ant = secoes.get(anexo, {})
+        if not force and ant.get("sha256") == sha and ant.get("saida") == rel and _arquivo_intacto(manifest, rel):
+            report.inalterados.append(anexo)
+            continue
+        if adotar and not ant and os.path.exists(_abs(rel)):
+            report.inalterados.append(anexo)
+            if not dry_run:
+                manifest["arquivos"][rel] = {
+                    "sha256": file_sha256(_abs(rel)),
+                    "etapa": "extract",
+                    "origem": {"fonte": _rel(fonte), "secao": anexo, "sha256": sha, "adotado": True},
+                }
+                secoes[anexo] = {"sha256": sha, "saida": rel}
+            continue
+
+        report.gerados.append(anexo)
+        if dry_run:
+            continue
+        origem = write_anexo_csv(_abs(rel), rows)
+        manifest["arquivos"][rel] = {
+            "sha256": file_sha256(_abs(rel)),
+            "etapa": "extract",
+            "origem": {"fonte": _rel(fonte), "secao": anexo, "sha256": sha},
+            # [linha no CSV, tabela na seção, <tr> na tabela]
+            "linhas": [list(o) for o in origem],
+        }
+        secoes[anexo] = {"sha256": sha, "saida": rel}
+        alterados.append(rel)
+
+    for anexo in sorted(set(secoes) - set(por_anexo)):
+        # não apaga o CSV (pode ter sido versionado à mão); só deixa de rastrear
+        report.removidos.append(anexo)
+        if not dry_run:
+            manifest["arquivos"].pop(secoes.pop(anexo)["saida"], None)
+
+    if not dry_run:
+        manifest["fonte"] = {"path": _rel(fonte), "sha256": fonte_sha}
+    return alterados
+
+
+def _run_stage(manifest: Dict[str, Any], stage: Stage, force: bool, report: BuildReport) -> None:
+    estado = manifest["etapas"].setdefault(stage.name, {})
+    entradas = sorted(
+        rel for rel, info in manifest["arquivos"].items()
+        if info.get("etapa") != stage.name and stage.select(rel)
+    )
+    hashes = {rel: manifest["arquivos"][rel]["sha256"] for rel in entradas}
+
+    def ja_feito(chave: str, esperado: Dict[str, str]) -> bool:
+        ant = estado.get(chave)
+        return (
+            not force
+            and ant is not None
+            and ant.get("entradas") == esperado
+            and all(_arquivo_intacto(manifest, s) for s in ant.get("saidas", []))
+        )
+
+    def registrar(chave: str, esperado: Dict[str, str], saidas: Dict[str, Dict[str, Any]]) -> None:
+        rels = []
+        for path, prov in saidas.items():
+            rel = _rel(path)
+            manifest["arquivos"][rel] = {
+                "sha256": file_sha256(path),
+                "etapa": stage.name,
+                "origem": [{"arquivo": e, "sha256": s} for e, s in esperado.items()],
+                **prov,
+            }
+            rels.append(rel)
+        estado[chave] = {"entradas": esperado, "saidas": sorted(rels)}
+
+    processadas: List[str] = []
+    if stage.per_file:
+        for rel in entradas:
+            esperado = {rel: hashes[rel]}
+            if ja_feito(rel, esperado):
+                continue
+            registrar(rel, esperado, stage.run(_abs(rel)))
+            processadas.append(rel)
+        for rel in set(estado) - set(entradas):
+            estado.pop(rel)
+    elif entradas and not ja_feito("*", hashes):
+        registrar("*", hashes, stage.run([_abs(r) for r in entradas]))
+        processadas = entradas
+
+    report.etapas[stage.name] = processadas
+
+
+def default_fonte() -> str:
+    # HTML do Planalto quando disponível; senão o PDF oficial
+    return HTML_FILE if os.path.exists(HTML_FILE) else PDF_FILE
+
+
+def fonte_do_manifesto(manifest: Dict[str, Any]) -> Optional[str]:
+    # a fonte do último build: trocar de leitor (HTML <-> PDF) muda todos os hashes de seção
+    rel = manifest["fonte"].get("path")
+    return _abs(rel) if rel and os.path.exists(_abs(rel)) else None
+
+
+def build(
+    fonte: Optional[str] = None,
+    manifest_path: str = MANIFEST_PATH,
+    force: bool = False,
+    dry_run: bool = False,
+    adotar: bool = False,
+) -> BuildReport:
+    manifest = load_manifest(manifest_path)
+    fonte = fonte or fonte_do_manifesto(manifest) or default_fonte()
+    antes = copy.deepcopy(_sem_data(manifest))
+    report = BuildReport()
+
+    _extract(manifest, fonte, force, dry_run, report, adotar=adotar)
+    if dry_run:
+        return report
+
+    for stage in STAGES:
+        _run_stage(manifest, stage, force, report)
+
+    if _sem_data(manifest) != antes or not os.path.exists(manifest_path):
+        save_manifest(manifest, manifest_path)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.build_anexos",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--fonte", default=None, help="texto da lei (HTML ou PDF; default: HTML se existir)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--force", action="store_true", help="ignora os hashes e regera tudo")
+    parser.add_argument("--dry-run", action="store_true", help="só lista os anexos que mudaram")
+    parser.add_argument("--adotar", action="store_true",
+                        help="registra os CSVs já existentes no manifesto sem regravá-los")
+    args = parser.parse_args(argv)
+
+    args.fonte = args.fonte or fonte_do_manifesto(load_manifest(args.manifest)) or default_fonte()
+    if not os.path.exists(args.fonte):
+        print(f"❌ Fonte não encontrada: {args.fonte}", file=sys.stderr)
+        sys.exit(1)
+
+    report = build(args.fonte, args.manifest, force=args.force, dry_run=args.dry_run, adotar=args.adotar)
+    for linha in report.linhas():
+        print(linha)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Busca de NCM por descrição (ex.: "escova de dentes") para o catálogo e a UI.
+
+Índice invertido em memória sobre os NCMs de 8 dígitos da Tabela NCM vigente
+(+ descrição do ncm_master quando diferente):
+
+  - termos sem acento/maiúsculas (normalize_text), no singular ("escovas" ->
+    "escova") e sem stopwords ("de", "para", "outros"...);
+  - ranking BM25; a descrição dos níveis acima (capítulo, posição, subposição,
+    item) entra com peso menor, para que "-- Outros" tenha contexto;
+  - o último termo da consulta também vale como prefixo ("escov" -> escova, escovas);
+  - termo fora do vocabulário (erro de digitação) é trocado pelos termos com
+    mais trigramas em comum.
+
+Montado uma vez (DataSources.ncm_busca, sob demanda como a Tabela NCM).
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from .rules import normalize_text
+
+if TYPE_CHECKING:
+    from .records import NcmOficialRow, NcmRow
+
+STOPWORDS = frozenset(
+    "a as ao aos com da das de do dos e em na nas no nos o os ou para pela pelas pelo pelos por sem"
+    " exceto incluindo inclusive mesmo outro outra outros outras".split()
+)
+# BM25
+K1 = 1.2
+B = 0.75
+# peso das descrições dos níveis acima frente à descrição do próprio código
+PESO_CONTEXTO = 0.3
+# trigramas: similaridade mínima (Jaccard) e nº de termos substitutos por termo digitado errado
+MIN_SIMILARIDADE = 0.25
+MAX_CORRECOES = 3
+MAX_PREFIXO = 20
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _singular(t: str) -> str:
+    # plural regular só ("escovas", "dentes", "pneumaticos"); o resto fica como está
+    return t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+
+
+def termos(texto: str) -> List[str]:
+    out = []
+    for t in _TOKEN.findall(normalize_text(texto)):
+        if len(t) > 1 and t not in STOPWORDS:
+            out.append(_singular(t))
+    return out
+
+
+def trigramas(termo: str) -> Set[str]:
+    t = f"  {termo} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+@dataclass
+class ResultadoBusca:
+    total: int
+    itens: List[Tuple[int, float]]      # (doc, score), mais relevante primeiro
+    correcoes: Dict[str, List[str]] = field(default_factory=dict)
+
+
+@dataclass
+class IndiceNcm:
+    codigos: List[str] = field(default_factory=list)
+    descricoes: List[str] = field(default_factory=list)
+    categorias: List[Optional[str]] = field(default_factory=list)
+    # descrição de todos os níveis (2 a 8 dígitos), para montar o caminho do resultado
+    niveis: Dict[str, str] = field(default_factory=dict)
+    # termo -> [(doc, parcela BM25 do tf e do tamanho do doc)]; na consulta só multiplica pelo idf
+    postings: Dict[str, List[Tuple[int, float]]] = field(default_factory=dict)
+    vocabulario: List[str] = field(default_factory=list)      # ordenado, para prefixo
+    por_trigrama: Dict[str, List[str]] = field(default_factory=dict)
+    _idf: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, oficial: Iterable["NcmOficialRow"], master: Iterable["NcmRow"] = ()) -> "IndiceNcm":
+        # descrição por código (a última linha do arquivo vence, como na auditoria)
+        desc: Dict[str, str] = {}
+        for r in oficial:
+            if r.ncm:
+                desc[r.ncm] = r.descricao
+        extra: Dict[str, str] = {}
+        categorias: Dict[str, str] = {}
+        for r in master:
+            if len(r.ncm) == 8:
+                if r.descricao and r.descricao != desc.get(r.ncm):
+                    extra[r.ncm] = r.descricao
+                if r.categoria:
+                    categorias.setdefault(r.ncm, r.categoria)
+
+        idx = cls(niveis={c: d.lstrip("- ").strip() for c, d in desc.items()})
+        tf_por_termo: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        tamanhos: List[float] = []
+        # os níveis de cima se repetem em centenas de códigos: tokeniza cada um uma vez
+        termos_nivel = {c: termos(d) for c, d in desc.items() if len(c) < 8}
+        for codigo in sorted(c for c in set(desc) | set(extra) if len(c) == 8):
+            pesos: Dict[str, float] = defaultdict(float)
+            for t in termos(f"{desc.get(codigo, '')} {extra.get(codigo, '')}"):
+                pesos[t] += 1.0
+            for n in range(2, 8):
+                for t in termos_nivel.get(codigo[:n], ()):
+                    pesos[t] += PESO_CONTEXTO
+            doc = len(idx.codigos)
+            idx.codigos.append(codigo)
+            idx.descricoes.append((desc.get(codigo) or extra.get(codigo, "")).lstrip("- ").strip())
+            idx.categorias.append(categorias.get(codigo))
+            tamanhos.append(sum(pesos.values()))
+            for t, w in pesos.items():
+                tf_por_termo[t].append((doc, w))
+
+        n = len(idx.codigos)
+        medio = (sum(tamanhos) / n) if n else 1.0
+        idx.postings = {
+            t: [(doc, tf * (K1 + 1) / (tf + K1 * (1 - B + B * tamanhos[doc] / medio))) for doc, tf in p]
+            for t, p in tf_por_termo.items()
+        }
+        idx._idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in idx.postings.items()}
+        idx.vocabulario = sorted(idx.postings)
+        tri: Dict[str, List[str]] = defaultdict(list)
+        for t in idx.vocabulario:
+            for g in trigramas(t):
+                tri[g].append(t)
+        idx.por_trigrama = dict(tri)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    # -------------------------
+    # Expansão dos termos da consulta
+    # -------------------------
+    def _prefixo(self, termo: str) -> List[str]:
+        i = bisect_left(self.vocabulario, termo)
+        out = []
+        while i < len(self.vocabulario) and self.vocabulario[i].startswith(termo) and len(out) < MAX_PREFIXO:
+            out.append(self.vocabulario[i])
+            i += 1
+        return out
+
+    def _parecidos(self, termo: str) -> List[Tuple[str, float]]:
+        grams = trigramas(termo)
+        comuns: Dict[str, int] = defaultdict(int)
+        for g in grams:
+            for t in self.por_trigrama.get(g, ()):
+                comuns[t] += 1
+        sims = []
+        for t, c in comuns.items():
+            sim = c / (len(grams) + len(t) + 1 - c)   # len(trigramas(t)) == len(t) + 1
+            if sim >= MIN_SIMILARIDADE:
+                sims.append((sim, t))
+        return [(t, sim) for sim, t in heapq.nlargest(MAX_CORRECOES, sims)]
+
+    def _expandir(self, consulta: str) -> Tuple[List[List[Tuple[str, float]]], Dict[str, List[str]]]:
+        """
+        Para cada termo da consulta, os termos do índice que contam e o peso de cada um.
+        """
+        tokens = termos(consulta)
+        grupos: List[List[Tuple[str, float]]] = []
+        correcoes: Dict[str, List[str]] = {}
+        for i, t in enumerate(tokens):
+            if t in self.postings:
+                grupo = [(t, 1.0)]
+                if i == len(tokens) - 1:
+                    grupo += [(p, 0.5) for p in self._prefixo(t) if p != t]
+            elif i == len(tokens) - 1 and len(t) >= 3 and self._prefixo(t):
+                grupo = [(p, 0.8) for p in self._prefixo(t)]
+            else:
+                grupo = self._parecidos(t)
+                if grupo:
+                    correcoes[t] = [p for p, _ in grupo]
+            if grupo:
+                grupos.append(grupo)
+        return grupos, correcoes
+
+    # -------------------------
+    # Consulta
+    # -------------------------
+    def buscar(self, consulta: str, limite: int = 20, offset: int = 0) -> ResultadoBusca:
+        grupos, correcoes = self._expandir(consulta)
+        scores: Dict[int, float] = defaultdict(float)
+        for grupo in grupos:
+            # dentro de um grupo (termo + prefixos/correções) conta só a melhor variante por doc
+            melhor: Dict[int, float] = {}
+            for termo, peso in grupo:
+                idf = self._idf[termo] * peso
+                for doc, w in self.postings[termo]:
+                    s = idf * w
+                    if s > melhor.get(doc, 0.0):
+                        melhor[doc] = s
+            for doc, s in melhor.items():
+                scores[doc] += s
+        top = heapq.nlargest(offset + limite, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+        return ResultadoBusca(
+            total=len(scores),
+            itens=top[offset:],
+            correcoes=correcoes,
+        )
+
+    def caminho(self, doc: int) -> List[str]:
+        """
+        Descrições dos níveis acima do código (capítulo -> item), para dar
+        contexto a resultados como "Outros".
+        """
+        codigo = self.codigos[doc]
+        return [self.niveis[codigo[:n]] for n in range(2, 8) if codigo[:n] in self.niveis]
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import hashlib
+import os
+import sqlite3
+import threading
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 
 @dataclass
@@ -16,7 +20,8 @@ class TTLCache:
     Cache simples in-memory.
     - Boa para reduzir chamadas repetidas do Delphi.
     - Se você usar múltiplos workers (uvicorn --workers > 1),
-      cada worker terá seu próprio cache (ok na prática).
+      cada worker terá seu próprio cache (ok na prática);
+      o SQLiteCache abaixo (L2) é compartilhado entre eles.
     """
     def __init__(self, default_ttl_seconds: int = 3600):
         self.default_ttl_seconds = default_ttl_seconds
@@ -41,3 +46,179 @@ class TTLCache:
 
 def make_cache_key(*parts: Any) -> str:
     return "|".join(str(p).strip().upper() for p in parts)
+
+
+class _Chamada:
+    __slots__ = ("pronta", "valor", "erro")
+
+    def __init__(self) -> None:
+        self.pronta = threading.Event()
+        self.valor: Any = None
+        self.erro: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas concorrentes com a mesma chave: a primeira calcula,
+    as que chegarem enquanto ela roda esperam e recebem o mesmo resultado (ou a
+    mesma exceção). Nada fica guardado depois que a chamada termina; isso é
+    papel do cache.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._chamadas: Dict[str, _Chamada] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Devolve (valor, coalescida); coalescida=True quando esperou a chamada de outra thread.
+        """
+        with self._lock:
+            chamada = self._chamadas.get(key)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[key] = _Chamada()
+
+        if not lider:
+            chamada.pronta.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.valor, True
+
+        try:
+            chamada.valor = fn()
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._chamadas.pop(key, None)
+            chamada.pronta.set()
+        return chamada.valor, False
+
+
+class SQLiteCache:
+    """
+    Cache L2 em disco (SQLite em modo WAL), atrás do TTLCache de cada worker.
+    - Compartilhado entre os workers da máquina e preservado entre restarts.
+    - Chave = (versão dos dados, chave fiscal): trocar os CSVs, o código das
+      regras ou o schema da resposta muda a versão e as entradas antigas
+      simplesmente deixam de casar até expirarem.
+    - Guarda texto (a resposta já serializada); quem usa faz o (de)serialize.
+    - Best effort: erro do SQLite (disco cheio, lock demorado) vira miss.
+    """
+    BULK = 500  # variáveis por SELECT ... IN (...) (limite do SQLite é 999 em builds antigos)
+
+    def __init__(self, path: str, version: str = "", default_ttl_seconds: int = 3600):
+        self.path = path
+        self.version = version
+        self.default_ttl_seconds = default_ttl_seconds
+        # uma conexão por thread (o threadpool do FastAPI chama de várias)
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            # conexão SQLite não atravessa fork (app.server): cada worker abre as suas
+            os.register_at_fork(after_in_child=self._reset_conexoes)
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " versao TEXT NOT NULL, chave TEXT NOT NULL, valor TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (versao, chave)) WITHOUT ROWID"
+            )
+        self.prune()
+
+    def _reset_conexoes(self) -> None:
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: sem fsync por escrita; perder as últimas entradas num crash é aceitável num cache
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        keys = list(dict.fromkeys(keys))
+        agora = time.time()
+        try:
+            conn = self._conn()
+            for i in range(0, len(keys), self.BULK):
+                bloco = keys[i:i + self.BULK]
+                q = (
+                    "SELECT chave, valor FROM cache WHERE versao = ? AND expires_at >= ? "
+                    f"AND chave IN ({','.join('?' * len(bloco))})"
+                )
+                out.update(conn.execute(q, (self.version, agora, *bloco)).fetchall())
+        except sqlite3.Error:
+            return out
+        return out
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[int] = None) -> None:
+        self.set_many([(key, value)], ttl_seconds)
+
+    def set_many(self, items: Iterable[Tuple[str, str]], ttl_seconds: Optional[int] = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds
+        expires_at = time.time() + ttl
+        rows = [(self.version, k, v, expires_at) for k, v in items]
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            # uma transação para o lote inteiro (um commit no WAL)
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            pass
+
+    def prune(self) -> int:
+        """
+        Remove entradas vencidas (de qualquer versão). Devolve quantas saíram.
+        """
+        try:
+            conn = self._conn()
+            with conn:
+                return conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),)).rowcount
+        except sqlite3.Error:
+            return 0
+
+    def clear(self) -> None:
+        # só a versão atual: outros workers podem estar em outra versão durante um /reload
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM cache WHERE versao = ?", (self.version,))
+        except sqlite3.Error:
+            pass
+
+
+def data_version(paths: Iterable[str], *extra: str) -> str:
+    """
+    Hash do conteúdo dos arquivos (diretórios são percorridos) + partes extras.
+    Os CSVs somam poucos MB: ler tudo custa milissegundos e, ao contrário de
+    mtime, dá a mesma versão em todas as máquinas/containers.
+    """
+    h = hashlib.sha256()
+    arquivos: List[Tuple[str, str]] = []  # (nome relativo, caminho)
+    for p in paths:
+        if os.path.isdir(p):
+            for raiz, _, nomes in os.walk(p):
+                arquivos.extend((os.path.relpath(os.path.join(raiz, n), p), os.path.join(raiz, n)) for n in nomes)
+        elif os.path.exists(p):
+            arquivos.append((os.path.basename(p), p))
+    for nome, f in sorted(arquivos):
+        h.update(nome.replace(os.sep, "/").encode("utf-8"))
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    for e in extra:
+        h.update(e.encode("utf-8"))
+    return h.hexdigest()[:16]
@@ -1,110 +1,409 @@
-from bs4 import BeautifulSoup
+"""
+Extrai as tabelas dos anexos da LC 214/2025 (HTML do Planalto) para CSV.
+
+    python -m app.extract_anexos [lc214_2025.html] [pasta_saida]
+
+Uma única passada sobre o HTML (lxml se instalado, senão html.parser,
+alimentados em blocos): cada tabela é atribuída ao anexo corrente à medida
+que aparece, e cada linha é gravada no CSV do anexo assim que a <tr> fecha.
+A memória fica limitada à linha corrente, independente do tamanho da lei.
+"""
+from __future__ import annotations
+
 import csv
+import hashlib
 import os
 import re
+import sys
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 HTML_FILE = os.path.join(BASE_DIR, "data/lei/lc214_2025.html")
 OUT_DIR = os.path.join(BASE_DIR, "data/csv")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 # -------------------------------------------------
-# Ler HTML com encoding correto
+# Títulos de anexo
 # -------------------------------------------------
-with open(HTML_FILE, "r", encoding="latin-1") as f:
-    soup = BeautifulSoup(f, "html.parser")
+# O título é uma linha/bloco só com "ANEXO <romano>" (os da LC 214 que alteram a
+# LC 123 trazem o link "Produção de efeitos"), seguida do nome do anexo.
+# "Anexo I desta Lei", "ANEXO I do art. 5º" etc. no corpo do texto não contam.
+ANEXO_REGEX = re.compile(r"^ANEXO\s+([IVXLCDM]+)(?:\s+\(?Produção de efeitos\)?)?$")
+# "(Lei Complementar nº 123, de 14 de dezembro de 2006)" logo abaixo do título:
+# o anexo da LC 214 reproduz anexos daquela lei (ANEXO XVIII -> ANEXO I da LC 123)
+LEI_REGEX = re.compile(r"^\(?Lei Complementar n[º°o]\.?\s*(\d+)", re.IGNORECASE)
+LEI_PADRAO = "LC 214"
 
-# -------------------------------------------------
-# Regex para ANEXO I, II, III, ...
-# -------------------------------------------------
-ANEXO_REGEX = re.compile(r"ANEXO\s+[IVXLCDM]+", re.IGNORECASE)
+CSV_HEADER = [
+    "anexo",
+    "linha",
+    "ncm",
+    "descricao",
+    "aliquota",
+    "observacao",
+    "vigencia_inicio",
+    "vigencia_fim",
+]
 
-# -------------------------------------------------
-# Encontrar todos os pontos de anexo
-# -------------------------------------------------
-anexo_nodes = []
+# Tags cujo início/fim delimitam um "bloco" de texto (candidato a título de anexo)
+BLOCK_TAGS = {
+    "p", "div", "center", "li", "br", "table", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+}
+# Título de anexo é curto; não precisamos guardar mais que isso de cada bloco
+MAX_HEADING_CHARS = 200
 
-for tag in soup.find_all(True):
-    texto = tag.get_text(strip=True)
-    if texto and ANEXO_REGEX.match(texto):
-        anexo_nodes.append(tag)
+CHUNK_SIZE = 64 * 1024
 
-print(f"🔎 Anexos encontrados: {len(anexo_nodes)}")
 
-# -------------------------------------------------
-# Para cada anexo, coletar tabelas até o próximo
-# -------------------------------------------------
-for idx, anexo_tag in enumerate(anexo_nodes):
-    raw_titulo = anexo_tag.get_text(separator=" ", strip=True).upper()
-
-    # Normalizar espaços e quebras
-    titulo = re.sub(r"\s+", " ", raw_titulo).strip()
-
-    # Nome seguro para arquivo
-    nome_anexo = titulo.replace(" ", "_")
-
-    tabelas = []
-    current = anexo_tag
-
-    while True:
-        current = current.find_next()
-        if not current:
-            break
-
-        # Se achou outro anexo → parar
-        texto = current.get_text(strip=True)
-        if texto and ANEXO_REGEX.match(texto):
-            break
-
-        if current.name == "table":
-            tabelas.append(current)
-
-    if not tabelas:
-        print(f"⚠ Nenhuma tabela encontrada em {nome_anexo}")
-        continue
-
-    csv_path = os.path.join(OUT_DIR, f"{nome_anexo}.csv")
-
-    with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile, delimiter=";")
-        writer.writerow([
-            "anexo",
-            "linha",
-            "ncm",
-            "descricao",
-            "aliquota",
-            "observacao",
-            "vigencia_inicio",
-            "vigencia_fim"
-        ])
+class AnexoRow(NamedTuple):
+    anexo: str          # ex: "ANEXO XIV"
+    tabela: int         # índice da tabela dentro do anexo (0, 1, ...)
+    tr: int             # índice da <tr> dentro da tabela
+    cols: List[str]     # texto de cada <td>/<th>
+    lei: str = LEI_PADRAO  # "LC 123" nos anexos reproduzidos dentro dos ANEXOS XVIII-XXIII
+
+    @property
+    def secao(self) -> str:
+        return secao_id(self.lei, self.anexo)
+
+
+def secao_id(lei: str, anexo: str) -> str:
+    """
+    Identidade da seção: "ANEXO VII" (LC 214) e "LC 123 ANEXO VII" são anexos diferentes.
+    """
+    return anexo if lei == LEI_PADRAO else f"{lei} {anexo}"
+
+
+def _clean(parts: List[str]) -> str:
+    # equivale ao get_text(" ", strip=True) + espaços/quebras internas normalizados
+    return " ".join("".join(parts).split())
+
+
+class FronteiraAnexos:
+    """
+    Decide, linha a linha do texto fora de tabela, onde começa cada anexo.
+
+    "ANEXO X" sozinho na linha só vira fronteira quando a próxima linha de texto
+    é o nome do anexo: caixa alta (anexos da LC 214) ou, dentro de um anexo que
+    reproduz outra lei ("(Lei Complementar nº 123 ...)"), o título do anexo
+    daquela lei ("Alíquotas e Partilha do Simples Nacional - Comércio").
+    Uma tabela antes do nome descarta o candidato.
+    """
+
+    def __init__(self) -> None:
+        self.candidato: Optional[str] = None
+        self.lei_reproduzida: Optional[str] = None
+
+    def tabela(self) -> None:
+        self.candidato = None
+
+    def texto(self, linha: str) -> Optional[Tuple[str, str]]:
+        """
+        (lei, anexo) quando `linha` confirma o título pendente; senão None.
+        """
+        linha = " ".join(linha.split())
+        if not linha:
+            return None
+        candidato, self.candidato = self.candidato, None
+        m = ANEXO_REGEX.match(linha)
+        if m:
+            self.candidato = f"ANEXO {m.group(1)}"
+            return None
+        if candidato is None:
+            return None
+
+        lei = LEI_REGEX.match(linha)
+        if lei:
+            self.lei_reproduzida = f"LC {lei.group(1)}"
+            return LEI_PADRAO, candidato
+        if linha.upper() == linha and any(c.isalpha() for c in linha):
+            self.lei_reproduzida = None
+            return LEI_PADRAO, candidato
+        if self.lei_reproduzida and linha[0].isupper():
+            return self.lei_reproduzida, candidato
+        return None
+
+
+class AnexoHandler:
+    """
+    Recebe eventos start/end/data de qualquer parser (html.parser ou lxml)
+    e guarda só o estado corrente: anexo, tabela, linha e célula.
+    As linhas prontas se acumulam em `rows` até quem alimenta o parser consumi-las.
+    Em `hashes` fica o sha256 do conteúdo (tags + texto) de cada seção de anexo.
+    """
+
+    def __init__(self) -> None:
+        self.fronteira = FronteiraAnexos()
+        self.anexo: Optional[str] = None
+        self.lei = LEI_PADRAO
+        self.tabela_idx = -1
+        self.table_depth = 0
+        self.tr_idx = -1
+        self.row: Optional[List[str]] = None
+        self.cell: Optional[List[str]] = None
+        self.block: List[str] = []
+        self.block_len = 0
+        self.rows: List[AnexoRow] = []
+        self.hashes: Dict[str, "hashlib._Hash"] = {}
+        self._hash = None
+
+    # -------------------------
+    # Blocos de texto fora de tabela -> detecção de "ANEXO X"
+    # -------------------------
+    def _flush_block(self) -> None:
+        if self.block:
+            titulo = self.fronteira.texto(_clean(self.block))
+            if titulo:
+                self.lei, self.anexo = titulo
+                self.tabela_idx = -1
+                self._hash = self.hashes.setdefault(secao_id(self.lei, self.anexo), hashlib.sha256())
+            self.block = []
+            self.block_len = 0
+
+    def _separator(self) -> None:
+        # fronteira de tag separa palavras (<b>ANEXO</b><b>I</b> -> "ANEXO I")
+        if self.cell is not None:
+            self.cell.append(" ")
+        elif self.block:
+            self.block.append(" ")
+
+    def start(self, tag: str) -> None:
+        if self._hash is not None:
+            self._hash.update(f"<{tag}>".encode())
+        if self.table_depth == 0 and tag in BLOCK_TAGS:
+            self._flush_block()
+        else:
+            self._separator()
+
+        if tag == "table":
+            self.table_depth += 1
+            if self.table_depth == 1:
+                self.fronteira.tabela()
+                self.tabela_idx += 1
+                self.tr_idx = -1
+        elif self.table_depth == 1:
+            if tag == "tr":
+                self.tr_idx += 1
+                self.row = []
+            elif tag in ("td", "th") and self.row is not None:
+                self.cell = []
+
+    def end(self, tag: str) -> None:
+        if self._hash is not None:
+            self._hash.update(f"</{tag}>".encode())
+        if tag == "table" and self.table_depth:
+            self.table_depth -= 1
+            return
+
+        if self.table_depth == 1:
+            if tag in ("td", "th") and self.cell is not None and self.row is not None:
+                self.row.append(_clean(self.cell))
+                self.cell = None
+            elif tag == "tr" and self.row is not None:
+                if self.cell is not None:
+                    self.row.append(_clean(self.cell))
+                    self.cell = None
+                if self.anexo:
+                    self.rows.append(AnexoRow(self.anexo, self.tabela_idx, self.tr_idx, self.row, self.lei))
+                self.row = None
+            else:
+                self._separator()
+        elif self.table_depth == 0 and tag in BLOCK_TAGS:
+            self._flush_block()
+        else:
+            self._separator()
+
+    def data(self, data: str) -> None:
+        if self._hash is not None:
+            self._hash.update(data.encode("utf-8"))
+        if self.table_depth:
+            if self.cell is not None:
+                self.cell.append(data)
+        elif self.block_len < MAX_HEADING_CHARS and (self.block or data.strip()):
+            self.block.append(data)
+            self.block_len += len(data)
+
+    def close(self) -> None:
+        self._flush_block()
+
 
+class _StdlibParser(HTMLParser):
+    def __init__(self, handler: AnexoHandler) -> None:
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self.handler.start(tag)
+
+    def handle_endtag(self, tag) -> None:
+        self.handler.end(tag)
+
+    def handle_data(self, data) -> None:
+        self.handler.data(data)
+
+    def close(self) -> None:
+        super().close()
+        self.handler.close()
+
+
+class _LxmlTarget:
+    # interface "target" do lxml: recebe os mesmos eventos, sem montar árvore
+    def __init__(self, handler: AnexoHandler) -> None:
+        self.handler = handler
+
+    def start(self, tag, attrib) -> None:
+        self.handler.start(tag.lower())
+
+    def end(self, tag) -> None:
+        self.handler.end(tag.lower())
+
+    def data(self, data) -> None:
+        self.handler.data(data)
+
+    def comment(self, text) -> None:
+        pass
+
+    def close(self) -> None:
+        self.handler.close()
+
+
+def _make_parser(handler: AnexoHandler, use_lxml: Optional[bool]):
+    """
+    lxml (parser em C, bem mais rápido) se estiver instalado; senão html.parser.
+    """
+    if use_lxml is not False:
+        try:
+            from lxml import etree
+        except ImportError:
+            if use_lxml:
+                raise
+        else:
+            return etree.HTMLParser(target=_LxmlTarget(handler), encoding="utf-8")
+    return _StdlibParser(handler)
+
+
+def iter_anexo_rows(
+    html_path: str = HTML_FILE,
+    encoding: str = "latin-1",
+    use_lxml: Optional[bool] = None,
+    handler: Optional[AnexoHandler] = None,
+) -> Iterator[AnexoRow]:
+    """
+    Percorre o HTML uma vez, em blocos, devolvendo as linhas de tabela de cada anexo.
+    Passe um `handler` para ler os hashes das seções ao final.
+    """
+    handler = handler or AnexoHandler()
+    parser = _make_parser(handler, use_lxml)
+    binary = not isinstance(parser, _StdlibParser)
+    with open(html_path, "r", encoding=encoding) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk.encode("utf-8") if binary else chunk)
+            if handler.rows:
+                yield from handler.rows
+                handler.rows = []
+    parser.close()
+    yield from handler.rows
+
+
+def scan_anexos(html_path: str = HTML_FILE, **kwargs) -> Tuple[Dict[str, List[AnexoRow]], Dict[str, str]]:
+    """
+    Uma passada completa: linhas agrupadas por seção (secao_id) + sha256 de cada seção.
+    """
+    handler = AnexoHandler()
+    por_anexo: Dict[str, List[AnexoRow]] = {}
+    for row in iter_anexo_rows(html_path, handler=handler, **kwargs):
+        por_anexo.setdefault(row.secao, []).append(row)
+    hashes = {anexo: h.hexdigest() for anexo, h in handler.hashes.items()}
+    return por_anexo, hashes
+
+
+def is_data_row(cols: List[str]) -> bool:
+    # Ignorar linhas vazias ou cabeçalho
+    return len(cols) >= 2 and "NCM" not in cols[0].upper()
+
+
+def csv_row(anexo: str, linha: int, cols: List[str]) -> List[str]:
+    return [
+        anexo,
+        str(linha),
+        cols[0],
+        cols[1],
+        cols[2] if len(cols) > 2 else "",
+        "",
+        "",
+        "",
+    ]
+
+
+def write_anexo_csv(csv_path: str, rows: List[AnexoRow]) -> List[Tuple[int, int, int]]:
+    """
+    Grava o CSV de um anexo. Retorna a proveniência de cada linha gerada:
+    (linha no CSV, tabela na seção, <tr> na tabela).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+    origem: List[Tuple[int, int, int]] = []
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(CSV_HEADER)
         linha = 1
-        for table in tabelas:
-            for row in table.find_all("tr"):
-                cols = [
-                    c.get_text(" ", strip=True)
-                    for c in row.find_all(["td", "th"])
-                ]
-
-                # Ignorar linhas vazias ou cabeçalho
-                if len(cols) < 2 or "NCM" in cols[0].upper():
-                    continue
-
-                ncm = cols[0]
-                descricao = cols[1]
-                aliquota = cols[2] if len(cols) > 2 else ""
-
-                writer.writerow([
-                    titulo,
-                    linha,
-                    ncm,
-                    descricao,
-                    aliquota,
-                    "",
-                    "",
-                    ""
-                ])
-                linha += 1
-
-    print(f"✔ Gerado: {csv_path}")
+        for row in rows:
+            if not is_data_row(row.cols):
+                continue
+            writer.writerow(csv_row(row.anexo, linha, row.cols))
+            origem.append((linha, row.tabela, row.tr))
+            linha += 1
+    return origem
+
+
+def extract_anexos(html_path: str = HTML_FILE, out_dir: str = OUT_DIR) -> Dict[str, str]:
+    """
+    Gera um CSV por seção que tenha tabelas. Retorna {secao: caminho_csv}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    gerados: Dict[str, str] = {}
+    linhas: Dict[str, int] = {}
+    files = {}
+    writers = {}
+    try:
+        for row in iter_anexo_rows(html_path):
+            secao = row.secao
+            writer = writers.get(secao)
+            if writer is None:
+                csv_path = os.path.join(out_dir, f"{secao.replace(' ', '_')}.csv")
+                f = open(csv_path, "w", newline="", encoding="utf-8")
+                files[secao] = f
+                writer = writers[secao] = csv.writer(f, delimiter=";")
+                writer.writerow(CSV_HEADER)
+                gerados[secao] = csv_path
+                linhas[secao] = 1
+
+            if not is_data_row(row.cols):
+                continue
+
+            writer.writerow(csv_row(row.anexo, linhas[secao], row.cols))
+            linhas[secao] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    return gerados
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    html_path = argv[0] if len(argv) > 0 else HTML_FILE
+    out_dir = argv[1] if len(argv) > 1 else OUT_DIR
+
+    gerados = extract_anexos(html_path, out_dir)
+    print(f"🔎 Anexos com tabelas: {len(gerados)}")
+    for csv_path in gerados.values():
+        print(f"✔ Gerado: {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
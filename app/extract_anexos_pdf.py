@@ -0,0 +1,259 @@
+"""
+Extrai as tabelas dos anexos da LC 214/2025 direto do PDF oficial para CSV.
+
+    python -m app.extract_anexos_pdf [lc214_2025.pdf] [pasta_saida] [--workers N] [--paginas 120-151]
+
+Mesmo esquema de CSV do extract_anexos (HTML). Cada página é processada em
+um processo separado (pdfplumber é CPU-bound e não libera o GIL): o worker
+devolve, em ordem vertical, as linhas de texto fora de tabela e as tabelas da
+página. O processo principal junta as páginas em ordem, reconhece os títulos
+de anexo com a mesma FronteiraAnexos do HTML (o nome do anexo pode estar na
+página seguinte), atribui cada tabela ao anexo corrente e emenda tabelas que
+continuam de uma página para a outra.
+
+Requer pdfplumber (opcional; não faz parte do requirements.txt da API).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .extract_anexos import BASE_DIR, LEI_PADRAO, OUT_DIR, AnexoRow, FronteiraAnexos, secao_id, write_anexo_csv
+
+try:
+    import pdfplumber  # opcional
+except ImportError:  # pragma: no cover - depende do ambiente
+    pdfplumber = None
+
+PDF_FILE = os.path.join(BASE_DIR, "data/lei/lc214_2025.pdf")
+
+# Cabeçalho/rodapé que o navegador imprime em toda página
+# ("Lcp 214 https://www.planalto.gov.br/...", "130 of 151 23/12/2025, 06:02")
+MARGEM_REGEX = re.compile(r"^(?:\S+\s+\d+\s+https?://|\d+\s+of\s+\d+\b)")
+
+# Evento de página: (top, "texto", "ANEXO XIV") ou (top, "tabela", [[células], ...])
+PageEvent = Tuple[float, str, object]
+
+
+def _clean(cell: Optional[str]) -> str:
+    return " ".join((cell or "").split())
+
+
+def _cells(row: List[Optional[str]]) -> List[str]:
+    # None = célula coberta por rowspan/colspan: no HTML ela nem existe como <td>
+    return [_clean(c) for c in row if c is not None]
+
+
+# -------------------------
+# Worker (um PDF aberto por processo)
+# -------------------------
+_pdf = None
+
+
+def _init_worker(pdf_path: str) -> None:
+    global _pdf
+    _pdf = pdfplumber.open(pdf_path)
+
+
+def page_events(page) -> List[PageEvent]:
+    """
+    Linhas de texto fora de tabela (sem cabeçalho/rodapé) e tabelas da página,
+    ordenadas pelo topo.
+    """
+    tables = page.find_tables()
+    boxes = [t.bbox for t in tables]
+    events: List[PageEvent] = []
+
+    for line in page.extract_text_lines():
+        meio = (line["top"] + line["bottom"]) / 2
+        if any(top <= meio <= bottom for _, top, _, bottom in boxes):
+            continue
+        texto = line["text"].strip()
+        if texto and not MARGEM_REGEX.match(texto):
+            events.append((line["top"], "texto", texto))
+
+    for table in tables:
+        rows = [_cells(row) for row in table.extract()]
+        rows = [r for r in rows if any(r)]
+        if rows:
+            events.append((table.bbox[1], "tabela", rows))
+
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def _page_worker(page_no: int) -> Tuple[int, List[PageEvent]]:
+    page = _pdf.pages[page_no]
+    try:
+        return page_no, page_events(page)
+    finally:
+        page.close()  # libera o cache de objetos da página no worker
+
+
+# -------------------------
+# Montagem (processo principal)
+# -------------------------
+class _Assembler:
+    """
+    Mesmo papel do AnexoHandler do HTML: mantém anexo/tabela/linha correntes
+    e o sha256 do conteúdo de cada seção.
+    """
+
+    def __init__(self) -> None:
+        self.fronteira = FronteiraAnexos()
+        self.anexo: Optional[str] = None
+        self.lei = LEI_PADRAO
+        self.tabela_idx = -1
+        self.tr_idx = -1
+        self.last_row: Optional[List[str]] = None
+        self.pending: Optional[AnexoRow] = None
+        self.hashes: Dict[str, "hashlib._Hash"] = {}
+
+    def _hash(self, *parts: str) -> None:
+        if self.anexo:
+            h = self.hashes.setdefault(secao_id(self.lei, self.anexo), hashlib.sha256())
+            for p in parts:
+                h.update(p.encode("utf-8"))
+                h.update(b"\x1f")
+
+    def page(self, events: List[PageEvent]) -> Iterator[AnexoRow]:
+        primeiro = True
+        for _, kind, payload in events:
+            if kind == "texto":
+                titulo = self.fronteira.texto(payload)
+                if titulo:
+                    yield from self._flush()
+                    self.lei, self.anexo = titulo
+                    self.tabela_idx = -1
+                    self.last_row = None
+                    self._hash(self.anexo)
+                # texto corrido entre tabelas não quebra a continuação de página
+                continue
+            self.fronteira.tabela()
+            yield from self._table(payload, continua=primeiro and self.last_row is not None)
+            primeiro = False
+
+    def _table(self, rows: List[List[str]], continua: bool) -> Iterator[AnexoRow]:
+        if not continua:
+            yield from self._flush()
+            self.tabela_idx += 1
+            self.tr_idx = -1
+        elif not rows[0][0] and self.pending is not None:
+            # linha quebrada na virada da página: emenda célula a célula na anterior
+            prev = self.pending.cols
+            for i, cell in enumerate(rows[0]):
+                if i < len(prev):
+                    prev[i] = f"{prev[i]} {cell}".strip()
+                else:
+                    prev.append(cell)
+            self._hash(*rows[0])
+            rows = rows[1:]
+
+        for cols in rows:
+            self._hash(*cols)
+            yield from self._flush()
+            self.tr_idx += 1
+            if self.anexo:
+                self.pending = AnexoRow(self.anexo, self.tabela_idx, self.tr_idx, cols, self.lei)
+            self.last_row = cols
+
+    def _flush(self) -> Iterator[AnexoRow]:
+        if self.pending is not None:
+            yield self.pending
+            self.pending = None
+
+    def close(self) -> Iterator[AnexoRow]:
+        yield from self._flush()
+
+
+def _page_range(spec: str, total: int) -> List[int]:
+    if not spec:
+        return list(range(total))
+    ini, _, fim = spec.partition("-")
+    # numeração humana (1-based, inclusiva)
+    return list(range(max(int(ini) - 1, 0), min(int(fim or ini), total)))
+
+
+def iter_anexo_rows_pdf(
+    pdf_path: str = PDF_FILE,
+    workers: Optional[int] = None,
+    paginas: str = "",
+    assembler: Optional[_Assembler] = None,
+) -> Iterator[AnexoRow]:
+    """
+    Linhas de tabela de cada anexo, na ordem do documento.
+    As páginas são processadas em paralelo e consumidas em ordem (map preserva a ordem).
+    """
+    if pdfplumber is None:
+        raise RuntimeError("pdfplumber não instalado (pip install pdfplumber)")
+
+    with pdfplumber.open(pdf_path) as pdf:
+        total = len(pdf.pages)
+    pages = _page_range(paginas, total)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pages) or 1))
+    asm = assembler or _Assembler()
+
+    if workers == 1:
+        _init_worker(pdf_path)
+        results = map(_page_worker, pages)
+        for _, events in results:
+            yield from asm.page(events)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(pdf_path,)) as pool:
+            for _, events in pool.map(_page_worker, pages, chunksize=4):
+                yield from asm.page(events)
+    yield from asm.close()
+
+
+def scan_anexos_pdf(pdf_path: str = PDF_FILE, **kwargs) -> Tuple[Dict[str, List[AnexoRow]], Dict[str, str]]:
+    """
+    Equivalente ao scan_anexos do HTML: linhas agrupadas por seção + sha256 de cada seção.
+    """
+    asm = _Assembler()
+    por_anexo: Dict[str, List[AnexoRow]] = {}
+    for row in iter_anexo_rows_pdf(pdf_path, assembler=asm, **kwargs):
+        por_anexo.setdefault(row.secao, []).append(row)
+    hashes = {anexo: h.hexdigest() for anexo, h in asm.hashes.items()}
+    return por_anexo, hashes
+
+
+def extract_anexos_pdf(
+    pdf_path: str = PDF_FILE,
+    out_dir: str = OUT_DIR,
+    workers: Optional[int] = None,
+    paginas: str = "",
+) -> Dict[str, str]:
+    """
+    Gera um CSV por seção que tenha tabelas. Retorna {secao: caminho_csv}.
+    """
+    por_anexo, _ = scan_anexos_pdf(pdf_path, workers=workers, paginas=paginas)
+    gerados: Dict[str, str] = {}
+    for secao, rows in por_anexo.items():
+        csv_path = os.path.join(out_dir, f"{secao.replace(' ', '_')}.csv")
+        write_anexo_csv(csv_path, rows)
+        gerados[secao] = csv_path
+    return gerados
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.extract_anexos_pdf", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", default=PDF_FILE)
+    parser.add_argument("out_dir", nargs="?", default=OUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="processos (default: nº de CPUs)")
+    parser.add_argument("--paginas", default="", help="faixa de páginas, ex: 120-151 (default: todas)")
+    args = parser.parse_args(argv)
+
+    gerados = extract_anexos_pdf(args.pdf, args.out_dir, workers=args.workers, paginas=args.paginas)
+    print(f"🔎 Anexos com tabelas: {len(gerados)}")
+    for csv_path in gerados.values():
+        print(f"✔ Gerado: {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Conversão ICMS/ISS -> IBS/CBS pela tabela de transição do Anexo VII da LC 123/2006
+(valores fixos do MEI, incluído pelo Anexo XXIII da LC 214/2025).
+
+Para cada ano-calendário a tabela dá quanto de cada tributo corresponde à mesma
+base (ICMS R$ 1,00 / ISS R$ 5,00 / CBS R$ 0,994 / IBS R$ 0,006 em 2027-2028, ...).
+O fator de conversão de `origem` no ano-base para `destino` no ano é
+
+    fator = valor(ano, destino) / valor(ano_base, origem)
+
+2026 entra na tabela curada com os valores fixos anteriores à reforma (ICMS
+R$ 1,00 / ISS R$ 5,00, LC 123/2006 art. 18-A, § 3º): o MEI fica fora da fase de
+teste da CBS/IBS, então CBS e IBS são zero e não servem de origem. Antes de 2026
+não há conversão: o ano é recusado (ValueError), com `ano` ou com `anos`.
+
+PIS/COFINS não têm coluna: o MEI não os recolhe em valor fixo (LC 123/2006 art.
+18-A, § 3º), então não há valor de origem a levar para a CBS; são recusados com
+mensagem própria em vez de "tributo desconhecido".
+
+Fontes:
+  - data/anexos/anexo_vii_conversao.csv: tabela curada (uma linha por vigência)
+  - data/conversao/ANEXO_VII.csv: extração bruta da lei; completa os tributos
+    que faltarem na curada
+
+Na carga a tabela vira uma coluna por tributo (um valor por ano) e uma lista de
+fatores por par (origem, destino). Com NumPy instalado, a conversão de uma lista
+de preços inteira é uma multiplicação vetorizada.
+"""
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .rules import norm_code, parse_float_ptbr, read_csv_semicolon
+
+try:
+    import numpy as np  # opcional
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+TRIBUTOS = ("ICMS", "ISS", "CBS", "IBS", "TOTAL")
+# extintos pela CBS, mas sem valor fixo para o MEI (ver docstring do módulo)
+SEM_VALOR_FIXO_MEI = ("PIS", "COFINS", "PIS/COFINS", "PIS/PASEP")
+
+# Ordem dos blocos "ICMS ISS CBS IBS TOTAL" no ANEXO_VII.csv bruto (vigência de cada um)
+VIGENCIAS_ANEXO_VII: List[Tuple[int, Optional[int]]] = [
+    (2027, 2028),
+    (2029, 2029),
+    (2030, 2030),
+    (2031, 2031),
+    (2032, 2032),
+    (2033, None),
+]
+
+VALOR_RE = re.compile(r"R\$\s*([\d.]+,\d+)")
+
+
+@dataclass(frozen=True)
+class VigenciaConversao:
+    ano_inicio: int
+    ano_fim: Optional[int]
+    valores: Dict[str, float]     # tributo -> valor (R$)
+    fundamento: str = ""
+
+
+class ConversaoEngine:
+    """
+    Tabela compilada: anos de `ano_min` a `ano_max`; o último ano vale dali em diante.
+    """
+
+    def __init__(self, vigencias: Sequence[VigenciaConversao]):
+        vigencias = sorted(vigencias, key=lambda v: v.ano_inicio)
+        if not vigencias:
+            raise ValueError("Tabela de conversão (Anexo VII) vazia")
+        self.vigencias = list(vigencias)
+        self.ano_min = vigencias[0].ano_inicio
+        self.ano_max = max(v.ano_fim or v.ano_inicio for v in vigencias)
+
+        # coluna por tributo, um valor por ano (ano_min .. ano_max)
+        self.colunas: Dict[str, List[float]] = {t: [] for t in TRIBUTOS}
+        for ano in range(self.ano_min, self.ano_max + 1):
+            vig = self._vigencia(ano)
+            for t in TRIBUTOS:
+                self.colunas[t].append(vig.valores.get(t, 0.0) if vig else math.nan)
+
+        # fatores no mesmo ano para todos os pares; origem zerada -> NaN
+        self.fatores: Dict[Tuple[str, str], List[float]] = {}
+        for o in TRIBUTOS:
+            for d in TRIBUTOS:
+                self.fatores[(o, d)] = [
+                    vd / vo if vo else math.nan
+                    for vo, vd in zip(self.colunas[o], self.colunas[d])
+                ]
+
+        self._np_colunas = {t: np.asarray(c, dtype=np.float64) for t, c in self.colunas.items()} if np else {}
+        self._np_fatores = {k: np.asarray(f, dtype=np.float64) for k, f in self.fatores.items()} if np else {}
+
+    def _vigencia(self, ano: int) -> Optional[VigenciaConversao]:
+        for v in self.vigencias:
+            if ano >= v.ano_inicio and (v.ano_fim is None or ano <= v.ano_fim):
+                return v
+        return None
+
+    def _idx(self, ano: int) -> int:
+        if ano < self.ano_min:
+            raise ValueError(f"Sem tabela de conversão para {ano} (Anexo VII vale a partir de {self.ano_min})")
+        return min(ano, self.ano_max) - self.ano_min
+
+    @staticmethod
+    def _tributo(nome: str) -> str:
+        t = norm_code(nome)
+        if t in SEM_VALOR_FIXO_MEI:
+            raise ValueError(
+                f"{nome}: o Anexo VII não tem valor fixo de PIS/COFINS para o MEI; "
+                "não há valor de origem para converter em CBS"
+            )
+        if t not in TRIBUTOS:
+            raise ValueError(f"Tributo desconhecido: {nome} (conhecidos: {', '.join(TRIBUTOS)})")
+        return t
+
+    def valores(self, ano: int) -> Dict[str, float]:
+        i = self._idx(ano)
+        return {t: self.colunas[t][i] for t in TRIBUTOS}
+
+    def fator(self, ano: int, origem: str, destino: str, ano_base: Optional[int] = None) -> float:
+        o, d = self._tributo(origem), self._tributo(destino)
+        if ano_base is None:
+            f = self.fatores[(o, d)][self._idx(ano)]
+        else:
+            vo = self.colunas[o][self._idx(ano_base)]
+            f = self.colunas[d][self._idx(ano)] / vo if vo else math.nan
+        if math.isnan(f):
+            raise ValueError(f"{o} zerado no ano-base: sem fator {o} -> {d}")
+        return f
+
+    # -------------------------
+    # API vetorizada
+    # -------------------------
+    def converter(
+        self,
+        valores: Iterable[float],
+        ano: int,
+        origem: str,
+        destino: str,
+        ano_base: Optional[int] = None,
+    ):
+        """
+        Mesmo ano para todos os valores: uma multiplicação pelo fator.
+        Devolve ndarray com NumPy instalado; senão lista.
+        """
+        f = self.fator(ano, origem, destino, ano_base)
+        if np is not None:
+            return np.asarray(valores, dtype=np.float64) * f
+        return [float(v) * f for v in valores]
+
+    def converter_por_ano(
+        self,
+        valores: Sequence[float],
+        anos: Sequence[int],
+        origem: str,
+        destino: str,
+        ano_base: Optional[int] = None,
+    ):
+        """
+        Um ano por valor (listas de preços com vigências diferentes).
+        Ano anterior à tabela -> ValueError, como em fator(); origem zerada
+        naquele ano (ICMS/ISS a partir de 2033) -> NaN só no valor afetado.
+        """
+        o, d = self._tributo(origem), self._tributo(destino)
+        base = self._idx(ano_base) if ano_base is not None else None
+        if len(anos):
+            self._idx(min(anos))
+
+        if np is not None:
+            v = np.asarray(valores, dtype=np.float64)
+            a = np.asarray(anos, dtype=np.int64)
+            idx = np.minimum(a, self.ano_max) - self.ano_min
+            if base is None:
+                fat = self._np_fatores[(o, d)][idx]
+            else:
+                vo = self.colunas[o][base]
+                fat = self._np_colunas[d][idx] / vo if vo else np.full(len(idx), np.nan)
+            return v * fat
+
+        out: List[float] = []
+        for v, ano in zip(valores, anos):
+            i = min(ano, self.ano_max) - self.ano_min
+            if base is None:
+                f = self.fatores[(o, d)][i]
+            else:
+                vo = self.colunas[o][base]
+                f = self.colunas[d][i] / vo if vo else math.nan
+            out.append(float(v) * f)
+        return out
+
+
+# -------------------------
+# Carga
+# -------------------------
+def parse_anexo_vii_bruto(rows: Iterable[Dict[str, str]]) -> List[VigenciaConversao]:
+    """
+    Blocos da extração bruta: linha de cabeçalho ("ICMS;ISS;CBS") seguida da
+    linha de valores ("R$ 1,00;R$ 5,00;R$ 0,994"), na ordem de VIGENCIAS_ANEXO_VII.
+    """
+    cols = ("ncm", "descricao", "aliquota")
+    blocos: List[Dict[str, float]] = []
+    cabecalho: List[str] = []
+    for r in rows:
+        cells = [" ".join((r.get(c) or "").split()) for c in cols]
+        nomes = [norm_code(c) for c in cells]
+        if any(nomes) and all(n in TRIBUTOS for n in nomes if n):
+            cabecalho = nomes
+            continue
+        valores = [VALOR_RE.search(c) for c in cells]
+        if cabecalho and any(valores):
+            blocos.append({
+                t: parse_float_ptbr(m.group(1))
+                for t, m in zip(cabecalho, valores) if t and m
+            })
+            cabecalho = []
+
+    return [
+        VigenciaConversao(ini, fim, valores, "LC 214/2025 Anexo XXIII (extração)")
+        for (ini, fim), valores in zip(VIGENCIAS_ANEXO_VII, blocos)
+    ]
+
+
+def parse_anexo_vii_curado(rows: Iterable[Dict[str, str]]) -> List[VigenciaConversao]:
+    out = []
+    for r in rows:
+        ini = (r.get("ano_inicio") or "").strip()
+        if not ini.isdigit():
+            continue
+        fim = (r.get("ano_fim") or "").strip()
+        valores = {}
+        for t in TRIBUTOS:
+            v = parse_float_ptbr(r.get(t.lower()))
+            if v is not None:
+                valores[t] = v
+        out.append(VigenciaConversao(int(ini), int(fim) if fim.isdigit() else None, valores,
+                                     (r.get("fundamento_legal") or "").strip()))
+    return out
+
+
+def load_conversao(curado_csv: str, bruto_csv: str) -> Optional[ConversaoEngine]:
+    curado = parse_anexo_vii_curado(read_csv_semicolon(curado_csv))
+    bruto = {v.ano_inicio: v for v in parse_anexo_vii_bruto(read_csv_semicolon(bruto_csv))}
+
+    vigencias = []
+    for v in curado:
+        b = bruto.pop(v.ano_inicio, None)
+        if b is not None:
+            # a curada prevalece; a bruta só completa tributos ausentes
+            v = VigenciaConversao(v.ano_inicio, v.ano_fim, {**b.valores, **v.valores}, v.fundamento)
+        vigencias.append(v)
+    vigencias.extend(bruto.values())
+
+    return ConversaoEngine(vigencias) if vigencias else None
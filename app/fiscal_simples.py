@@ -0,0 +1,277 @@
+"""
+Simples Nacional: faixa e alíquota efetiva pela receita bruta dos últimos 12 meses (RBT12).
+
+    aliquota_efetiva = (RBT12 x aliquota_nominal - parcela_a_deduzir) / RBT12
+
+Tabelas (LC 123/2006, Anexos I a V, com a versão de transição da LC 214/2025):
+  - data/simples/ANEXO_I..V.csv: faixas e alíquotas nominais por vigência
+  - data/anexos/simples_faixas.csv: parcela a deduzir por (anexo, faixa); também
+    serve de tabela completa quando o CSV do anexo não existe
+
+Cada tabela é compilada uma vez em listas ordenadas; achar a faixa é um bisect.
+"""
+from __future__ import annotations
+
+import os
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .rules import norm_code, parse_float_ptbr, read_csv_semicolon
+
+ANEXOS = ("I", "II", "III", "IV", "V")
+REGIMES_SIMPLES = ("SN", "SIMPLES", "SIMPLES_NACIONAL", "REGIME_SIMPLES")
+
+# Ordem das tabelas de faixas dentro de cada data/simples/ANEXO_X.csv:
+# a primeira vale para 2027-2028 (LC 214/2025); a segunda é a tabela da LC 123
+# (antes de 2027 e a partir de 2029).
+VIGENCIAS_BLOCOS: List[Tuple[Optional[int], Optional[int]]] = [(2027, 2028), (None, None)]
+
+FAIXA_RE = re.compile(r"^(\d)\s*(?:ª|a)?\s*Faixa$", re.IGNORECASE)
+VALOR_RE = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{2}")
+
+
+def is_simples(regime: Optional[str]) -> bool:
+    return norm_code(regime or "") in REGIMES_SIMPLES
+
+
+def norm_anexo(anexo: Optional[str]) -> str:
+    # aceita "III", "anexo iii", "ANEXO_III", "3"
+    a = norm_code(anexo or "").replace("ANEXO", "").replace("_", "").strip()
+    if a.isdigit() and 1 <= int(a) <= len(ANEXOS):
+        return ANEXOS[int(a) - 1]
+    return a
+
+
+@dataclass(frozen=True)
+class FaixaSimples:
+    anexo: str
+    faixa: int
+    receita_inicial: float
+    receita_final: float
+    aliquota_nominal: float     # fração (0.04 = 4%)
+    valor_deduzir: float
+
+    def aliquota_efetiva(self, rbt12: float) -> float:
+        # início de atividade (sem receita) usa a nominal da faixa
+        if rbt12 <= 0:
+            return self.aliquota_nominal
+        return (rbt12 * self.aliquota_nominal - self.valor_deduzir) / rbt12
+
+    def resultado(self, rbt12: float) -> "ResultadoSimples":
+        return ResultadoSimples(
+            anexo=self.anexo,
+            faixa=self.faixa,
+            receita_inicial=self.receita_inicial,
+            receita_final=self.receita_final,
+            aliquota_nominal=self.aliquota_nominal,
+            valor_deduzir=self.valor_deduzir,
+            aliquota_efetiva=self.aliquota_efetiva(rbt12),
+        )
+
+
+@dataclass
+class TabelaSimples:
+    anexo: str
+    ano_inicio: Optional[int]
+    ano_fim: Optional[int]
+    faixas: List[FaixaSimples]
+
+    def __post_init__(self) -> None:
+        self.faixas.sort(key=lambda f: f.receita_final)
+        self.limites = [f.receita_final for f in self.faixas]
+
+    def vale_para(self, ano: int) -> bool:
+        return (self.ano_inicio is None or ano >= self.ano_inicio) and (self.ano_fim is None or ano <= self.ano_fim)
+
+    def faixa(self, rbt12: float) -> Optional[FaixaSimples]:
+        """
+        Faixa da RBT12 (limite superior inclusivo). None acima do teto do Simples.
+        """
+        i = bisect_left(self.limites, rbt12)
+        return self.faixas[i] if i < len(self.faixas) else None
+
+
+@dataclass(frozen=True)
+class ResultadoSimples:
+    anexo: str
+    faixa: int
+    receita_inicial: float
+    receita_final: float
+    aliquota_nominal: float
+    valor_deduzir: float
+    aliquota_efetiva: float
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "anexo": self.anexo,
+            "faixa": self.faixa,
+            "receita_inicial": self.receita_inicial,
+            "receita_final": self.receita_final,
+            "aliquota_nominal": self.aliquota_nominal,
+            "valor_deduzir": self.valor_deduzir,
+            "aliquota_efetiva": self.aliquota_efetiva,
+        }
+
+
+class SimplesEngine:
+    def __init__(self, tabelas: Dict[str, List[TabelaSimples]]):
+        self.tabelas = tabelas
+
+    def tabela(self, anexo: str, ano: int) -> Optional[TabelaSimples]:
+        for t in self.tabelas.get(norm_anexo(anexo), ()):
+            if t.vale_para(ano):
+                return t
+        return None
+
+    def faixa(self, anexo: str, ano: int, rbt12: float) -> Optional[FaixaSimples]:
+        t = self.tabela(anexo, ano)
+        return t.faixa(rbt12) if t else None
+
+    def calcular(self, anexo: str, ano: int, rbt12: float) -> Optional[ResultadoSimples]:
+        f = self.faixa(anexo, ano, rbt12)
+        if f is None:
+            return None
+        return f.resultado(rbt12)
+
+    def calcular_carteira(
+        self,
+        empresas: Sequence[Tuple[str, float]],
+        ano: int,
+    ) -> List[Optional[ResultadoSimples]]:
+        """
+        Lote de (anexo, RBT12) para o mesmo ano. A tabela de cada anexo é
+        resolvida uma vez; cada empresa custa um bisect.
+        """
+        tabelas: Dict[str, Optional[TabelaSimples]] = {}
+        out: List[Optional[ResultadoSimples]] = []
+        for anexo, rbt12 in empresas:
+            a = norm_anexo(anexo)
+            if a not in tabelas:
+                tabelas[a] = self.tabela(a, ano)
+            t = tabelas[a]
+            f = t.faixa(rbt12) if t else None
+            out.append(f.resultado(rbt12) if f else None)
+        return out
+
+    def avaliar(
+        self,
+        regime: Optional[str],
+        anexo: Optional[str],
+        ano: int,
+        rbt12: Optional[float],
+    ) -> Dict[str, object]:
+        """
+        Bloco do Simples para o classify: {"simples": dict|None, "fundamentos": [...], "pendencias": [...]}.
+        Fora do Simples (regime diferente de SN) devolve tudo vazio.
+        """
+        out: Dict[str, object] = {"simples": None, "fundamentos": [], "pendencias": []}
+        if not is_simples(regime):
+            return out
+        if not anexo or rbt12 is None:
+            out["pendencias"].append("Emitente do Simples Nacional: informe anexo_simples e rbt12 para a alíquota efetiva")
+            return out
+
+        t = self.tabela(anexo, ano)
+        if t is None:
+            out["pendencias"].append(f"Anexo do Simples Nacional desconhecido: {anexo}")
+            return out
+        f = t.faixa(rbt12)
+        if f is None:
+            # sem o valor da RBT12 no texto: o resultado é cacheado por faixa
+            out["pendencias"].append(f"RBT12 acima do limite do Simples Nacional ({t.limites[-1]:,.2f})")
+            return out
+
+        res = f.resultado(rbt12)
+        out["simples"] = res.as_dict()
+        out["fundamentos"].append({
+            "regra": "LC 123/2006 art. 18",
+            "motivo": (
+                f"Simples Nacional Anexo {res.anexo}, {res.faixa}ª faixa: alíquota nominal "
+                f"{res.aliquota_nominal * 100:.2f}% e parcela a deduzir {res.valor_deduzir:,.2f}"
+            ),
+            "fonte": f"data/simples/ANEXO_{res.anexo}.csv / simples_faixas.csv",
+        })
+        return out
+
+
+# -------------------------
+# Carga
+# -------------------------
+def _limites(texto: str) -> Optional[Tuple[float, float]]:
+    # "Até 180.000,00" / "De 180.000,01 a 360.000,00"
+    valores = [parse_float_ptbr(v) for v in VALOR_RE.findall(texto)]
+    if len(valores) == 1 and texto.strip().lower().startswith("at"):
+        return 0.0, valores[0]
+    if len(valores) == 2:
+        return valores[0], valores[1]
+    return None
+
+
+def parse_anexo_simples(
+    rows: Iterable[Dict[str, str]],
+    anexo: str,
+    deducoes: Dict[Tuple[str, int], float],
+) -> List[TabelaSimples]:
+    """
+    Blocos "Receita Bruta em 12 Meses / Alíquota" do CSV bruto do anexo, na ordem
+    do arquivo. As tabelas de repartição dos tributos que vêm em seguida são ignoradas.
+    """
+    blocos: List[List[FaixaSimples]] = []
+    for r in rows:
+        rotulo = " ".join((r.get("ncm") or "").split())
+        texto = " ".join((r.get("descricao") or "").split())
+        if rotulo.lower().startswith("receita bruta"):
+            blocos.append([])
+            continue
+        m = FAIXA_RE.match(rotulo)
+        lim = _limites(texto) if m else None
+        if not blocos or lim is None:
+            continue
+        n = int(m.group(1))
+        nominal = parse_float_ptbr(r.get("aliquota"))
+        if nominal is None:
+            continue
+        blocos[-1].append(FaixaSimples(
+            anexo=anexo,
+            faixa=n,
+            receita_inicial=lim[0],
+            receita_final=lim[1],
+            aliquota_nominal=nominal / 100.0,
+            valor_deduzir=deducoes.get((anexo, n), 0.0),
+        ))
+
+    tabelas = []
+    for (ini, fim), faixas in zip(VIGENCIAS_BLOCOS, blocos):
+        if faixas:
+            tabelas.append(TabelaSimples(anexo, ini, fim, faixas))
+    # tabela "padrão" por último: as de vigência específica têm prioridade
+    tabelas.sort(key=lambda t: t.ano_inicio is None)
+    return tabelas
+
+
+def load_simples(simples_dir: str, faixas_csv: str) -> SimplesEngine:
+    faixas_rows = read_csv_semicolon(faixas_csv)
+    deducoes: Dict[Tuple[str, int], float] = {}
+    por_anexo: Dict[str, List[FaixaSimples]] = {}
+    for r in faixas_rows:
+        anexo = norm_anexo(r.get("anexo") or "I")
+        n = int(r.get("faixa") or 0)
+        deducoes[(anexo, n)] = parse_float_ptbr(r.get("valor_deduzir")) or 0.0
+        por_anexo.setdefault(anexo, []).append(FaixaSimples(
+            anexo=anexo,
+            faixa=n,
+            receita_inicial=parse_float_ptbr(r.get("receita_inicial")) or 0.0,
+            receita_final=parse_float_ptbr(r.get("receita_final")) or 0.0,
+            aliquota_nominal=parse_float_ptbr(r.get("aliquota_global")) or 0.0,
+            valor_deduzir=deducoes[(anexo, n)],
+        ))
+
+    tabelas: Dict[str, List[TabelaSimples]] = {}
+    for anexo in ANEXOS:
+        path = os.path.join(simples_dir, f"ANEXO_{anexo}.csv")
+        tabelas[anexo] = parse_anexo_simples(read_csv_semicolon(path), anexo, deducoes)
+        if not tabelas[anexo] and anexo in por_anexo:
+            tabelas[anexo] = [TabelaSimples(anexo, None, None, por_anexo[anexo])]
+    return SimplesEngine(tabelas)
@@ -0,0 +1,197 @@
+"""
+Gravação de tráfego real (amostrado e anonimizado) para o replay do bench.
+
+    REPLAY_RECORD=data/trafego.ndjson.gz REPLAY_SAMPLE_RATE=0.05 uvicorn app.main:app
+    python -m bench.replay data/trafego.ndjson.gz
+
+Cada linha: {"ts": epoch, "path": "/classificar" | "/classificar-lote", "corpo": {...}}.
+
+O endpoint só sorteia e enfileira o request já validado; anonimizar e gravar fica
+com uma thread por processo, em lotes, como a trilha de auditoria. Cada lote vai
+num único write com O_APPEND (em .gz, um membro gzip completo por lote): vários
+workers podem gravar no mesmo arquivo.
+
+Anonimização: o que define a chave de cache (NCM, CFOP, UFs, regime, CST, ano,
+municípios) fica como está, para o replay reproduzir a distribuição real. O que
+identifica cliente/produto vira hash (mesmo valor -> mesmo hash, mantém as
+repetições); valores monetários ficam com 2 algarismos significativos.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Deque, Dict, Optional, Tuple
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+
+# -------------------------
+# Configuração (variáveis de ambiente)
+# -------------------------
+# REPLAY_RECORD=data/trafego.ndjson.gz   arquivo da gravação (.gz comprime); vazio = desligada
+# REPLAY_SAMPLE_RATE=0.01                fração das requisições gravadas
+# REPLAY_SALT=...                        segredo dos hashes; defina para o mesmo valor virar o mesmo
+#                                        hash em todos os workers/subidas (default: aleatório por processo)
+# REPLAY_FILA_MAX=10000                  requisições pendentes na memória; acima disso descarta
+@dataclass
+class GravacaoConfig:
+    destino: str = ""
+    sample_rate: float = 0.01
+    salt: str = ""
+    fila_max: int = 10_000
+    flush_s: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "GravacaoConfig":
+        return cls(
+            destino=os.getenv("REPLAY_RECORD", "").strip(),
+            sample_rate=float(os.getenv("REPLAY_SAMPLE_RATE", "0.01") or 0),
+            salt=os.getenv("REPLAY_SALT", "") or secrets.token_hex(16),
+            fila_max=max(1, int(os.getenv("REPLAY_FILA_MAX", "10000") or 10_000)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.destino) and self.sample_rate > 0
+
+
+# -------------------------
+# Anonimização
+# -------------------------
+_DIGITOS = ("cadastro_suframa_emitente", "cadastro_suframa_destinatario", "dfe_referenciado_chave")
+_MONETARIOS = ("valor_item", "preco", "rbt12")
+
+
+def _hash(salt: str, valor: Any) -> str:
+    return hashlib.sha256(f"{salt}|{valor}".encode("utf-8")).hexdigest()
+
+
+def _digitos(salt: str, valor: str) -> str:
+    # mesmo tamanho, só dígitos (chave de NF-e, SUFRAMA): validações de formato continuam passando
+    if not valor:
+        return valor
+    return str(int(_hash(salt, valor), 16)).rjust(len(valor), "0")[: len(valor)]
+
+
+def _significativos(v: Any, n: int = 2) -> Any:
+    if not isinstance(v, (int, float)) or isinstance(v, bool) or not v:
+        return v
+    return round(v, n - 1 - int(math.floor(math.log10(abs(v)))))
+
+
+def anonimizar(corpo: Dict[str, Any], salt: str) -> Dict[str, Any]:
+    out = dict(corpo)
+    for k in _DIGITOS:
+        if isinstance(out.get(k), str):
+            out[k] = _digitos(salt, out[k])
+    if out.get("refs_pag_antecipado"):
+        out["refs_pag_antecipado"] = [_digitos(salt, str(r)) for r in out["refs_pag_antecipado"]]
+    for k in _MONETARIOS:
+        if k in out:
+            out[k] = _significativos(out[k])
+    if out.get("cditem") is not None:
+        out["cditem"] = "SKU-" + _hash(salt, out["cditem"])[:10]
+    if out.get("deitem"):
+        out["deitem"] = "ITEM-" + _hash(salt, out["deitem"])[:10]
+    if isinstance(out.get("itens"), list):
+        out["itens"] = [anonimizar(i, salt) if isinstance(i, dict) else i for i in out["itens"]]
+    return out
+
+
+# -------------------------
+# Gravador
+# -------------------------
+class GravadorTrafego:
+    def __init__(self, config: GravacaoConfig):
+        self.config = config
+        self._fila: Deque[Tuple[float, str, "BaseModel"]] = deque()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    @classmethod
+    def from_env(cls) -> Optional["GravadorTrafego"]:
+        config = GravacaoConfig.from_env()
+        return cls(config) if config.enabled else None
+
+    def _apos_fork(self) -> None:
+        self._fila = deque()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def registrar(self, path: str, corpo: "BaseModel") -> None:
+        if random.random() >= self.config.sample_rate:
+            return
+        if self._thread is None:
+            self.iniciar()
+        if len(self._fila) >= self.config.fila_max:
+            metrics.GRAVACAO_TOTAL.inc("descartada")
+            return
+        self._fila.append((time.time(), path, corpo))
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name="gravacao-trafego", daemon=True)
+            self._thread.start()
+
+    def parar(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._parar.set()
+        self._acordar.set()
+        thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._parar.is_set():
+            self._acordar.wait(self.config.flush_s)
+            self._drenar()
+        self._drenar()
+
+    def _drenar(self) -> None:
+        fila = self._fila
+        linhas = []
+        while fila:
+            ts, path, corpo = fila.popleft()
+            dados = anonimizar(corpo.model_dump(mode="json", by_alias=True, exclude_none=True), self.config.salt)
+            linhas.append(json.dumps({"ts": round(ts, 3), "path": path, "corpo": dados}, ensure_ascii=False))
+        if not linhas:
+            return
+        bloco = ("\n".join(linhas) + "\n").encode("utf-8")
+        if self.config.destino.endswith(".gz"):
+            bloco = gzip.compress(bloco)
+        try:
+            d = os.path.dirname(os.path.abspath(self.config.destino))
+            os.makedirs(d, exist_ok=True)
+            fd = os.open(self.config.destino, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                resto = memoryview(bloco)
+                while resto:
+                    resto = resto[os.write(fd, resto):]
+            finally:
+                os.close(fd)
+        except OSError:
+            metrics.GRAVACAO_TOTAL.inc("erro", amount=len(linhas))
+            return
+        metrics.GRAVACAO_TOTAL.inc("gravada", amount=len(linhas))
@@ -1,5 +1,6 @@
 import csv
 import os
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 
@@ -38,15 +39,29 @@ def fundamento(regra: str, motivo: str) -> Dict[str, str]:
 
 
 # =================================================
-# Carga inicial (em memória)
+# Carga sob demanda (em memória, uma vez por processo)
 # =================================================
 
-CCLASTRIB_TABLE = load_csv("cclastrib.csv")
-IBS_TABLE = load_csv("ibs_aliquotas.csv")
-CBS_TABLE = load_csv("cbs_aliquotas.csv")
-TRANS_IBS = load_csv("transicao_ibs.csv")
-TRANS_CBS = load_csv("transicao_cbs.csv")
-NCM_EXCECOES = load_csv("ncm_excecoes.csv")
+_TABELAS = {
+    "CCLASTRIB_TABLE": "cclastrib.csv",
+    "IBS_TABLE": "ibs_aliquotas.csv",
+    "CBS_TABLE": "cbs_aliquotas.csv",
+    "TRANS_IBS": "transicao_ibs.csv",
+    "TRANS_CBS": "transicao_cbs.csv",
+    "NCM_EXCECOES": "ncm_excecoes.csv",
+}
+
+
+@lru_cache(maxsize=None)
+def tabela(nome: str) -> List[Dict]:
+    return load_csv(_TABELAS[nome])
+
+
+def __getattr__(nome: str) -> List[Dict]:
+    # loader.CCLASTRIB_TABLE etc. continuam funcionando, mas só leem o CSV no primeiro acesso
+    if nome in _TABELAS:
+        return tabela(nome)
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 
 # =================================================
@@ -73,7 +88,7 @@ def resolver_cclastrib(payload: dict) -> Optional[Dict]:
     emit = payload["emitente"]
     dest = payload["destinatario"]
 
-    for row in CCLASTRIB_TABLE:
+    for row in tabela("CCLASTRIB_TABLE"):
         if (
             match(payload["tipo_operacao"], row["tipo_operacao"])
             and match(payload.get("cfop", ""), row["cfop"])
@@ -138,7 +153,7 @@ def aplicar_excecao_ncm(
     ncm: str,
     ano: int
 ) -> Optional[Dict]:
-    for row in NCM_EXCECOES:
+    for row in tabela("NCM_EXCECOES"):
         if row["ncm"] == ncm and int(row["ano"]) == ano:
             return row
     return None
@@ -169,8 +184,8 @@ def calcular_tributos(payload: dict) -> Dict:
     # ---------------------------------------------
     # 2) Buscar alíquotas base
     # ---------------------------------------------
-    ibs_base = buscar_aliquota(IBS_TABLE, codigo, ano)
-    cbs_base = buscar_aliquota(CBS_TABLE, codigo, ano)
+    ibs_base = buscar_aliquota(tabela("IBS_TABLE"), codigo, ano)
+    cbs_base = buscar_aliquota(tabela("CBS_TABLE"), codigo, ano)
 
     if not ibs_base or not cbs_base:
         return {"pendencia": "Alíquotas não encontradas para o ano informado"}
@@ -181,8 +196,8 @@ def calcular_tributos(payload: dict) -> Dict:
     # ---------------------------------------------
     # 3) Aplicar transição
     # ---------------------------------------------
-    ibs = aplicar_transicao(ibs, TRANS_IBS, ano)
-    cbs = aplicar_transicao(cbs, TRANS_CBS, ano)
+    ibs = aplicar_transicao(ibs, tabela("TRANS_IBS"), ano)
+    cbs = aplicar_transicao(cbs, tabela("TRANS_CBS"), ano)
 
     # ---------------------------------------------
     # 4) Exceção por NCM
@@ -1,14 +1,51 @@
 from __future__ import annotations
 
+import json
 import os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+
+import anyio
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from .schemas import ClassifyRequest, ClassifyResponse, ClassifyLoteResponse, ClassifyLoteRequest
+from .schemas import SimplesCarteiraRequest, SimplesCarteiraResponse
+from .schemas import ConverterRequest, ConverterResponse
+from .schemas import SimulacaoRequest, SimulacaoResponse
+from .schemas import AuditoriaRequest
+from .schemas import NcmBuscaResponse
+from .auditoria import REPORT_HEADER
 from .agent import CClastribAgent
+from .serialization import NegotiatedRoute, render_response
+from .profiling import install_profiling, profiled
+from .gravacao import GravadorTrafego
+from .warmup import KeyLogRecorder, Readiness
+from . import metrics
 
 APP_NAME = "cclastrib-agent"
-app = FastAPI(title=APP_NAME, version="1.0.0")
+# Warm-up do cache (WARMUP_*); /health é liveness, /health/ready é readiness
+readiness = Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # em segundo plano: o processo já responde /health enquanto aquece
+    readiness.start(agent)
+    if agent.trilha is not None:
+        agent.trilha.iniciar()
+    yield
+    # grava o que ainda estiver nas filas antes de o worker sair
+    if agent.trilha is not None:
+        agent.trilha.parar()
+    if gravador is not None:
+        gravador.parar()
+
+
+app = FastAPI(title=APP_NAME, version="1.0.0", lifespan=lifespan)
+# Corpo em JSON (default), MessagePack ou CBOR conforme Content-Type
+app.router.route_class = NegotiatedRoute
+# Profiling amostrado (opt-in via PROFILE_ENABLED + PROFILE_TOKEN); perfis em /admin/profiles
+install_profiling(app)
 
 
 def get_data_anexos_dir() -> str:
@@ -18,7 +55,23 @@ def get_data_anexos_dir() -> str:
     return os.path.abspath(base)
 
 
-agent = CClastribAgent(data_anexos_dir=get_data_anexos_dir(), cache_ttl_seconds=int(os.getenv("CACHE_TTL", "3600")))
+# CACHE_L2_PATH (ex: /tmp/cclastrib-cache.sqlite): cache em disco compartilhado entre workers e restarts
+# LOAD_WORKERS (default: nº de CPUs, até 8): threads da carga das tabelas; 1 = sequencial
+# LLM_BACKEND (openai/stub; vazio = desligado): revisão dos resultados de baixa confiança (?revisao_llm=true)
+agent = CClastribAgent(
+    data_anexos_dir=get_data_anexos_dir(),
+    cache_ttl_seconds=int(os.getenv("CACHE_TTL", "3600")),
+    l2_path=os.getenv("CACHE_L2_PATH") or None,
+)
+
+if readiness.config.record and readiness.config.keylog:
+    agent.keylog = KeyLogRecorder(readiness.config.keylog)
+
+# AUDIT_LOG (diretório NDJSON .gz ou arquivo .sqlite): trilha de auditoria de cada decisão (app/trilha.py)
+agent.ligar_trilha()
+
+# REPLAY_RECORD + REPLAY_SAMPLE_RATE: amostra anonimizada do /classificar(-lote) para o bench.replay
+gravador = GravadorTrafego.from_env()
 
 
 @app.get("/health")
@@ -26,22 +79,132 @@ def health():
     return {"status": "ok", "data_dir": agent.data_anexos_dir}
 
 
+@app.get("/health/ready")
+def health_ready():
+    body = {"ready": readiness.ready, "warmup": readiness.report.as_dict()}
+    return JSONResponse(body, status_code=200 if readiness.ready else 503)
+
+
+# compacto=true: omite campos None/default e blocos XML vazios; comprime (gzip/br) conforme Accept-Encoding
+# Accept: application/msgpack ou application/cbor devolve o mesmo schema em formato binário
+COMPACTO_QUERY = Query(False, description="Resposta compacta (sem nulos/defaults), comprimida se o cliente aceitar")
+REVISAO_QUERY = Query(
+    False, description="Revisa por LLM os itens com confiança abaixo de LLM_CONFIANCA_MIN (exige LLM_BACKEND)"
+)
+
+
+def _exige_revisor() -> None:
+    if agent.revisor is None:
+        raise HTTPException(status_code=400, detail="Revisão por LLM desligada (configure LLM_BACKEND)")
+
+
+def _exige_sugestor_ncm() -> None:
+    if not agent.sugestao_ncm_disponivel():
+        raise HTTPException(status_code=400, detail="Sugestão de NCM indisponível (requer o pacote numpy)")
+
+
 @app.post("/classificar", response_model=ClassifyResponse)
-def classificar(req: ClassifyRequest):
+@profiled
+def classificar(
+    req: ClassifyRequest, request: Request, compacto: bool = COMPACTO_QUERY, revisao_llm: bool = REVISAO_QUERY
+):
+    if gravador is not None:
+        gravador.registrar("/classificar", req)
+    if revisao_llm:
+        _exige_revisor()
     try:
-        return agent.handle(req)
+        resp = agent.handle(req)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if revisao_llm:
+        # endpoint síncrono (threadpool): as chamadas ao modelo rodam no event loop
+        resp = anyio.from_thread.run(agent.revisar_llm, [(req, resp, None)])[0]
+    return render_response(resp, request, compacto)
     
 @app.post("/classificar-lote", response_model=ClassifyLoteResponse)
-def classificar_lote(req: ClassifyLoteRequest):
-    return agent.handle_lote(req)
+@profiled
+def classificar_lote(
+    req: ClassifyLoteRequest, request: Request, compacto: bool = COMPACTO_QUERY, revisao_llm: bool = REVISAO_QUERY
+):
+    if gravador is not None:
+        gravador.registrar("/classificar-lote", req)
+    if revisao_llm:
+        _exige_revisor()
+    if req.sugerir_ncm:
+        _exige_sugestor_ncm()
+    resp = agent.handle_lote(req)
+    if revisao_llm:
+        resp = anyio.from_thread.run(agent.revisar_lote_llm, req, resp)
+    return render_response(resp, request, compacto)
+
+@app.post("/simples/carteira", response_model=SimplesCarteiraResponse)
+def simples_carteira(req: SimplesCarteiraRequest, request: Request, compacto: bool = COMPACTO_QUERY):
+    # alíquota efetiva do Simples Nacional para uma carteira inteira de empresas
+    try:
+        resp = agent.handle_simples_carteira(req)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return render_response(resp, request, compacto)
+
+@app.post("/converter", response_model=ConverterResponse)
+def converter(req: ConverterRequest, request: Request, compacto: bool = COMPACTO_QUERY):
+    # ICMS/ISS -> IBS/CBS (Anexo VII) para uma lista de valores de uma vez
+    try:
+        resp = agent.handle_converter(req)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return render_response(resp, request, compacto)
+
+@app.post("/simular", response_model=SimulacaoResponse)
+@profiled
+def simular(req: SimulacaoRequest, request: Request, compacto: bool = COMPACTO_QUERY):
+    # curva da transição: alíquotas e valores de cada item para cada ano do período
+    try:
+        resp = agent.handle_simulacao(req)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return render_response(resp, request, compacto)
+
+@app.post("/auditoria/ncm")
+def auditoria_ncm(req: AuditoriaRequest, formato: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    # só os SKUs com problema, uma linha por SKU, enviadas à medida que saem
+    linhas = agent.handle_auditoria(req)
+    if formato == "csv":
+        def gen_csv():
+            yield ";".join(REPORT_HEADER) + "\n"
+            for r in linhas:
+                yield ";".join(str(r.get(k, "")).replace(";", ",") for k in REPORT_HEADER) + "\n"
+        return StreamingResponse(gen_csv(), media_type="text/csv; charset=utf-8")
+    return StreamingResponse(
+        (json.dumps(r, ensure_ascii=False) + "\n" for r in linhas),
+        media_type="application/x-ndjson",
+    )
+
+@app.get("/ncm/search", response_model=NcmBuscaResponse)
+def ncm_search(
+    request: Request,
+    q: str = Query(..., min_length=2, description='Descrição do produto, ex: "escova de dentes"'),
+    pagina: int = Query(1, ge=1),
+    tamanho: int = Query(20, ge=1, le=100),
+    compacto: bool = COMPACTO_QUERY,
+):
+    # NCMs de 8 dígitos por relevância (BM25), tolerante a acentos, plurais e erros de digitação
+    return render_response(agent.handle_ncm_busca(q, pagina, tamanho), request, compacto)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    # formato texto do Prometheus; métricas são por processo (worker)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/reload")
 def reload_sources():
     # Recarrega CSVs sem reiniciar container
     try:
         agent.reload_sources()
+        # cache zerado: reaquece em segundo plano (readiness volta a 503 até terminar)
+        readiness.start(agent)
         return {"ok": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+
+# -------------------------
+# Métricas in-process (formato texto do Prometheus)
+# -------------------------
+# Sem dependência de prometheus_client: cada observação é um incremento
+# em memória sob um lock; o custo de formatar só existe quando /metrics é lido.
+# Com vários workers, cada processo expõe os próprios números.
+
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+# chamadas a modelo (revisão por LLM): segundos, não micro
+LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOTE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, labels)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # por label: [contagens por bucket (não cumulativas) + overflow, soma, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(labelvalues)
+            if serie is None:
+                serie = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][idx] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for labels, (counts, total, n) in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = f'le="{_fmt_value(le)}"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le_label)} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+REGISTRY: List = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Métricas da aplicação
+# -------------------------
+STAGE_SECONDS = register(Histogram(
+    "cclastrib_stage_seconds",
+    "Tempo por etapa da classificação (rules.classify, montagem da resposta e serialização)",
+    ["stage"],
+))
+CACHE_TOTAL = register(Counter(
+    "cclastrib_cache_total",
+    "Consultas ao cache de classificação por resultado (hit/miss)",
+    ["result"],
+))
+CACHE_L2_TOTAL = register(Counter(
+    "cclastrib_cache_l2_total",
+    "Consultas ao cache em disco (CACHE_L2_PATH) por resultado (hit/miss/erro)",
+    ["result"],
+))
+COALESCED_TOTAL = register(Counter(
+    "cclastrib_coalesced_total",
+    "Misses que esperaram a classificação já em andamento da mesma chave (single-flight)",
+))
+NCM_SOURCE_TOTAL = register(Counter(
+    "cclastrib_ncm_source_total",
+    "Onde o NCM foi encontrado (excecao/master/oficial/none)",
+    ["source"],
+))
+FALLBACK_REGRA_GERAL_TOTAL = register(Counter(
+    "cclastrib_fallback_regra_geral_total",
+    "Classificações sem match em cclastrib.csv (REGRA-GERAL)",
+))
+ANEXO_BENEFICIO_TOTAL = register(Counter(
+    "cclastrib_anexo_beneficio_total",
+    "Itens enquadrados em anexo da LC 214/2025 (beneficios_anexos.csv), aplicados ou só candidatos",
+    ["anexo", "resultado"],
+))
+LOTE_ITENS = register(Histogram(
+    "cclastrib_lote_itens",
+    "Quantidade de itens por chamada com lote de itens, por rota (/classificar-lote, /simular)",
+    ["rota"],
+    buckets=LOTE_BUCKETS,
+))
+LLM_ITENS_TOTAL = register(Counter(
+    "cclastrib_llm_itens_total",
+    "Itens de baixa confiança enviados à revisão por LLM por resultado (cache/modelo/erro)",
+    ["result"],
+))
+LLM_CHAMADA_SECONDS = register(Histogram(
+    "cclastrib_llm_chamada_seconds",
+    "Duração de cada chamada ao backend de LLM (um prompt com até LLM_LOTE itens)",
+    buckets=LLM_BUCKETS,
+))
+TRILHA_TOTAL = register(Counter(
+    "cclastrib_trilha_total",
+    "Decisões da trilha de auditoria (AUDIT_LOG) por resultado (gravada/descartada/erro)",
+    ["result"],
+))
+GRAVACAO_TOTAL = register(Counter(
+    "cclastrib_gravacao_total",
+    "Requisições amostradas para o replay (REPLAY_RECORD) por resultado (gravada/descartada/erro)",
+    ["result"],
+))
+NCM_SUGESTAO_TOTAL = register(Counter(
+    "cclastrib_ncm_sugestao_total",
+    "Itens conferidos pela sugestão de NCM (sugerir_ncm) por resultado (confere/divergente/sem_descricao)",
+    ["result"],
+))
+
+
+def lap(stage: str, t0: float) -> float:
+    """
+    Registra o tempo desde t0 na etapa e devolve o instante atual
+    (para encadear: t = lap("cfop", t); ...; t = lap("ncm_lookup", t)).
+    """
+    now = time.perf_counter()
+    STAGE_SECONDS.observe(now - t0, stage)
+    return now
@@ -0,0 +1,285 @@
+"""
+Normaliza as extrações brutas dos anexos (data/reservas, data/csv) e compila
+a tabela NCM -> benefício lida pelo runtime (data/anexos/beneficios_anexos.csv).
+
+    python -m app.normalize_anexos
+
+Extração bruta (saída do extract_anexos / extract_anexos_pdf):
+  - cabeçalhos da tabela da lei aparecem como linha de dados ("ITEM;DESCRIÇÃO;NCM/SH")
+  - colunas deslocadas: o item da lei cai em "ncm" e o NCM em "aliquota"
+  - NCMs em lista ("Capítulo 31 3824.99.77 3824.99.79"), em faixa ("0401 a 0404")
+    ou só dentro da descrição ("... posições 08.03, 08.04 e 08.05 da NCM/SH"),
+    às vezes com exceções ("exceto ... subposição 0709.5")
+
+Normalizado (data/normalizado/ANEXO_X.csv): uma linha por (item, prefixo NCM),
+com as exceções já em dígitos e a linha de origem para rastreabilidade.
+
+Compilado: cada linha leva a condição do item (coluna condicao, vazia quando o
+NCM basta). O runtime só aplica o benefício de linhas sem condição.
+"""
+from __future__ import annotations
+
+import csv
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .rules import CONDICOES_BENEFICIO, norm_ncm, read_csv_semicolon
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DIRS = [os.path.join(BASE_DIR, "data/reservas"), os.path.join(BASE_DIR, "data/csv")]
+NORM_DIR = os.path.join(BASE_DIR, "data/normalizado")
+COMPILED_FILE = os.path.join(BASE_DIR, "data/anexos/beneficios_anexos.csv")
+TABELA_NCM_FILE = os.path.join(BASE_DIR, "data/anexos/Tabela_NCM_Vigente_20251227.csv")
+
+NORM_HEADER = ["anexo", "item", "ncm", "excecoes", "descricao", "linha_origem"]
+COMPILED_HEADER = ["anexo", "item", "ncm", "excecoes", "tipo", "reducao", "descricao", "condicao"]
+
+# -------------------------
+# Benefício de cada anexo aplicado pelo runtime
+# -------------------------
+# tipo: "reducao" (percentual de redução das alíquotas de IBS e CBS)
+#       "imposto_seletivo" (bens sujeitos ao IS)
+# O Anexo XVI (limite inferior da alíquota própria, por ano) não é lista de NCM.
+BENEFICIOS: Dict[str, Tuple[str, float, str]] = {
+    "ANEXO XI": ("reducao", 60.0, "Soberania e segurança nacional, segurança da informação e cibernética"),
+    "ANEXO XII": ("reducao", 100.0, "Dispositivos médicos"),
+    "ANEXO XIII": ("reducao", 100.0, "Dispositivos de acessibilidade próprios para pessoas com deficiência"),
+    "ANEXO XIV": ("reducao", 100.0, "Medicamentos"),
+    "ANEXO XV": ("reducao", 100.0, "Produtos hortícolas, frutas e ovos"),
+    "ANEXO XVII": ("imposto_seletivo", 0.0, "Bens e serviços sujeitos ao Imposto Seletivo"),
+}
+
+# -------------------------
+# Condição de cada item (códigos em rules.CONDICOES_BENEFICIO)
+# -------------------------
+# Anexos cujo item inteiro depende de algo que o NCM não mostra:
+#   XI  - bens para uso da segurança nacional / segurança da informação
+#   XIV - medicamentos listados por princípio ativo dentro de NCMs amplos
+CONDICAO_ANEXO: Dict[str, str] = {
+    "ANEXO XI": "destinacao",
+    "ANEXO XIV": "substancia",
+}
+DESTINACAO_RE = re.compile(
+    r"\b(para\s+(?:o\s+)?usos?|destinad[oa]s?|exclusivamente|utilizad[oa]s?|desde\s+que"
+    r"|para\s+pessoas?\s+com\s+(?:deficiência|incapacidade))\b",
+    re.IGNORECASE,
+)
+# subposição "Outros"/"Outras" da Tabela NCM: abrange mais que o item do anexo
+RESIDUAL_RE = re.compile(r"^[-\s]*outr[oa]s?\.?\s*$", re.IGNORECASE)
+
+# -------------------------
+# Padrões
+# -------------------------
+ITEM_RE = re.compile(r"^\d+(?:\.\d+)*$")
+# NBS (serviços) "1.1501.20.00": não é NCM, fica fora do índice
+NBS_RE = re.compile(r"(?<![\d.])1\.\d{4}(?:\.\d{1,2}){0,2}(?![\d])")
+# NCM completo ou parcial: 3004.90.69 / 0306.1 / 1006.20 / 07.01 / 07.02.00.00 / 8802
+# (vírgula colada em dígito é decimal: "81,0%" não é NCM)
+NCM_RE = re.compile(r"(?<![\d.])(?<!\d,)(\d{4}(?:\.\d{1,2}){0,2}|\d{2}\.\d{2}(?:\.\d{2}){0,2})(?!\d|[.,]\d)")
+CAPITULO_RE = re.compile(r"cap[íi]tulos?\s+(\d{1,2})((?:\s*(?:,|e)\s*\d{1,2})*)", re.IGNORECASE)
+FAIXA_RE = re.compile(
+    r"(?<![\d.])(\d{4}(?:\.\d{1,2}){0,2}|\d{2}\.\d{2}(?:\.\d{2}){0,2})\s+a\s+"
+    r"(\d{4}(?:\.\d{1,2}){0,2}|\d{2}\.\d{2}(?:\.\d{2}){0,2})(?![\d])"
+)
+EXCECAO_RE = re.compile(r"\b(exceto|ressalvad[oa]s?)\b", re.IGNORECASE)
+MAX_FAIXA = 500
+
+
+def _clean(value: Optional[str]) -> str:
+    return " ".join((value or "").split())
+
+
+def _codes(text: str) -> List[str]:
+    """
+    Prefixos NCM (só dígitos) citados no texto, na ordem, sem repetição.
+    """
+    text = NBS_RE.sub(" ", text)
+    out: List[str] = []
+
+    def add(d: str) -> None:
+        if 2 <= len(d) <= 8 and d not in out:
+            out.append(d)
+
+    for m in CAPITULO_RE.finditer(text):
+        for cap in re.findall(r"\d{1,2}", m.group(0)):
+            add(cap.zfill(2))
+
+    for m in FAIXA_RE.finditer(text):
+        ini, fim = norm_ncm(m.group(1)), norm_ncm(m.group(2))
+        if len(ini) == len(fim) and 0 <= int(fim) - int(ini) <= MAX_FAIXA:
+            for n in range(int(ini), int(fim) + 1):
+                add(str(n).zfill(len(ini)))
+    text = FAIXA_RE.sub(" ", text)
+
+    for m in NCM_RE.finditer(text):
+        add(norm_ncm(m.group(1)))
+    return out
+
+
+def parse_ncm_field(ncm_text: str, descricao: str) -> Tuple[List[str], List[str]]:
+    """
+    (NCMs incluídos, exceções). A coluna NCM manda quando preenchida;
+    senão os códigos vêm da descrição, respeitando "exceto ..." dentro de cada
+    trecho separado por ";".
+    """
+    excecoes: List[str] = []
+    for trecho in descricao.split(";"):
+        m = EXCECAO_RE.search(trecho)
+        if m:
+            excecoes.extend(c for c in _codes(trecho[m.end():]) if c not in excecoes)
+
+    if _codes(ncm_text):
+        return _codes(ncm_text), excecoes
+
+    if "NCM" not in descricao.upper() and not CAPITULO_RE.search(descricao):
+        return [], excecoes
+
+    incluidos: List[str] = []
+    for trecho in descricao.split(";"):
+        m = EXCECAO_RE.search(trecho)
+        parte = trecho[:m.start()] if m else trecho
+        incluidos.extend(c for c in _codes(parte) if c not in incluidos)
+    return incluidos, excecoes
+
+
+def fix_columns(row: Dict[str, str]) -> Optional[Tuple[str, str, str]]:
+    """
+    (item, descrição, texto NCM) de uma linha bruta, ou None para cabeçalho/lixo.
+    Layout deslocado da extração: item em "ncm", NCM em "aliquota".
+    """
+    a = _clean(row.get("ncm"))
+    b = _clean(row.get("descricao"))
+    c = _clean(row.get("aliquota"))
+
+    if ITEM_RE.match(a):
+        return a, b, c
+    if a and _codes(a) and not ITEM_RE.match(a):
+        # layout já correto (ncm;descricao) vindo de fontes normalizadas à mão
+        return "", b, a
+    return None
+
+
+def normalize_rows(rows: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+    out: List[Dict[str, str]] = []
+    for row in rows:
+        fixed = fix_columns(row)
+        if fixed is None:
+            continue
+        item, descricao, ncm_text = fixed
+        incluidos, excecoes = parse_ncm_field(ncm_text, descricao)
+        for ncm in incluidos:
+            out.append({
+                "anexo": _clean(row.get("anexo")),
+                "item": item,
+                "ncm": ncm,
+                # só interessam as exceções dentro do prefixo incluído (0709 exceto 07095)
+                "excecoes": ",".join(e for e in excecoes if e != ncm and e.startswith(ncm)),
+                "descricao": descricao,
+                "linha_origem": _clean(row.get("linha")),
+            })
+    return out
+
+
+def _write(path: str, header: List[str], rows: List[Dict[str, str]]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=header, delimiter=";", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# -------------------------
+# Etapas do pipeline (build_anexos)
+# -------------------------
+def normalize_file(raw_path: str, norm_dir: str = NORM_DIR) -> Dict[str, Dict[str, object]]:
+    """
+    CSV bruto de um anexo -> CSV normalizado. Devolve {saida: proveniência}.
+    """
+    rows = normalize_rows(read_csv_semicolon(raw_path))
+    out_path = os.path.join(norm_dir, os.path.basename(raw_path))
+    _write(out_path, NORM_HEADER, rows)
+    # [linha normalizada, linha no CSV bruto]
+    return {out_path: {"linhas": [[i, int(r["linha_origem"] or 0)] for i, r in enumerate(rows, 1)]}}
+
+
+def load_descricoes_ncm(path: str = TABELA_NCM_FILE) -> Dict[str, str]:
+    """
+    NCM (só dígitos) -> descrição oficial, da Tabela NCM vigente.
+    """
+    if not os.path.exists(path):
+        return {}
+    return {norm_ncm(r.get("Código", "")): r.get("Descrição", "") for r in read_csv_semicolon(path)}
+
+
+def condicao_item(row: Dict[str, str], descricoes_ncm: Dict[str, str]) -> str:
+    """
+    Código da condição do item (CONDICOES_BENEFICIO) ou "" quando o NCM da
+    linha basta para enquadrar o produto no item.
+    """
+    condicao = CONDICAO_ANEXO.get(row.get("anexo", ""), "")
+    if not condicao and DESTINACAO_RE.search(row.get("descricao", "")):
+        condicao = "destinacao"
+    ncm = row.get("ncm", "")
+    if not condicao and len(ncm) == 8 and RESIDUAL_RE.match(descricoes_ncm.get(ncm, "")):
+        condicao = "ncm_residual"
+    return condicao
+
+
+def compile_beneficios(
+    norm_paths: List[str],
+    out_path: str = COMPILED_FILE,
+    tabela_ncm: str = TABELA_NCM_FILE,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Junta os anexos com benefício conhecido (BENEFICIOS) em uma tabela só,
+    marcando a condição de cada linha (condicao_item). A Tabela NCM só é
+    consultada para achar subposições residuais; não é entrada da etapa.
+    """
+    descricoes_ncm = load_descricoes_ncm(tabela_ncm)
+    compiled: List[Dict[str, str]] = []
+    for path in sorted(norm_paths):
+        for r in read_csv_semicolon(path):
+            beneficio = BENEFICIOS.get(r.get("anexo", ""))
+            if not beneficio:
+                continue
+            tipo, reducao, _ = beneficio
+            compiled.append({
+                **r,
+                "tipo": tipo,
+                "reducao": f"{reducao:g}",
+                "condicao": condicao_item(r, descricoes_ncm),
+            })
+    _write(out_path, COMPILED_HEADER, compiled)
+    condicionadas = sum(1 for r in compiled if r["condicao"])
+    return {out_path: {"linhas": len(compiled), "condicionadas": condicionadas}}
+
+
+def is_raw_anexo(rel: str) -> bool:
+    return rel.startswith(("data/reservas/", "data/csv/")) and rel.endswith(".csv")
+
+
+def is_normalized_anexo(rel: str) -> bool:
+    return rel.startswith("data/normalizado/") and rel.endswith(".csv")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    raw_dirs = argv or RAW_DIRS
+
+    normalizados: List[str] = []
+    for d in raw_dirs:
+        for fname in sorted(os.listdir(d)):
+            if fname.upper().startswith("ANEXO_") and fname.lower().endswith(".csv"):
+                saidas = normalize_file(os.path.join(d, fname))
+                for path, prov in saidas.items():
+                    normalizados.append(path)
+                    print(f"✔ {fname}: {len(prov['linhas'])} NCMs -> {path}")
+
+    for path, prov in compile_beneficios(normalizados).items():
+        print(f"✔ Compilado: {path} ({prov['linhas']} linhas, {prov['condicionadas']} condicionadas)")
+
+
+if __name__ == "__main__":
+    main()
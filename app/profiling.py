@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import heapq
+import hmac
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler  # opcional
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - depende do ambiente
+    PyinstrumentProfiler = None
+    SpeedscopeRenderer = None
+
+
+# -------------------------
+# Configuração (variáveis de ambiente)
+# -------------------------
+# PROFILE_ENABLED=1         liga o middleware e as rotas /admin/profiles
+# PROFILE_TOKEN=...         segredo obrigatório: sem ele o profiling não é instalado
+# PROFILE_SAMPLE_RATE=0.01  fração das requisições perfiladas (0 = só via header)
+# PROFILE_PATHS=/classificar,/classificar-lote   restringe a esses endpoints
+#                           (vazio = os endpoints com @profiled; só eles geram perfil)
+# PROFILE_HEADER=X-Profile  header que força o profiling da requisição (valor = PROFILE_TOKEN)
+# PROFILE_KEEP=20           quantos perfis (os mais lentos) ficam guardados
+# PROFILER=cprofile         cprofile (.prof p/ snakeviz) ou pyinstrument (speedscope)
+@dataclass
+class ProfilingConfig:
+    enabled: bool = False
+    token: str = ""
+    sample_rate: float = 0.0
+    paths: Tuple[str, ...] = ()
+    header: str = "x-profile"
+    keep: int = 20
+    profiler: str = "cprofile"
+
+    @classmethod
+    def from_env(cls) -> "ProfilingConfig":
+        profiler = os.getenv("PROFILER", "cprofile").strip().lower()
+        if profiler == "pyinstrument" and PyinstrumentProfiler is None:
+            profiler = "cprofile"
+        return cls(
+            enabled=os.getenv("PROFILE_ENABLED", "").strip().lower() in ("1", "true", "s", "sim"),
+            token=os.getenv("PROFILE_TOKEN", "").strip(),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0") or 0),
+            paths=tuple(p.strip() for p in os.getenv("PROFILE_PATHS", "").split(",") if p.strip()),
+            header=os.getenv("PROFILE_HEADER", "X-Profile").strip().lower(),
+            keep=int(os.getenv("PROFILE_KEEP", "20") or 20),
+            profiler=profiler,
+        )
+
+
+# -------------------------
+# Perfis capturados
+# -------------------------
+@dataclass
+class ProfileRecord:
+    id: int
+    method: str
+    path: str
+    duration_s: float
+    started_at: str
+    profiler: str
+    data: bytes = field(repr=False)
+
+    @property
+    def filename(self) -> str:
+        ext = "speedscope.json" if self.profiler == "pyinstrument" else "prof"
+        return f"profile-{self.id}-{self.path.strip('/').replace('/', '_') or 'root'}.{ext}"
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(self.duration_s * 1000, 3),
+            "started_at": self.started_at,
+            "profiler": self.profiler,
+            "bytes": len(self.data),
+            "filename": self.filename,
+        }
+
+
+class SlowestProfiles:
+    """
+    Guarda só os N perfis mais lentos (min-heap por duração).
+    """
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._heap: List[Tuple[float, int, ProfileRecord]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: ProfileRecord) -> None:
+        item = (record.duration_s, record.id, record)
+        with self._lock:
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, item)
+            elif record.duration_s > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def list(self) -> List[ProfileRecord]:
+        with self._lock:
+            return [r for _, _, r in sorted(self._heap, key=lambda x: x[0], reverse=True)]
+
+    def get(self, profile_id: int) -> Optional[ProfileRecord]:
+        with self._lock:
+            for _, _, r in self._heap:
+                if r.id == profile_id:
+                    return r
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+
+
+@dataclass
+class ProfileSession:
+    profiler: str
+    data: Optional[bytes] = None
+
+
+# Sessão da requisição atual. O contexto é copiado para a threadpool onde
+# rodam os endpoints síncronos, então o decorator @profiled enxerga a sessão.
+_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+
+def _run_cprofile(fn: Callable, args, kwargs) -> Tuple[Any, bytes]:
+    prof = cProfile.Profile()
+    try:
+        result = prof.runcall(fn, *args, **kwargs)
+    finally:
+        stats = pstats.Stats(prof)
+    # mesmo conteúdo de Stats.dump_stats: abre no snakeviz / pstats
+    return result, marshal.dumps(stats.stats)
+
+
+def _run_pyinstrument(fn: Callable, args, kwargs) -> Tuple[Any, bytes]:
+    prof = PyinstrumentProfiler(async_mode="disabled")
+    prof.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        prof.stop()
+    return result, prof.output(SpeedscopeRenderer()).encode("utf-8")
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    Decorator para endpoints síncronos: se a requisição foi sorteada pelo
+    middleware, executa o endpoint sob o profiler, na própria thread da threadpool.
+    Sem sessão ativa o custo é uma leitura de ContextVar.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return fn(*args, **kwargs)
+        runner = _run_pyinstrument if session.profiler == "pyinstrument" else _run_cprofile
+        result, session.data = runner(fn, args, kwargs)
+        return result
+
+    wrapper.profiled = True
+    return wrapper
+
+
+def profiled_paths(app: FastAPI) -> Tuple[str, ...]:
+    # endpoints decorados com @profiled: os únicos que produzem perfil
+    return tuple(
+        getattr(r, "path", "") for r in app.routes if getattr(getattr(r, "endpoint", None), "profiled", False)
+    )
+
+
+def token_ok(config: ProfilingConfig, valor: str) -> bool:
+    return bool(config.token) and hmac.compare_digest(valor.strip().encode("utf-8"), config.token.encode("utf-8"))
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: sorteia requisições (ou respeita o header com o
+    PROFILE_TOKEN), abre a sessão de profiling e, ao final, guarda o perfil com
+    a duração total da requisição. Só os `paths` são considerados.
+    """
+    def __init__(self, app, config: ProfilingConfig, store: SlowestProfiles, paths: Callable[[], Tuple[str, ...]]):
+        self.app = app
+        self.config = config
+        self.store = store
+        # resolvidos na primeira requisição: as rotas são declaradas depois do install_profiling
+        self._resolver_paths = paths
+        self._paths: Optional[frozenset] = None
+        self._ids = itertools.count(1)
+
+    def _selected(self, scope) -> bool:
+        if self._paths is None:
+            self._paths = frozenset(self._resolver_paths())
+        if scope.get("path", "") not in self._paths:
+            return False
+        for k, v in scope.get("headers", []):
+            if k.decode("latin-1") == self.config.header:
+                return token_ok(self.config, v.decode("latin-1"))
+        return self.config.sample_rate > 0 and random.random() < self.config.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(profiler=self.config.profiler)
+        token = _session.set(session)
+        started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            duration = time.perf_counter() - t0
+            _session.reset(token)
+            if session.data is not None:
+                self.store.add(ProfileRecord(
+                    id=next(self._ids),
+                    method=scope.get("method", ""),
+                    path=scope.get("path", ""),
+                    duration_s=duration,
+                    started_at=started_at,
+                    profiler=session.profiler,
+                    data=session.data,
+                ))
+
+
+# -------------------------
+# Rotas de administração
+# -------------------------
+def admin_router(store: SlowestProfiles, config: ProfilingConfig) -> APIRouter:
+    def exige_token(request: Request) -> None:
+        # Authorization: Bearer <PROFILE_TOKEN>
+        esquema, _, valor = request.headers.get("authorization", "").partition(" ")
+        if esquema.lower() != "bearer" or not token_ok(config, valor):
+            raise HTTPException(
+                status_code=401, detail="PROFILE_TOKEN inválido", headers={"WWW-Authenticate": "Bearer"}
+            )
+
+    router = APIRouter(prefix="/admin/profiles", tags=["admin"], dependencies=[Depends(exige_token)])
+
+    @router.get("")
+    def list_profiles():
+        return [r.meta() for r in store.list()]
+
+    @router.get("/{profile_id}")
+    def download_profile(profile_id: int):
+        record = store.get(profile_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Perfil não encontrado (pode ter sido descartado)")
+        media_type = "application/json" if record.profiler == "pyinstrument" else "application/octet-stream"
+        return Response(
+            content=record.data,
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{record.filename}"'},
+        )
+
+    @router.delete("")
+    def clear_profiles():
+        store.clear()
+        return {"ok": True}
+
+    return router
+
+
+def install_profiling(app: FastAPI, config: Optional[ProfilingConfig] = None) -> Optional[SlowestProfiles]:
+    """
+    Liga o profiling amostrado se PROFILE_ENABLED estiver ativo (e houver
+    PROFILE_TOKEN). Sem isso não instala nada (nem middleware nem rotas de admin).
+    """
+    config = config or ProfilingConfig.from_env()
+    if not config.enabled:
+        return None
+    if not config.token:
+        print("⚠️ PROFILE_ENABLED sem PROFILE_TOKEN: profiling não instalado", file=sys.stderr)
+        return None
+
+    def paths() -> Tuple[str, ...]:
+        decorados = profiled_paths(app)
+        if not config.paths:
+            return decorados
+        sem_perfil = [p for p in config.paths if p not in decorados]
+        if sem_perfil:
+            print(f"⚠️ PROFILE_PATHS sem @profiled (nunca geram perfil): {', '.join(sem_perfil)}", file=sys.stderr)
+        return config.paths
+
+    store = SlowestProfiles(config.keep)
+    app.add_middleware(ProfilingMiddleware, config=config, store=store, paths=paths)
+    app.include_router(admin_router(store, config))
+    return store
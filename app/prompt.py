@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+import json
+from typing import Dict, Any, Sequence, Tuple
 
 
 SYSTEM_PROMPT = """\
@@ -10,6 +11,9 @@ Não invente regras: se faltar informação, retorne "pendencias".
 Explique "fundamento" como lista de objetos {regra, motivo, fonte}.
 """
 
+# marcador antes da lista de itens do prompt em lote (o backend local lê os itens a partir dele)
+ITENS_JSON = "Itens (JSON):"
+
 
 def build_user_prompt(ctx: Dict[str, Any]) -> str:
     """
@@ -26,3 +30,23 @@ def build_user_prompt(ctx: Dict[str, Any]) -> str:
         "4) fundamento detalhado\n\n"
         f"Contexto:\n{ctx}\n"
     )
+
+
+def build_batch_prompt(itens: Sequence[Tuple[str, Dict[str, Any]]]) -> str:
+    """
+    Vários itens (id, ctx) num prompt só. Cada ctx traz o resultado das regras
+    (baixa confiança) para o modelo revisar.
+    """
+    lista = [{"id": i, "contexto": ctx} for i, ctx in itens]
+    return (
+        "Revise a classificação de cada item abaixo. O campo contexto.resultado_regras é o que as\n"
+        "regras determinaram, com baixa confiança; confirme ou corrija.\n"
+        "Para cada item determine:\n"
+        "1) cclastrib (codigo, descricao)\n"
+        "2) cst_ibs_cbs e cclass_trib\n"
+        "3) fundamento detalhado\n"
+        "4) pendencias (o que faltou para decidir)\n\n"
+        'Formato: {"itens": [{"id", "cclastrib": {"codigo", "descricao"}, "cst_ibs_cbs", "cclass_trib",\n'
+        '"fundamento": [{"regra", "motivo", "fonte"}], "pendencias": []}]}, um objeto por id.\n\n'
+        f"{ITENS_JSON}\n{json.dumps(lista, ensure_ascii=False, sort_keys=True, default=str)}\n"
+    )
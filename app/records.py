@@ -0,0 +1,342 @@
+"""
+Registros tipados das tabelas de referência (data/anexos).
+
+Cada tabela vira uma lista de objetos com __slots__ em vez de um dict por linha:
+
+  - o cabeçalho é resolvido uma vez na carga (COLUNAS: atributo -> grafias aceitas,
+    comparadas sem acento/maiúsculas, inclusive as variantes de encoding da
+    Tabela NCM como "C¢digo" e "Descri‡Æo");
+  - NCM já em dígitos, códigos já em maiúsculas, datas e números já convertidos;
+  - strings que se repetem em milhares de linhas (categoria, fundamento, UF,
+    regime...) são internadas e ocupam memória uma vez só.
+
+O rules.py só usa acesso por atributo.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import sys
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from .rules import norm_code, norm_ncm, normalize_text, parse_date_br, parse_float_ptbr, read_csv_text
+
+_intern = sys.intern
+FLAGS_SIM = ("S", "SIM", "1", "TRUE", "T", "Y")
+# linhas por bloco de parse nas tabelas grandes (Tabela NCM, ncm_master)
+CHUNK_ROWS = 4000
+
+R = TypeVar("R")
+
+
+@lru_cache(maxsize=4096)
+def parse_data(value: str) -> Optional[date]:
+    # vigências vêm em ISO (ncm_master) ou dd/mm/aaaa (Tabela NCM); poucas datas
+    # distintas em milhares de linhas, daí o cache (strptime é caro)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return parse_date_br(value)
+
+
+def _ncm8(value: str) -> str:
+    return norm_ncm(value)[:8]
+
+
+# -------------------------
+# Registros
+# -------------------------
+@dataclass(frozen=True, slots=True)
+class CfopRow:
+    COLUNAS = {
+        "codigo": ("CFOP",),
+        "descricao": ("DESCRICAO_CFOP", "DESCRIÇÃO_CFOP"),
+    }
+    codigo: str
+    descricao: str
+    descricao_norm: str     # sem acento/minúsculas, para os matches por palavra-chave
+
+    @classmethod
+    def parse(cls, codigo: str, descricao: str) -> "CfopRow":
+        return cls(norm_code(codigo), descricao, normalize_text(descricao))
+
+
+@dataclass(frozen=True, slots=True)
+class NcmRow:
+    """
+    ncm_master.csv, ncm_excecoes.csv e os *_model.csv.
+    """
+    COLUNAS = {
+        "ncm": ("ncm",),
+        "descricao": ("descricao",),
+        "categoria": ("categoria",),
+        "tipo": ("tipo",),
+        "fundamento_legal": ("fundamento_legal",),
+        "vigencia_inicio": ("vigencia_inicio",),
+        "vigencia_fim": ("vigencia_fim",),
+    }
+    ncm: str
+    descricao: str
+    categoria: str
+    tipo: str
+    fundamento_legal: str
+    vigencia_inicio: Optional[date]
+    vigencia_fim: Optional[date]
+
+    @classmethod
+    def parse(cls, ncm, descricao, categoria, tipo, fundamento_legal, vigencia_inicio, vigencia_fim) -> "NcmRow":
+        return cls(
+            _ncm8(ncm),
+            descricao,
+            _intern(categoria),
+            _intern(tipo),
+            _intern(fundamento_legal),
+            parse_data(vigencia_inicio),
+            parse_data(vigencia_fim),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class NcmOficialRow:
+    """
+    Tabela NCM vigente (Siscomex). Traz também os níveis de 2/4/6 dígitos.
+    """
+    COLUNAS = {
+        "ncm": ("Código", "Codigo", "Cód.", "C¢digo"),
+        "descricao": ("Descrição", "Descriçao", "Descri‡Æo"),
+        "data_inicio": ("Data Início", "Data In¡cio"),
+        "data_fim": ("Data Fim",),
+    }
+    ncm: str
+    descricao: str
+    data_inicio: Optional[date]
+    data_fim: Optional[date]
+
+    @classmethod
+    def parse(cls, ncm, descricao, data_inicio, data_fim) -> "NcmOficialRow":
+        return cls(_ncm8(ncm), descricao, parse_data(data_inicio), parse_data(data_fim))
+
+
+@dataclass(frozen=True, slots=True)
+class AliquotaRow:
+    COLUNAS = {"tipo": ("tipo",), "aliquota": ("aliquota",)}
+    tipo: str
+    aliquota: Optional[float]
+
+    @classmethod
+    def parse(cls, tipo, aliquota) -> "AliquotaRow":
+        return cls(_intern(norm_code(tipo)), parse_float_ptbr(aliquota))
+
+
+@dataclass(frozen=True, slots=True)
+class TransicaoRow:
+    """
+    transicao_ibs.csv / transicao_cbs.csv (cada uma preenche o seu percentual).
+    """
+    COLUNAS = {"ano": ("ano",), "percentual_ibs": ("percentual_ibs",), "percentual_cbs": ("percentual_cbs",)}
+    ano: Optional[int]
+    percentual_ibs: Optional[float]
+    percentual_cbs: Optional[float]
+
+    @classmethod
+    def parse(cls, ano, percentual_ibs, percentual_cbs) -> "TransicaoRow":
+        return cls(
+            int(ano) if ano.isdigit() else None,
+            parse_float_ptbr(percentual_ibs),
+            parse_float_ptbr(percentual_cbs),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ClasTribRow:
+    """
+    cclastrib.csv. Células vazias ou "*" são coringa; especificidade = nº de
+    critérios preenchidos (o pick_cclastrib prioriza a regra mais específica).
+    """
+    COLUNAS = {
+        "codigo": ("codigo",),
+        "descricao": ("descricao",),
+        "regime": ("regime_emitente", "regime", "regime_fiscal"),
+        "cfop": ("cfop",),
+        "uf_origem": ("uf_origem", "uf_emitente"),
+        "uf_destino": ("uf_destino", "uf_destinatario"),
+        "cst_icms": ("cst_icms",),
+        "aplica_zfm": ("aplica_zfm", "apply_zfm"),
+    }
+    codigo: str
+    descricao: str
+    regime: str
+    cfop: str
+    uf_origem: str
+    uf_destino: str
+    cst_icms: str
+    aplica_zfm: bool
+    especificidade: int
+
+    @classmethod
+    def parse(cls, codigo, descricao, regime, cfop, uf_origem, uf_destino, cst_icms, aplica_zfm) -> "ClasTribRow":
+        criterios = [norm_code(v) for v in (regime, cfop, uf_origem, uf_destino, cst_icms)]
+        return cls(
+            _intern(codigo),
+            descricao,
+            *(_intern(c) for c in criterios),
+            norm_code(aplica_zfm) in FLAGS_SIM,
+            sum(1 for c in criterios if c and c != "*"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class CstMapRow:
+    COLUNAS = {
+        "cclastrib_codigo": ("cclastrib_codigo",),
+        "cst_ibs_cbs": ("cst_ibs_cbs",),
+        "cclass_trib": ("cclass_trib",),
+        "descricao": ("descricao",),
+    }
+    cclastrib_codigo: str
+    cst_ibs_cbs: str
+    cclass_trib: str
+    descricao: str
+
+    @classmethod
+    def parse(cls, cclastrib_codigo, cst_ibs_cbs, cclass_trib, descricao) -> "CstMapRow":
+        return cls(_intern(cclastrib_codigo), _intern(cst_ibs_cbs), _intern(cclass_trib), _intern(descricao))
+
+
+@dataclass(frozen=True, slots=True)
+class NcmZfmRow:
+    COLUNAS = {"ncm": ("ncm",), "descricao": ("descricao",)}
+    ncm: str
+    descricao: str
+
+    @classmethod
+    def parse(cls, ncm, descricao) -> "NcmZfmRow":
+        return cls(_ncm8(ncm), descricao)
+
+
+@dataclass(frozen=True, slots=True)
+class BeneficioRow:
+    """
+    beneficios_anexos.csv (compilado pelo normalize_anexos): prefixo NCM + exceções.
+    condicao vazia = item incondicional; senão o código em CONDICOES_BENEFICIO.
+    """
+    COLUNAS = {
+        "anexo": ("anexo",),
+        "item": ("item",),
+        "ncm": ("ncm",),
+        "excecoes": ("excecoes",),
+        "tipo": ("tipo",),
+        "reducao": ("reducao",),
+        "descricao": ("descricao",),
+        "condicao": ("condicao",),
+    }
+    anexo: str
+    item: str
+    ncm: str
+    excecoes: Tuple[str, ...]
+    tipo: str
+    reducao: Optional[float]
+    descricao: str
+    condicao: str
+
+    @classmethod
+    def parse(cls, anexo, item, ncm, excecoes, tipo, reducao, descricao, condicao) -> "BeneficioRow":
+        return cls(
+            _intern(anexo),
+            item,
+            norm_ncm(ncm),
+            tuple(e for e in excecoes.split(",") if e),
+            _intern(tipo),
+            parse_float_ptbr(reducao),
+            descricao,
+            _intern(condicao),
+        )
+
+
+# -------------------------
+# Carga
+# -------------------------
+def _chave(header: str) -> str:
+    return normalize_text(header.replace("\ufeff", "").strip())
+
+
+def resolve_colunas(header: Sequence[str], colunas: Dict[str, Tuple[str, ...]]) -> List[Optional[int]]:
+    """
+    Posição de cada atributo no cabeçalho (primeira grafia encontrada), ou None.
+    """
+    pos: Dict[str, int] = {}
+    for i, h in enumerate(header):
+        pos.setdefault(_chave(h), i)
+    out: List[Optional[int]] = []
+    for aliases in colunas.values():
+        out.append(next((pos[k] for k in map(_chave, (*aliases,)) if k in pos), None))
+    return out
+
+
+def _tokenizar(text: str) -> Tuple[List[str], List[List[str]]]:
+    # csv.reader (em C) sobre o buffer já decodificado; linhas vazias ficam de fora
+    rows = [r for r in csv.reader(io.StringIO(text, newline=""), delimiter=";") if r]
+    if not rows:
+        return [], []
+    return rows[0], rows[1:]
+
+
+def _ler(path: str) -> Tuple[List[str], List[List[str]]]:
+    return _tokenizar(read_csv_text(path))
+
+
+def parse_rows(rows: Sequence[List[str]], cls: Type[R], idx: Sequence[Optional[int]]) -> List[R]:
+    parse = cls.parse
+    out = []
+    for row in rows:
+        n = len(row)
+        out.append(parse(*[row[i].strip() if i is not None and i < n else "" for i in idx]))
+    return out
+
+
+def read_records(path: str, cls: Type[R]) -> List[R]:
+    """
+    Lê o CSV (";", utf-8 ou cp1252) direto para registros de `cls`.
+    """
+    header, rows = _ler(path)
+    if not header:
+        return []
+    return parse_rows(rows, cls, resolve_colunas(header, cls.COLUNAS))
+
+
+def load_tables(
+    specs: Dict[str, Tuple[str, Type]],
+    pool: Optional[Executor] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, list]:
+    """
+    Carrega várias tabelas ({nome: (caminho, classe)}). Com `pool`, a leitura e a
+    tokenização de cada arquivo rodam em paralelo e as tabelas grandes têm o
+    parse dividido em blocos de `chunk_rows` linhas; a ordem das linhas é mantida.
+    Sem pool, lê uma a uma (o mesmo que read_records).
+    """
+    if pool is None:
+        return {nome: read_records(path, cls) for nome, (path, cls) in specs.items()}
+
+    lidos = {nome: pool.submit(_ler, path) for nome, (path, _) in specs.items()}
+    blocos: Dict[str, List[Future]] = {}
+    for nome, fut in lidos.items():
+        cls = specs[nome][1]
+        header, rows = fut.result()
+        if not header:
+            blocos[nome] = []
+            continue
+        idx = resolve_colunas(header, cls.COLUNAS)
+        step = max(1, chunk_rows)
+        blocos[nome] = [pool.submit(parse_rows, rows[i:i + step], cls, idx) for i in range(0, len(rows), step)]
+
+    out: Dict[str, list] = {}
+    for nome, futs in blocos.items():
+        out[nome] = [r for f in futs for r in f.result()]
+    return out
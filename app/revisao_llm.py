@@ -0,0 +1,235 @@
+"""
+Revisão por LLM dos resultados de baixa confiança (confianca < LLM_CONFIANCA_MIN).
+
+Só os itens abaixo do limiar pagam a latência do modelo, e só quando o cliente
+pede (revisao_llm=true). O resultado das regras não é alterado: a resposta do
+modelo entra como parecer em `revisao_llm`.
+
+  - vários itens por prompt (LLM_LOTE) com prompt.build_batch_prompt;
+  - chamadas assíncronas, no máximo LLM_CONCORRENCIA ao mesmo tempo por processo;
+  - cache em disco por item (LLM_CACHE_PATH, SQLite): chave = hash do prompt do
+    item (prompt.build_user_prompt), versão = backend/modelo + SYSTEM_PROMPT.
+    Item igual nunca vai duas vezes ao modelo, nem repetido no mesmo lote;
+  - backend plugável (LLM_BACKEND): "openai" (AsyncOpenAI, LLM_MODEL) ou "stub",
+    local e determinístico (testes, bench, desenvolvimento sem chave).
+
+Falha do modelo (timeout, JSON inválido, item faltando ou fora do formato) não
+derruba a requisição: o item sai sem revisão, não vai para o cache e conta em
+cclastrib_llm_itens_total{result="erro"}.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from . import metrics
+from .cache import SQLiteCache
+from .prompt import ITENS_JSON, SYSTEM_PROMPT, build_batch_prompt, build_user_prompt
+from .schemas import RevisaoLLM
+
+try:
+    import openai  # opcional
+except ImportError:  # pragma: no cover - depende do ambiente
+    openai = None
+
+LLM_CONFIANCA_MIN = float(os.getenv("LLM_CONFIANCA_MIN", "0.8"))
+LLM_LOTE = int(os.getenv("LLM_LOTE", "20"))
+LLM_CONCORRENCIA = int(os.getenv("LLM_CONCORRENCIA", "4"))
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# respostas do modelo valem enquanto o prompt for o mesmo; o TTL só limita o tamanho do arquivo
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+# -------------------------
+# Backends
+# -------------------------
+class Backend(Protocol):
+    nome: str
+
+    async def completar(self, system: str, user: str) -> str:
+        """Texto da resposta (JSON) para o par de prompts."""
+        ...
+
+
+class StubBackend:
+    """
+    Backend local: devolve, para cada item do prompt em lote, o próprio
+    resultado das regras como parecer. Determinístico; `atraso` simula a
+    latência de um modelo (LLM_STUB_ATRASO, segundos).
+    """
+    nome = "stub"
+
+    def __init__(self, atraso: float = 0.0):
+        self.atraso = atraso
+        self.chamadas = 0
+
+    async def completar(self, system: str, user: str) -> str:
+        self.chamadas += 1
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+        itens = json.loads(user.split(ITENS_JSON, 1)[1])
+        out = []
+        for item in itens:
+            regras = item["contexto"].get("resultado_regras", {})
+            out.append({
+                "id": item["id"],
+                "cclastrib": regras.get("cclastrib"),
+                "cst_ibs_cbs": regras.get("cst_ibs_cbs"),
+                "cclass_trib": regras.get("cclass_trib"),
+                "fundamento": [{
+                    "regra": "REVISAO-LOCAL",
+                    "motivo": "Backend local (LLM_BACKEND=stub): resultado das regras mantido",
+                    "fonte": "stub",
+                }],
+                "pendencias": list(regras.get("pendencias", [])),
+            })
+        return json.dumps({"itens": out}, ensure_ascii=False)
+
+
+class OpenAIBackend:
+    def __init__(self, model: str = LLM_MODEL, timeout: float = LLM_TIMEOUT):
+        if openai is None:
+            raise RuntimeError("LLM_BACKEND=openai exige o pacote openai")
+        self.model = model
+        self.nome = f"openai:{model}"
+        self._client = openai.AsyncOpenAI(timeout=timeout)
+
+    async def completar(self, system: str, user: str) -> str:
+        resp = await self._client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            response_format={"type": "json_object"},
+            messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+        )
+        return resp.choices[0].message.content or ""
+
+
+# -------------------------
+# Revisor
+# -------------------------
+def chave_prompt(ctx: Dict[str, Any]) -> str:
+    return hashlib.sha256(build_user_prompt(ctx).encode("utf-8")).hexdigest()
+
+
+def parecer_valido(item: Dict[str, Any]) -> bool:
+    """
+    Item da resposta no formato pedido pelo prompt (o que vira RevisaoLLM).
+    Fora dele não entra no cache: ficaria sem revisão até o TTL vencer.
+    """
+    try:
+        RevisaoLLM.model_validate({
+            **item,
+            "fundamento": item.get("fundamento") or [],
+            "pendencias": item.get("pendencias") or [],
+            "backend": "", "origem": "", "concorda": False,
+        })
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+class RevisorLLM:
+    def __init__(
+        self,
+        backend: Backend,
+        cache: Optional[SQLiteCache] = None,
+        lote: int = LLM_LOTE,
+        concorrencia: int = LLM_CONCORRENCIA,
+        limiar: float = LLM_CONFIANCA_MIN,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.lote = max(1, lote)
+        self.limiar = limiar
+        self.concorrencia = max(1, concorrencia)
+        # um semáforo por event loop (cada worker tem o seu; testes/bench criam vários)
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def precisa(self, confianca: float) -> bool:
+        return confianca < self.limiar
+
+    async def revisar(self, contextos: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Parecer do modelo para cada contexto (dict com "origem": "cache" ou
+        "modelo"), ou None quando o modelo falhou para o item.
+        """
+        chaves = [chave_prompt(ctx) for ctx in contextos]
+        respostas: Dict[str, Dict[str, Any]] = {}
+        if self.cache is not None and chaves:
+            for k, raw in (await asyncio.to_thread(self.cache.get_many, chaves)).items():
+                respostas[k] = {**json.loads(raw), "origem": "cache"}
+        if respostas:
+            metrics.LLM_ITENS_TOTAL.inc("cache", amount=sum(1 for k in chaves if k in respostas))
+
+        # um prompt por item distinto que falta; LLM_LOTE itens por chamada
+        faltam = list({k: ctx for k, ctx in zip(chaves, contextos) if k not in respostas}.items())
+        lotes = [faltam[i:i + self.lote] for i in range(0, len(faltam), self.lote)]
+        novos: Dict[str, Dict[str, Any]] = {}
+        for parte in await asyncio.gather(*(self._chamar(lote) for lote in lotes)):
+            novos.update(parte)
+        if self.cache is not None and novos:
+            await asyncio.to_thread(
+                self.cache.set_many, [(k, json.dumps(v, ensure_ascii=False)) for k, v in novos.items()]
+            )
+        for k, v in novos.items():
+            respostas[k] = {**v, "origem": "modelo"}
+        return [respostas.get(k) for k in chaves]
+
+    async def _chamar(self, lote: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        # ids curtos no prompt ("1", "2"...); a chave do cache fica do lado de cá
+        ids = {str(i): k for i, (k, _) in enumerate(lote, 1)}
+        prompt = build_batch_prompt([(i, ctx) for i, (_, ctx) in zip(ids, lote)])
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(self.concorrencia)
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                texto = await self.backend.completar(SYSTEM_PROMPT, prompt)
+                itens = json.loads(texto).get("itens", [])
+            except Exception:
+                metrics.LLM_ITENS_TOTAL.inc("erro", amount=len(lote))
+                return {}
+            finally:
+                metrics.LLM_CHAMADA_SECONDS.observe(time.perf_counter() - t0)
+        out: Dict[str, Dict[str, Any]] = {}
+        for item in itens if isinstance(itens, list) else ():
+            k = ids.get(str(item.get("id"))) if isinstance(item, dict) else None
+            if k is not None and parecer_valido(item):
+                out[k] = {c: v for c, v in item.items() if c != "id"}
+        metrics.LLM_ITENS_TOTAL.inc("modelo", amount=len(out))
+        if len(out) < len(lote):
+            metrics.LLM_ITENS_TOTAL.inc("erro", amount=len(lote) - len(out))
+        return out
+
+
+def revisor_from_env() -> Optional[RevisorLLM]:
+    """
+    RevisorLLM conforme LLM_BACKEND ("", "stub", "openai"); vazio = revisão desligada.
+    """
+    nome = os.getenv("LLM_BACKEND", "").strip().lower()
+    if not nome:
+        return None
+    if nome == "stub":
+        backend: Backend = StubBackend(atraso=float(os.getenv("LLM_STUB_ATRASO", "0")))
+    elif nome == "openai":
+        backend = OpenAIBackend()
+    else:
+        raise ValueError(f"LLM_BACKEND desconhecido: {nome}")
+
+    cache = None
+    path = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "cclastrib-llm.sqlite"))
+    if path:
+        versao = hashlib.sha256(f"{backend.nome}|{SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:16]
+        cache = SQLiteCache(path, versao, default_ttl_seconds=LLM_CACHE_TTL)
+    return RevisorLLM(backend, cache)
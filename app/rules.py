@@ -1,13 +1,37 @@
 from __future__ import annotations
 
+import copy
 import csv
+import io
 import os
 import re
-from dataclasses import dataclass
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import MISSING, dataclass, field
 from datetime import date, datetime
-from typing import Dict, Any, List, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple
 import unicodedata
 
+from . import metrics
+
+if TYPE_CHECKING:
+    from .busca_ncm import IndiceNcm
+    from .fiscal_conversao import ConversaoEngine
+    from .fiscal_simples import SimplesEngine
+    from .records import (
+        AliquotaRow,
+        BeneficioRow,
+        CfopRow,
+        ClasTribRow,
+        CstMapRow,
+        NcmOficialRow,
+        NcmRow,
+        NcmZfmRow,
+        TransicaoRow,
+    )
+    from .sugestao_ncm import SugestorNcm
+
 
 # -------------------------
 # Utilitários de normalização
@@ -63,29 +87,95 @@ def normalize_text(value: str) -> str:
 # -------------------------
 # Leitura CSV (separador ;)
 # -------------------------
-def read_csv_semicolon(path: str) -> List[Dict[str, str]]:
+def decode_csv_bytes(raw: bytes) -> str:
+    """
+    utf-8 (com ou sem BOM) quando o buffer é utf-8 válido; senão cp1252
+    (exports do Excel/Siscomex). Decodifica o que já está em memória, sem reler o arquivo.
+    """
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # cp1252 estrito: bytes indefinidos (0x81, 0x8D...) ainda levantam erro
+        return raw.decode("cp1252")
+
+
+def read_csv_text(path: str) -> str:
+    # uma leitura por arquivo; "" se não existir
     if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return decode_csv_bytes(f.read())
+
+
+def read_csv_semicolon(path: str) -> List[Dict[str, str]]:
+    text = read_csv_text(path)
+    if not text:
         return []
-    encodings = ["utf-8-sig", "cp1252"]
-    last_error = None
-    for enc in encodings:
-        try:
-            with open(path, "r", encoding=enc, newline="") as f:
-                reader = csv.DictReader(f, delimiter=";")
-                rows = []
-                for r in reader:
-                    rows.append({
-                        k.strip().replace("\ufeff", ""): (v.strip() if isinstance(v, str) else v)
-                        for k, v in r.items()
-                    })
-                return rows
-        except UnicodeDecodeError as e:
-            last_error = e
-            continue
-    # If all decodes fail, raise the last error for visibility
-    if last_error:
-        raise last_error
-    return []
+    reader = csv.DictReader(io.StringIO(text, newline=""), delimiter=";")
+    rows = []
+    for r in reader:
+        rows.append({
+            k.strip().replace("\ufeff", ""): (v.strip() if isinstance(v, str) else v)
+            for k, v in r.items()
+        })
+    return rows
+
+
+# -------------------------
+# Carga sob demanda
+# -------------------------
+class Carga:
+    """
+    Carga adiada: roda `fn` uma vez, no primeiro acesso, sob lock (requisições
+    concorrentes esperam a mesma carga). Cópias do DataSources compartilham a Carga.
+    """
+    __slots__ = ("_fn", "_lock", "_valor", "pronta")
+
+    def __init__(self, fn: Callable[[], Any]):
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._valor: Any = None
+        self.pronta = False
+
+    def __call__(self) -> Any:
+        if not self.pronta:
+            with self._lock:
+                if not self.pronta:
+                    self._valor = self._fn()
+                    self._fn = None
+                    self.pronta = True
+        return self._valor
+
+
+class SobDemanda:
+    """
+    Campo de dataclass que aceita o valor pronto ou uma Carga; a Carga é
+    materializada no primeiro acesso ao atributo.
+    """
+    def __init__(self, default: Any = MISSING):
+        self.default = default
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+        self.attr = f"_{name}"
+
+    def __get__(self, obj, owner=None) -> Any:
+        if obj is None:
+            # o dataclass lê o default por aqui; sem default o campo é obrigatório
+            if self.default is MISSING:
+                raise AttributeError(self.name)
+            return self.default
+        valor = obj.__dict__[self.attr]
+        if isinstance(valor, Carga):
+            valor = obj.__dict__[self.attr] = valor()
+        return valor
+
+    def __set__(self, obj, valor: Any) -> None:
+        obj.__dict__[self.attr] = valor
+
+    def pendente(self, obj) -> bool:
+        valor = obj.__dict__[self.attr]
+        return isinstance(valor, Carga) and not valor.pronta
 
 
 # -------------------------
@@ -93,33 +183,90 @@ def read_csv_semicolon(path: str) -> List[Dict[str, str]]:
 # -------------------------
 @dataclass
 class DataSources:
+    # linhas já tipadas (app/records.py): cabeçalho resolvido, NCM em dígitos, datas/números convertidos
+    # campos SobDemanda só são lidos no primeiro acesso (ver load_sources)
     base_dir: str
-    ncm_master: List[Dict[str, str]]
-    ncm_excecoes: List[Dict[str, str]]
-    ncm_oficial: List[Dict[str, str]]
-    ibs_aliquotas: List[Dict[str, str]]
-    cbs_aliquotas: List[Dict[str, str]]
-    transicao_ibs: List[Dict[str, str]]
-    transicao_cbs: List[Dict[str, str]]
-    cclastrib: List[Dict[str, str]]
-    cst_ibs_cbs_map: List[Dict[str, str]]
-    cfop_map: Dict[str, Dict[str, str]]
-    ncm_beneficiados_zfm: List[Dict[str, str]]
+    ncm_master: List["NcmRow"]
+    ncm_excecoes: List["NcmRow"]
+    # master/exceções por código de 8 dígitos, na ordem do arquivo (find_in_master/find_excecao)
+    ncm_master_idx: Dict[str, List["NcmRow"]]
+    ncm_excecoes_idx: Dict[str, List["NcmRow"]]
+    # Tabela NCM vigente: só consultada quando o NCM não está no master/exceções
+    ncm_oficial: List["NcmOficialRow"] = SobDemanda()
+    # mesmas linhas por código de 8 dígitos, na ordem do arquivo
+    ncm_oficial_idx: Dict[str, List["NcmOficialRow"]] = SobDemanda()
+    # busca por descrição (Tabela NCM + ncm_master), usada pelo /ncm/search
+    ncm_busca: "IndiceNcm" = SobDemanda()
+    ibs_aliquotas: List["AliquotaRow"]
+    cbs_aliquotas: List["AliquotaRow"]
+    transicao_ibs: List["TransicaoRow"]
+    transicao_cbs: List["TransicaoRow"]
+    cclastrib: List["ClasTribRow"]
+    cst_ibs_cbs_map: List["CstMapRow"]
+    cfop_map: Dict[str, "CfopRow"]
+    ncm_beneficiados_zfm: List["NcmZfmRow"]
 
     # modelos de anexos (ex: essenciais, alimentos in natura, agro, medicos, etc.)
-    anexos_models: Dict[str, List[Dict[str, str]]]
+    anexos_models: Dict[str, List["NcmRow"]] = SobDemanda()
+
+    # Anexos XI-XVII compilados (beneficios_anexos.csv): prefixo NCM -> linhas
+    beneficios_anexos: Dict[str, List["BeneficioRow"]] = field(default_factory=dict)
+
+    # Simples Nacional (data/simples + simples_faixas.csv): faixas por anexo/vigência
+    simples: Optional["SimplesEngine"] = None
+
+    # Anexo VII (ICMS/ISS -> IBS/CBS): fatores de conversão por ano (só o /converter usa)
+    conversao: Optional["ConversaoEngine"] = SobDemanda(default=None)
+
+    # sugestão de NCM pelo deitem (TF-IDF de n-gramas, /classificar-lote com sugerir_ncm); None sem numpy
+    ncm_sugestor: Optional["SugestorNcm"] = SobDemanda(default=None)
+
+    def pendentes(self) -> List[str]:
+        # campos SobDemanda ainda não carregados
+        return [
+            nome for nome, campo in vars(DataSources).items()
+            if isinstance(campo, SobDemanda) and campo.pendente(self)
+        ]
+
+    def materializar(self) -> "DataSources":
+        """
+        Carrega agora todos os campos sob demanda (ex.: no pai do pre-fork, para os
+        workers herdarem as tabelas já prontas em vez de cada um ler a sua).
+        """
+        for nome in self.pendentes():
+            getattr(self, nome)
+        return self
 
 
-def build_cfop_index(rows: List[Dict[str, str]]) -> Dict[str, Dict[str, str]]:
-    index: Dict[str, Dict[str, str]] = {}
+def build_cfop_index(rows: List["CfopRow"]) -> Dict[str, "CfopRow"]:
+    index: Dict[str, "CfopRow"] = {}
     for r in rows:
-        code = norm_code(r.get("CFOP") or r.get("cfop") or "")
-        if code:
-            index[code] = r
+        if r.codigo:
+            index[r.codigo] = r
     return index
 
 
-def detect_producao_emitente(cfop_code: str, cfop_row: Optional[Dict[str, str]]) -> Optional[bool]:
+def build_ncm_index(rows: List[Any]) -> Dict[str, List[Any]]:
+    # NcmRow/NcmOficialRow por código, na ordem do arquivo (a primeira vigente vence)
+    index: Dict[str, List[Any]] = {}
+    for r in rows:
+        if r.ncm:
+            index.setdefault(r.ncm, []).append(r)
+    return index
+
+
+def build_beneficios_index(rows: List["BeneficioRow"]) -> Dict[str, List["BeneficioRow"]]:
+    """
+    Indexa a tabela compilada pelo normalize_anexos por prefixo NCM (2 a 8 dígitos).
+    """
+    index: Dict[str, List["BeneficioRow"]] = {}
+    for r in rows:
+        if r.ncm:
+            index.setdefault(r.ncm, []).append(r)
+    return index
+
+
+def detect_producao_emitente(cfop_code: str, cfop_row: Optional["CfopRow"]) -> Optional[bool]:
     """
     True  -> CFOP de saída indicando produção do próprio estabelecimento.
     False -> CFOP válido mas sem indício de produção própria (ou entradas).
@@ -128,13 +275,6 @@ def detect_producao_emitente(cfop_code: str, cfop_row: Optional[Dict[str, str]])
     if not cfop_row:
         return None
 
-    desc = (
-        cfop_row.get("DESCRICAO_CFOP")
-        or cfop_row.get("DESCRIÇÃO_CFOP")
-        or cfop_row.get("descricao_cfop")
-        or ""
-    )
-
     cfop_norm = norm_code(cfop_code)
     if not cfop_norm:
         return None
@@ -143,7 +283,7 @@ def detect_producao_emitente(cfop_code: str, cfop_row: Optional[Dict[str, str]])
     if cfop_norm[0] not in ("5", "6", "7"):
         return False
 
-    desc_norm = normalize_text(desc)
+    desc_norm = cfop_row.descricao_norm
     keywords = [
         "producao do estabelecimento",
         "producao propria",
@@ -158,7 +298,7 @@ def detect_producao_emitente(cfop_code: str, cfop_row: Optional[Dict[str, str]])
     return any(k in desc_norm for k in keywords)
 
 
-def detect_venda_industrializada(cfop_code: str, cfop_row: Optional[Dict[str, str]]) -> Optional[bool]:
+def detect_venda_industrializada(cfop_code: str, cfop_row: Optional["CfopRow"]) -> Optional[bool]:
     """
     Detecta CFOPs de venda de produtos industrializados pelo estabelecimento.
     """
@@ -169,13 +309,7 @@ def detect_venda_industrializada(cfop_code: str, cfop_row: Optional[Dict[str, st
     if not cfop_norm or cfop_norm[0] not in ("5", "6", "7"):
         return False
 
-    desc = (
-        cfop_row.get("DESCRICAO_CFOP")
-        or cfop_row.get("DESCRIÇÃO_CFOP")
-        or cfop_row.get("descricao_cfop")
-        or ""
-    )
-    desc_norm = normalize_text(desc)
+    desc_norm = cfop_row.descricao_norm
 
     keywords = [
         "venda de producao do estabelecimento",
@@ -190,41 +324,117 @@ def detect_venda_industrializada(cfop_code: str, cfop_row: Optional[Dict[str, st
 
 def is_ncm_beneficiado_zfm(sources: DataSources, ncm_digits: str) -> bool:
     for r in sources.ncm_beneficiados_zfm:
-        raw = r.get("ncm") or r.get("NCM") or ""
-        if norm_ncm(raw)[:8] == ncm_digits[:8]:
+        if r.ncm == ncm_digits[:8]:
             return True
     return False
 
 
-def load_sources(data_anexos_dir: str) -> DataSources:
+def load_workers() -> int:
+    # LOAD_WORKERS: threads da carga das tabelas (1 = sequencial); default pelo nº de CPUs
+    raw = os.getenv("LOAD_WORKERS", "").strip()
+    if raw:
+        return max(1, int(raw))
+    return min(8, os.cpu_count() or 1)
+
+
+def load_sources(data_anexos_dir: str, workers: Optional[int] = None) -> DataSources:
+    """
+    Lê e indexa as tabelas de data/anexos. Arquivos independentes carregam em
+    paralelo (`workers` threads, default LOAD_WORKERS) e as tabelas grandes têm o
+    parse dividido em blocos; com 1 worker a carga é sequencial.
+
+    Tabela NCM vigente (e a busca/sugestão por descrição), *_model.csv e Anexo VII ficam para o primeiro acesso
+    (raramente usados no /classificar); LOAD_EAGER=1 carrega tudo aqui.
+    """
+    # busca_ncm/sugestao_ncm/fiscal_simples/fiscal_conversao/records usam os utilitários deste módulo
+    from .busca_ncm import IndiceNcm
+    from .fiscal_conversao import load_conversao
+    from .fiscal_simples import load_simples
+    from .records import (
+        AliquotaRow,
+        BeneficioRow,
+        CfopRow,
+        ClasTribRow,
+        CstMapRow,
+        NcmOficialRow,
+        NcmRow,
+        NcmZfmRow,
+        TransicaoRow,
+        load_tables,
+        read_records,
+    )
+    from .sugestao_ncm import SugestorNcm
+
     def p(name: str) -> str:
         return os.path.join(data_anexos_dir, name)
 
-    anexos_models: Dict[str, List[Dict[str, str]]] = {}
-    # tudo que terminar com _model.csv vira "modelo"
-    for fname in os.listdir(data_anexos_dir):
-        if fname.lower().endswith("_model.csv"):
-            anexos_models[fname] = read_csv_semicolon(p(fname))
+    specs = {
+        "ncm_master": (p("ncm_master.csv"), NcmRow),
+        "ncm_excecoes": (p("ncm_excecoes.csv"), NcmRow),
+        "ibs_aliquotas": (p("ibs_aliquotas.csv"), AliquotaRow),
+        "cbs_aliquotas": (p("cbs_aliquotas.csv"), AliquotaRow),
+        "transicao_ibs": (p("transicao_ibs.csv"), TransicaoRow),
+        "transicao_cbs": (p("transicao_cbs.csv"), TransicaoRow),
+        "cclastrib": (p("cclastrib.csv"), ClasTribRow),
+        "cst_ibs_cbs_map": (p("cst_ibs_cbs_map.csv"), CstMapRow),
+        "cfop": (p("cfop.csv"), CfopRow),
+        "ncm_beneficiados_zfm": (p("ncm_beneficiados_zfm.csv"), NcmZfmRow),
+        "beneficios_anexos": (p("beneficios_anexos.csv"), BeneficioRow),
+    }
+    def carga_simples() -> Optional["SimplesEngine"]:
+        return load_simples(os.path.join(data_anexos_dir, os.pardir, "simples"), p("simples_faixas.csv"))
+
+    # sob demanda
+    oficial = Carga(lambda: read_records(p("Tabela_NCM_Vigente_20251227.csv"), NcmOficialRow))
+    oficial_idx = Carga(lambda: build_ncm_index(oficial()))
+
+    def carga_models() -> Dict[str, List[NcmRow]]:
+        # tudo que terminar com _model.csv vira "modelo"
+        models = sorted(f for f in os.listdir(data_anexos_dir) if f.lower().endswith("_model.csv"))
+        return load_tables({fname: (p(fname), NcmRow) for fname in models})
+
+    def carga_conversao() -> Optional["ConversaoEngine"]:
+        return load_conversao(
+            p("anexo_vii_conversao.csv"),
+            os.path.join(data_anexos_dir, os.pardir, "conversao", "ANEXO_VII.csv"),
+        )
 
-    cfop_rows = read_csv_semicolon(p("cfop.csv"))
-    cfop_index = build_cfop_index(cfop_rows)
-    ncm_beneficiados_zfm = read_csv_semicolon(p("ncm_beneficiados_zfm.csv"))
+    workers = load_workers() if workers is None else max(1, workers)
+    if workers == 1:
+        tables = load_tables(specs)
+        simples = carga_simples()
+    else:
+        with ThreadPoolExecutor(workers, thread_name_prefix="load_sources") as pool:
+            fut_simples = pool.submit(carga_simples)
+            tables = load_tables(specs, pool)
+            simples = fut_simples.result()
 
-    return DataSources(
+    sources = DataSources(
         base_dir=data_anexos_dir,
-        ncm_master=read_csv_semicolon(p("ncm_master.csv")),
-        ncm_excecoes=read_csv_semicolon(p("ncm_excecoes.csv")),
-        ncm_oficial=read_csv_semicolon(p("Tabela_NCM_Vigente_20251227.csv")),
-        ibs_aliquotas=read_csv_semicolon(p("ibs_aliquotas.csv")),
-        cbs_aliquotas=read_csv_semicolon(p("cbs_aliquotas.csv")),
-        transicao_ibs=read_csv_semicolon(p("transicao_ibs.csv")),
-        transicao_cbs=read_csv_semicolon(p("transicao_cbs.csv")),
-        cclastrib=read_csv_semicolon(p("cclastrib.csv")),
-        cst_ibs_cbs_map=read_csv_semicolon(p("cst_ibs_cbs_map.csv")),
-        cfop_map=cfop_index,
-        ncm_beneficiados_zfm=ncm_beneficiados_zfm,
-        anexos_models=anexos_models,
+        ncm_master=tables["ncm_master"],
+        ncm_excecoes=tables["ncm_excecoes"],
+        ncm_master_idx=build_ncm_index(tables["ncm_master"]),
+        ncm_excecoes_idx=build_ncm_index(tables["ncm_excecoes"]),
+        ncm_oficial=oficial,
+        ncm_oficial_idx=oficial_idx,
+        ncm_busca=Carga(lambda: IndiceNcm.build(oficial(), tables["ncm_master"])),
+        ncm_sugestor=Carga(lambda: SugestorNcm.build(oficial(), tables["ncm_master"])),
+        ibs_aliquotas=tables["ibs_aliquotas"],
+        cbs_aliquotas=tables["cbs_aliquotas"],
+        transicao_ibs=tables["transicao_ibs"],
+        transicao_cbs=tables["transicao_cbs"],
+        cclastrib=tables["cclastrib"],
+        cst_ibs_cbs_map=tables["cst_ibs_cbs_map"],
+        cfop_map=build_cfop_index(tables["cfop"]),
+        ncm_beneficiados_zfm=tables["ncm_beneficiados_zfm"],
+        anexos_models=Carga(carga_models),
+        beneficios_anexos=build_beneficios_index(tables["beneficios_anexos"]),
+        simples=simples,
+        conversao=Carga(carga_conversao),
     )
+    if os.getenv("LOAD_EAGER", "").strip().lower() in ("1", "true", "s", "sim"):
+        sources.materializar()
+    return sources
 
 
 # -------------------------
@@ -233,20 +443,17 @@ def load_sources(data_anexos_dir: str) -> DataSources:
 
 def dentro_da_vigencia(
     data: date,
-    inicio: Optional[str],
-    fim: Optional[str]
+    inicio: Optional[date],
+    fim: Optional[date]
 ) -> bool:
     if not inicio:
         return True
 
-    d_ini = date.fromisoformat(inicio)
-    if data < d_ini:
+    if data < inicio:
         return False
 
-    if fim:
-        d_fim = date.fromisoformat(fim)
-        if data > d_fim:
-            return False
+    if fim and data > fim:
+        return False
 
     return True
 
@@ -254,27 +461,14 @@ def find_in_master(
     sources: DataSources,
     ncm_digits: str,
     data_emissao: date,
-) -> Optional[Dict[str, str]]:
-
-    for r in sources.ncm_master:
-        raw = r.get("ncm", "")
-        if not raw:
+) -> Optional["NcmRow"]:
+    for r in sources.ncm_master_idx.get(ncm_digits[:8], ()):
+        if r.vigencia_inicio and data_emissao < r.vigencia_inicio:
             continue
 
-        if norm_ncm(raw)[:8] != ncm_digits[:8]:
+        if r.vigencia_fim and data_emissao > r.vigencia_fim:
             continue
 
-        vig_ini = r.get("vigencia_inicio")
-        vig_fim = r.get("vigencia_fim")
-
-        if vig_ini:
-            if data_emissao < date.fromisoformat(vig_ini):
-                continue
-
-        if vig_fim:
-            if data_emissao > date.fromisoformat(vig_fim):
-                continue
-
         return r
 
     return None
@@ -285,21 +479,9 @@ def find_excecao(
     sources: DataSources,
     ncm_digits: str,
     data_emissao: date,
-) -> Optional[Dict[str, str]]:
-
-    for r in sources.ncm_excecoes:
-        raw = r.get("ncm", "")
-        if not raw:
-            continue
-
-        if norm_ncm(raw)[:8] != ncm_digits[:8]:
-            continue
-
-        if not dentro_da_vigencia(
-            data_emissao,
-            r.get("vigencia_inicio"),
-            r.get("vigencia_fim"),
-        ):
+) -> Optional["NcmRow"]:
+    for r in sources.ncm_excecoes_idx.get(ncm_digits[:8], ()):
+        if not dentro_da_vigencia(data_emissao, r.vigencia_inicio, r.vigencia_fim):
             continue
 
         return r
@@ -311,35 +493,15 @@ def find_in_oficial(
     sources: DataSources,
     ncm_digits: str,
     data_emissao: date,
-) -> Optional[Dict[str, str]]:
+) -> Optional["NcmOficialRow"]:
     """
     Busca na tabela oficial de NCM (vigente) para obter descrição/vigência.
     Não atribui categoria, apenas auxilia na confirmação do código.
     """
-    def pick(r: Dict[str, str], keys: List[str]) -> Optional[str]:
-        for k in keys:
-            if k in r:
-                return r.get(k)
-        return None
-
-    for r in sources.ncm_oficial:
-        raw = pick(r, ["Código", "Codigo", "CÓDIGO", "CODIGO", "Cód.", "C¢digo"])
-        if not raw:
-            continue
-
-        if norm_ncm(raw)[:8] != ncm_digits[:8]:
-            continue
-
-        ini = parse_date_br(
-            pick(r, ["Data Início", "Data Inicio", "Data In¡cio", "Data Inicio ", "DATA INICIO", "Data Início "])
-        )
-        fim = parse_date_br(
-            pick(r, ["Data Fim", "DATA FIM", "Data Fim "])
-        )
-
-        if ini and data_emissao < ini:
+    for r in sources.ncm_oficial_idx.get(ncm_digits[:8], ()):
+        if r.data_inicio and data_emissao < r.data_inicio:
             continue
-        if fim and data_emissao > fim:
+        if r.data_fim and data_emissao > r.data_fim:
             continue
 
         return r
@@ -347,8 +509,79 @@ def find_in_oficial(
     return None
 
 
+def resolve_ncm(
+    sources: DataSources,
+    ncm_digits: str,
+    data_emissao: date,
+) -> Tuple[str, Optional["NcmRow"], Optional["NcmOficialRow"]]:
+    """
+    (fonte, linha interna, linha da tabela oficial) vigentes na data.
+    Exceção vence o master; a tabela oficial só é consultada sem linha interna.
+    """
+    fonte = "excecao"
+    row = find_excecao(sources, ncm_digits, data_emissao)
+    if not row:
+        fonte = "master"
+        row = find_in_master(sources, ncm_digits, data_emissao)
+    row_oficial = None if row else find_in_oficial(sources, ncm_digits, data_emissao)
+    if not row:
+        fonte = "oficial" if row_oficial else "none"
+    return fonte, row, row_oficial
+
+
+def ncm_candidatos(sources: DataSources, ncm_digits: str) -> DataSources:
+    """
+    Cópia de `sources` só com as linhas de NCM do código (qualquer vigência),
+    tiradas dos índices; resolve_ncm sobre ela aplica a vigência a esse
+    punhado de linhas.
+    """
+    ncm8 = ncm_digits[:8]
+    # cópia rasa em vez de dataclasses.replace: não força os campos sob demanda
+    out = copy.copy(sources)
+    excecoes = list(sources.ncm_excecoes_idx.get(ncm8, ()))
+    master = list(sources.ncm_master_idx.get(ncm8, ()))
+    oficial = list(sources.ncm_oficial_idx.get(ncm8, ())) if ncm8 else []
+    out.ncm_excecoes, out.ncm_excecoes_idx = excecoes, ({ncm8: excecoes} if excecoes else {})
+    out.ncm_master, out.ncm_master_idx = master, ({ncm8: master} if master else {})
+    out.ncm_oficial = oficial
+    out.ncm_oficial_idx = {ncm8: oficial} if oficial else {}
+    return out
+
+
+# Condição do item do anexo (coluna condicao do beneficios_anexos.csv, marcada
+# pelo normalize_anexos). Só itens sem condição são aplicados pelo NCM; os demais
+# viram benefício candidato, com pendência e alíquotas cheias.
+CONDICOES_BENEFICIO: Dict[str, str] = {
+    "destinacao": "destinação ou uso específico do bem",
+    "substancia": "princípio ativo listado no anexo (o NCM abrange outros medicamentos)",
+    "ncm_residual": "descrição do item (NCM residual \"Outros\" abrange outros produtos)",
+}
+
+
+def find_beneficio_anexo(
+    sources: DataSources,
+    ncm_digits: str,
+) -> Optional["BeneficioRow"]:
+    """
+    Benefício de anexo da LC 214/2025 para o NCM: o prefixo mais longo vence,
+    a menos que o NCM caia numa exceção daquele item. Item incondicional vence
+    item condicionado; sem nenhum incondicional, volta o condicionado mais
+    específico (candidato, não aplicado).
+    """
+    candidato: Optional["BeneficioRow"] = None
+    for n in range(min(len(ncm_digits), 8), 1, -1):
+        for row in sources.beneficios_anexos.get(ncm_digits[:n], ()):
+            if any(ncm_digits.startswith(e) for e in row.excecoes):
+                continue
+            if not row.condicao:
+                return row
+            if candidato is None:
+                candidato = row
+    return candidato
+
+
 def year_factor_transicao(
-    rows: List[Dict[str, str]],
+    rows: List["TransicaoRow"],
     year: int,
     campo_percentual: str
 ) -> Optional[float]:
@@ -358,19 +591,13 @@ def year_factor_transicao(
       campo_percentual = 'percentual_cbs'
     """
     for r in rows:
-        ano = str(r.get("ano", "")).strip()
-        if ano == str(year):
-            raw = r.get(campo_percentual)
-            if raw is None or raw == "":
-                return None
-
-            v = parse_float_ptbr(raw)
-            return v  # JÁ está em formato decimal (0.001, 0.009)
+        if r.ano == year:
+            return getattr(r, campo_percentual)  # JÁ está em formato decimal (0.001, 0.009)
 
     return None
 
 
-def base_aliquota(rows: List[Dict[str, str]], keyname: str) -> Optional[float]:
+def base_aliquota(rows: List["AliquotaRow"], keyname: str) -> Optional[float]:
     """
     ibs_aliquotas.csv / cbs_aliquotas.csv:
       tipo;aliquota
@@ -378,9 +605,8 @@ def base_aliquota(rows: List[Dict[str, str]], keyname: str) -> Optional[float]:
     """
     keyname = norm_code(keyname)
     for r in rows:
-        t = norm_code(r.get("tipo") or r.get("TIPO") or "")
-        if t == keyname:
-            v = parse_float_ptbr(r.get("aliquota") or r.get("ALIQUOTA"))
+        if r.tipo == keyname:
+            v = r.aliquota
             if v is None:
                 return None
             return v / 100.0 if v > 1 else v
@@ -392,12 +618,8 @@ def map_cst_ibs_cbs_from_cclastrib(
 ) -> Tuple[str, str, str]:
 
     for r in sources.cst_ibs_cbs_map:
-        if r.get("cclastrib_codigo") == cclastrib_codigo:
-            return (
-                r.get("cst_ibs_cbs"),
-                r.get("cclass_trib"),
-                r.get("descricao"),
-            )
+        if r.cclastrib_codigo == cclastrib_codigo:
+            return (r.cst_ibs_cbs, r.cclass_trib, r.descricao)
 
     # fallback seguro
     return ("000", "000001", "Tributação integral - padrão")
@@ -410,7 +632,7 @@ def pick_cclastrib(
     uf_d: str,
     cst_icms: str,
     zfm_context: bool = False,
-) -> Tuple[str, str, List[Dict[str, str]]]:
+) -> Tuple[str, str, List["ClasTribRow"]]:
     """
     cclastrib.csv deve ser sua tabela de "classificação" operacional.
     Esperamos colunas aproximadas:
@@ -425,18 +647,15 @@ def pick_cclastrib(
 
     candidatos = []
     for r in sources.cclastrib:
-        aplica_zfm = norm_code(r.get("aplica_zfm") or r.get("apply_zfm") or "")
-        aplica_zfm_flag = aplica_zfm in ("S", "SIM", "1", "TRUE", "T", "Y")
-
         # Evita selecionar regras marcadas para ZFM quando o contexto não é ZFM
-        if aplica_zfm_flag and not zfm_context:
+        if r.aplica_zfm and not zfm_context:
             continue
 
-        r_reg = norm_code(r.get("regime_emitente") or r.get("regime") or r.get("regime_fiscal") or "")
-        r_cfop = norm_code(r.get("cfop") or "")
-        r_ufe = norm_code(r.get("uf_origem") or r.get("uf_emitente") or "")
-        r_ufd = norm_code(r.get("uf_destino") or r.get("uf_destinatario") or "")
-        r_cst = norm_code(r.get("cst_icms") or "")
+        r_reg = r.regime
+        r_cfop = r.cfop
+        r_ufe = r.uf_origem
+        r_ufd = r.uf_destino
+        r_cst = r.cst_icms
 
         # match flexível: se a célula vier vazia, vira "coringa"
         ok = True
@@ -460,23 +679,10 @@ def pick_cclastrib(
             candidatos.append(r)
 
     # prioriza o mais "específico" (mais campos preenchidos)
-    def score(r: Dict[str, str]) -> int:
-        aplica_zfm_local = norm_code(r.get("aplica_zfm") or r.get("apply_zfm") or "")
-        aplica_zfm_flag_local = aplica_zfm_local in ("S", "SIM", "1", "TRUE", "T", "Y")
-        keys = [
-            "regime_emitente",
-            "regime",
-            "regime_fiscal",
-            "cfop",
-            "uf_origem",
-            "uf_emitente",
-            "uf_destino",
-            "uf_destinatario",
-            "cst_icms",
-        ]
-        base_score = sum(1 for k in keys if (r.get(k) or "").strip() and (r.get(k) or "").strip() != "*")
+    def score(r: "ClasTribRow") -> int:
+        base_score = r.especificidade
         # favorece regras específicas para ZFM quando o contexto for ZFM
-        if zfm_context and aplica_zfm_flag_local:
+        if zfm_context and r.aplica_zfm:
             base_score += 10
         return base_score
 
@@ -485,8 +691,8 @@ def pick_cclastrib(
     if candidatos:
         top = candidatos[0]
         return (
-            top.get("codigo") or top.get("CODIGO") or "REGRA-GERAL",
-            top.get("descricao") or top.get("DESCRICAO") or "Regra geral",
+            top.codigo or "REGRA-GERAL",
+            top.descricao or "Regra geral",
             candidatos,
         )
 
@@ -523,10 +729,12 @@ def apply_reducao(aliquota: float, p_redutor: Optional[float]) -> float:
 # -------------------------
 
 
-def should_apply_is(data_emissao: date, categoria: Optional[str]) -> bool:
+def should_apply_is(data_emissao: date, categoria: Optional[str], anexo_is: bool = False) -> bool:
     # você pediu: IS só pra 2027+ e itens nocivos
     if data_emissao.year < 2027:
         return False
+    if anexo_is:
+        return True
     cat = norm_code(categoria or "")
     return cat in ("NOCIVO", "SELETIVO", "BEBIDAS", "CIGARROS")  # ajuste conforme seu ncm_master
 
@@ -572,22 +780,75 @@ def compute_ibs_cbs(
         "fonte": "transicao_cbs.csv"
     })
 
-    p_red_bares_restaurantes = 40.0 if fornecimento_alimentacao else None
-    if p_red_bares_restaurantes:
-        ibs = apply_reducao(ibs, p_red_bares_restaurantes)
-        cbs = apply_reducao(cbs, p_red_bares_restaurantes)
+    p_red = 40.0 if fornecimento_alimentacao else None
+    alertas: List[str] = []
+    pendencias: List[str] = []
+    beneficio = find_beneficio_anexo(sources, norm_ncm(ncm))
+    candidato = None
+    if beneficio and beneficio.condicao:
+        candidato, beneficio = beneficio, None
+    imposto_seletivo = bool(beneficio) and beneficio.tipo == "imposto_seletivo"
+
+    if p_red:
+        ibs = apply_reducao(ibs, p_red)
+        cbs = apply_reducao(cbs, p_red)
         fundamentos.append({
             "regra": "LC 214/2025 arts. 273-275",
             "motivo": "Fornecimento de alimentação por bares/restaurantes: redução de 40% nas alíquotas de IBS e CBS",
             "fonte": "lc214_2025.html (regime específico)"
         })
+    elif beneficio and beneficio.tipo == "reducao":
+        p_red = beneficio.reducao
+        ibs = apply_reducao(ibs, p_red)
+        cbs = apply_reducao(cbs, p_red)
+        efeito = "redução a zero" if p_red == 100 else f"redução de {p_red:g}%"
+        fundamentos.append({
+            "regra": f"LC 214/2025 {beneficio.anexo}",
+            "motivo": f"NCM no item {beneficio.item} ({beneficio.descricao}): {efeito} das alíquotas de IBS e CBS",
+            "fonte": "beneficios_anexos.csv"
+        })
+        alertas.append(
+            f"Benefício do {beneficio.anexo} aplicado pelo NCM; confirmar o enquadramento na descrição do item {beneficio.item}"
+        )
+
+    if candidato and not p_red:
+        if candidato.tipo == "reducao":
+            efeito = "redução a zero" if candidato.reducao == 100 else f"redução de {candidato.reducao:g}%"
+            efeito += " das alíquotas de IBS e CBS"
+        else:
+            efeito = "incidência do Imposto Seletivo"
+        condicao = CONDICOES_BENEFICIO.get(candidato.condicao, candidato.condicao)
+        pendencias.append(
+            f"Possível benefício do {candidato.anexo} item {candidato.item} ({candidato.descricao}): "
+            f"{efeito} condicionada a {condicao}; alíquotas calculadas sem o benefício até confirmar o enquadramento"
+        )
+        fundamentos.append({
+            "regra": f"LC 214/2025 {candidato.anexo}",
+            "motivo": f"Item {candidato.item} depende de {condicao}: benefício não aplicado pelo NCM",
+            "fonte": "beneficios_anexos.csv"
+        })
+
+    if beneficio:
+        metrics.ANEXO_BENEFICIO_TOTAL.inc(beneficio.anexo, "aplicado")
+    elif candidato:
+        metrics.ANEXO_BENEFICIO_TOTAL.inc(candidato.anexo, "candidato")
+    if imposto_seletivo:
+        fundamentos.append({
+            "regra": f"LC 214/2025 {beneficio.anexo}",
+            "motivo": f"NCM listado entre os bens sujeitos ao Imposto Seletivo (item {beneficio.item})",
+            "fonte": "beneficios_anexos.csv"
+        })
 
     return {
         "ano_referencia": year,
         "aliquota_ibs": ibs,
         "aliquota_cbs": cbs,
-        "p_red_ibs": p_red_bares_restaurantes,
-        "p_red_cbs": p_red_bares_restaurantes,
+        "p_red_ibs": p_red,
+        "p_red_cbs": p_red,
+        "imposto_seletivo": imposto_seletivo,
+        "beneficio_candidato": bool(candidato) and not p_red,
+        "alertas": alertas,
+        "pendencias": pendencias,
         "fundamentos": fundamentos,
     }
 
@@ -612,8 +873,11 @@ def classify(
     cadastro_suframa_destinatario_ativo: Optional[bool],
     cod_municipio_destinatario: Optional[int] = None,
     fornecimento_alimentacao: bool = False,
+    anexo_simples: Optional[str] = None,
+    rbt12: Optional[float] = None,
 ) -> Dict[str, Any]:
 
+    t = time.perf_counter()
     fundamentos_gerais: List[Dict[str, str]] = []
     alertas: List[str] = []
     pendencias: List[str] = []
@@ -624,12 +888,7 @@ def classify(
     cfop_venda_industrializado = detect_venda_industrializada(cfop_code, cfop_row)
 
     if cfop_row:
-        desc_cfop = (
-            cfop_row.get("DESCRICAO_CFOP")
-            or cfop_row.get("DESCRIÇÃO_CFOP")
-            or cfop_row.get("descricao_cfop")
-            or ""
-        )
+        desc_cfop = cfop_row.descricao
         motivo_cfop = f"{cfop_code} - {desc_cfop}".strip()
         if produzido_emitente is True:
             motivo_cfop = f"{motivo_cfop} (produção do emitente)"
@@ -650,6 +909,7 @@ def classify(
             "motivo": f"CFOP {cfop_code} não encontrado em cfop.csv",
             "fonte": "cfop.csv"
         })
+    t = metrics.lap("cfop", t)
 
     # -------------------------
     # ZFM / SUFRAMA (emitente e destinatário)
@@ -691,6 +951,7 @@ def classify(
         })
         if cadastro_suframa_destinatario_ativo is False:
             alertas.append("Cadastro SUFRAMA do destinatário informado como inativo")
+    t = metrics.lap("contexto", t)
 
     # -------------------------
     # NCM / Categoria / Benefícios ZFM
@@ -698,30 +959,12 @@ def classify(
     ncm_digits = norm_ncm(ncm)
     ncm_beneficiado_zfm = is_ncm_beneficiado_zfm(sources, ncm_digits)
 
-# 🔎 DEBUG TEMPORÁRIO — COLOQUE AQUI
-    print("DEBUG NCM solicitado:", ncm_digits)
-    print("DEBUG total de NCMs no master:", len(sources.ncm_master))
-
-    found = False
-    for r in sources.ncm_master:
-        raw = r.get("ncm") or r.get("NCM") or ""
-        if norm_ncm(raw)[:8] == ncm_digits[:8]:
-            print("MATCH NCM MASTER:", r)
-            found = True
-
-    if not found:
-        print("⚠️ NENHUM MATCH ENCONTRADO NO NCM_MASTER")
-
-    row = (
-        find_excecao(sources, ncm_digits, data_emissao)
-        or find_in_master(sources, ncm_digits, data_emissao)
-    )
-    row_oficial = None if row else find_in_oficial(sources, ncm_digits, data_emissao)
+    ncm_fonte, row, row_oficial = resolve_ncm(sources, ncm_digits, data_emissao)
+    metrics.NCM_SOURCE_TOTAL.inc(ncm_fonte)
 
     categoria = None
     if row:
-        categoria_raw = (row.get("categoria") or row.get("CATEGORIA") or "").strip()
-        categoria = categoria_raw or None
+        categoria = row.categoria or None
 
         if categoria:
             fundamentos_gerais.append({
@@ -730,14 +973,7 @@ def classify(
                 "fonte": "ncm_master.csv / ncm_excecoes.csv"
             })
     elif row_oficial:
-        desc = (
-            row_oficial.get("Descrição")
-            or row_oficial.get("Descriçao")
-            or row_oficial.get("DescriÇao")
-            or row_oficial.get("Descri‡Æo")
-            or row_oficial.get("Descrição ")
-            or ""
-        )
+        desc = row_oficial.descricao
         fundamentos_gerais.append({
             "regra": "NCM OFICIAL (vigência confirmada)",
             "motivo": f"NCM encontrado em Tabela_NCM_Vigente_20251227.csv. Descrição: {desc or 'não informada'}",
@@ -763,7 +999,7 @@ def classify(
             "motivo": f"NCM {ncm_digits} listado para benefício de IBS na ZFM",
             "fonte": "ncm_beneficiados_zfm.csv"
         })
-
+    t = metrics.lap("ncm_lookup", t)
 
     # -------------------------
     # cClasTrib operacional
@@ -816,6 +1052,9 @@ def classify(
         "motivo": f"CST={cst_ibs_cbs} cClassTrib={cclass_trib}" + (f" ({desc_cst})" if desc_cst else ""),
         "fonte": fonte_cst
     })
+    if cod_cclastrib == "REGRA-GERAL":
+        metrics.FALLBACK_REGRA_GERAL_TOTAL.inc()
+    t = metrics.lap("cclastrib", t)
 
     # -------------------------
     # Alíquotas IBS / CBS (transição)
@@ -829,6 +1068,8 @@ def classify(
     )
 
     fundamentos_gerais.extend(calc["fundamentos"])
+    alertas.extend(calc["alertas"])
+    pendencias.extend(calc["pendencias"])
 
     aliq_ibs = calc["aliquota_ibs"]
     aliq_cbs = calc["aliquota_cbs"]
@@ -839,10 +1080,7 @@ def classify(
         aliq_ibs = 0.0
 
         selected_row = candidatos_cclastrib[0] if candidatos_cclastrib else None
-        aplica_zfm_selected = False
-        if selected_row:
-            aplica_zfm_val = norm_code(selected_row.get("aplica_zfm") or selected_row.get("apply_zfm") or "")
-            aplica_zfm_selected = aplica_zfm_val in ("S", "SIM", "1", "TRUE", "T", "Y")
+        aplica_zfm_selected = bool(selected_row) and selected_row.aplica_zfm
 
         if not aplica_zfm_selected:
             # fallback seguro se não houver regra ZFM no CSV
@@ -861,6 +1099,17 @@ def classify(
         })
     elif emitente_zfm and produzido_zfm and not ncm_beneficiado_zfm:
         alertas.append("NCM não listado para benefício ZFM; IBS calculado normalmente")
+    t = metrics.lap("rates", t)
+
+    # -------------------------
+    # Simples Nacional: faixa e alíquota efetiva pela RBT12
+    # -------------------------
+    simples = None
+    if sources.simples is not None:
+        sn = sources.simples.avaliar(regime, anexo_simples, data_emissao.year, rbt12)
+        simples = sn["simples"]
+        fundamentos_gerais.extend(sn["fundamentos"])
+        pendencias.extend(sn["pendencias"])
 
     # -------------------------
     # Flags especiais
@@ -875,7 +1124,7 @@ def classify(
             "Regime bares/restaurantes: vedada apropriaÇõÇœ de crÇðditos pelo adquirente (art. 276 LC 214/2025)"
         )
 
-    aplicar_is = should_apply_is(data_emissao, categoria)
+    aplicar_is = should_apply_is(data_emissao, categoria, anexo_is=calc["imposto_seletivo"])
 
     if compra_gov:
         fundamentos_gerais.append({
@@ -892,7 +1141,11 @@ def classify(
         confianca += 0.2
     if cod_cclastrib != "REGRA-GERAL":
         confianca += 0.2
-    confianca = min(confianca, 1.0)
+    if calc["beneficio_candidato"]:
+        # benefício de anexo possível mas não confirmado pelo NCM
+        confianca -= 0.2
+    confianca = round(min(confianca, 1.0), 2)
+    metrics.lap("finalize", t)
 
     # -------------------------
     # Retorno final
@@ -925,6 +1178,10 @@ def classify(
         "alertas": alertas,
         "pendencias": pendencias,
         "fundamentos_gerais": fundamentos_gerais,
+        "simples": simples,
+        "p_red_ibs": calc["p_red_ibs"],
+        "p_red_cbs": calc["p_red_cbs"],
+        "imposto_seletivo": calc["imposto_seletivo"],
         "flags": {
             "compra_gov": compra_gov,
             "ind_doacao": ind_doacao,
@@ -934,3 +1191,68 @@ def classify(
             "fornecimento_alimentacao": fornecimento_alimentacao,
         },
     }
+
+
+# -------------------------
+# Simulação multi-ano
+# -------------------------
+def transicao_por_ano(sources: DataSources) -> Dict[int, Tuple[float, float]]:
+    """
+    {ano: (percentual_ibs, percentual_cbs)} em uma passada pelas duas tabelas.
+    """
+    out: Dict[int, List[float]] = {}
+    for rows, campo, i in ((sources.transicao_ibs, "percentual_ibs", 0), (sources.transicao_cbs, "percentual_cbs", 1)):
+        for r in rows:
+            if r.ano is not None:
+                out.setdefault(r.ano, [0.0, 0.0])[i] = getattr(r, campo) or 0.0
+    return {ano: (v[0], v[1]) for ano, v in out.items()}
+
+
+def classify_anos(
+    sources: DataSources,
+    anos: List[int],
+    transicao: Optional[Dict[int, Tuple[float, float]]] = None,
+    **kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    classify para vários anos de uma vez. CFOP, ZFM, NCM, cClasTrib e CST são
+    resolvidos uma vez (no primeiro ano); por ano só mudam a transição, o IS e
+    o Simples. Se a vigência do NCM mudar no meio do período, o ano em questão
+    passa pelo classify completo.
+
+    Devolve, por ano: {"ano", "aliquota_ibs", "aliquota_cbs", "aplicar_is", "resultado"}.
+    kwargs são os argumentos nomeados do classify, sem data_emissao.
+    """
+    anos = sorted(set(anos))
+    transicao = transicao if transicao is not None else transicao_por_ano(sources)
+    ncm_digits = norm_ncm(kwargs["ncm"])
+    candidatos = ncm_candidatos(sources, ncm_digits)
+
+    def chave_ncm(d: date) -> Tuple[str, int, int]:
+        fonte, row, row_oficial = resolve_ncm(candidatos, ncm_digits, d)
+        return fonte, id(row), id(row_oficial)
+
+    base_ano = anos[0]
+    base = classify(sources, data_emissao=date(base_ano, 1, 1), **kwargs)
+    base_chave = chave_ncm(date(base_ano, 1, 1))
+
+    out: List[Dict[str, Any]] = []
+    for ano in anos:
+        d = date(ano, 1, 1)
+        res = base
+        if ano != base_ano and chave_ncm(d) != base_chave:
+            res = classify(sources, data_emissao=d, **kwargs)
+
+        ibs, cbs = transicao.get(ano, (0.0, 0.0))
+        ibs = apply_reducao(ibs, res["p_red_ibs"])
+        cbs = apply_reducao(cbs, res["p_red_cbs"])
+        if res["beneficio_zfm_ibs_zero"]:
+            ibs = 0.0
+        out.append({
+            "ano": ano,
+            "aliquota_ibs": ibs,
+            "aliquota_cbs": cbs,
+            "aplicar_is": should_apply_is(d, res["categoria"], anexo_is=res["imposto_seletivo"]),
+            "resultado": res,
+        })
+    return out
@@ -4,8 +4,6 @@ from datetime import date, datetime
 from typing import List, Optional, Literal, Dict, Any, Union
 from pydantic import BaseModel, Field, ConfigDict
 
-print(">>> ProdutoTags carregado de:", __file__)
-
 # -------------------------
 # INPUT (o que o Delphi envia)
 # -------------------------
@@ -35,6 +33,8 @@ class ClassifyRequest(BaseModel):
     dfe_referenciado_chave: Optional[str] = Field("", description="Chave de DF-e referenciado no item")
     dfe_referenciado_nitem: Optional[int] = Field(1, description="nItem do DF-e referenciado")
     fornecimento_alimentacao: Optional[bool] = Field(False, description="S se for fornecimento de alimentaÇõÇœ por bares/restaurantes (art. 273 LC 214/2025)")
+    anexo_simples: Optional[str] = Field(None, description="Anexo do Simples Nacional do emitente (I a V)")
+    rbt12: Optional[float] = Field(None, ge=0, description="Receita bruta dos últimos 12 meses (Simples Nacional)")
 
 
 # -------------------------
@@ -318,6 +318,78 @@ class XmlPayload(BaseModel):
     totais: TotaisTags
 
 
+# -------------------------
+# SIMPLES NACIONAL
+# -------------------------
+class SimplesResultado(BaseModel):
+    anexo: str
+    faixa: int
+    receita_inicial: float
+    receita_final: float
+    aliquota_nominal: float     # percentual (ex: 9.5)
+    valor_deduzir: float
+    aliquota_efetiva: float     # percentual
+
+
+class SimplesEmpresa(BaseModel):
+    id: Optional[Union[str, int]] = Field(None, description="Identificador da empresa na carteira")
+    anexo: str = Field(..., description="Anexo do Simples Nacional (I a V)")
+    rbt12: float = Field(..., ge=0, description="Receita bruta dos últimos 12 meses")
+
+
+class SimplesCarteiraRequest(BaseModel):
+    ano: int
+    empresas: List[SimplesEmpresa]
+
+
+class SimplesCarteiraItem(BaseModel):
+    id: Optional[Union[str, int]] = None
+    anexo: str
+    rbt12: float
+    resultado: Optional[SimplesResultado] = None
+    pendencia: Optional[str] = None
+
+
+class SimplesCarteiraResponse(BaseModel):
+    ano: int
+    empresas: List[SimplesCarteiraItem]
+
+
+# -------------------------
+# CONVERSÃO ICMS/ISS -> IBS/CBS (Anexo VII)
+# -------------------------
+class ConverterRequest(BaseModel):
+    ano: Optional[int] = Field(None, description="Ano de destino (mesmo para todos os valores; 2026 em diante)")
+    anos: Optional[List[int]] = Field(None, description="Ano de destino de cada valor (no lugar de ano)")
+    ano_base: Optional[int] = Field(None, description="Ano em que os valores de origem foram apurados (default: o próprio ano)")
+    origem: str = Field("ICMS", description="ICMS, ISS, CBS, IBS ou TOTAL")
+    destino: str = Field("IBS", description="ICMS, ISS, CBS, IBS ou TOTAL")
+    valores: List[float]
+
+
+class ConverterResponse(BaseModel):
+    origem: str
+    destino: str
+    ano: Optional[int] = None
+    ano_base: Optional[int] = None
+    fator: Optional[float] = None
+    valores: List[Optional[float]]
+
+
+# -------------------------
+# REVISÃO POR LLM (baixa confiança, opt-in)
+# -------------------------
+class RevisaoLLM(BaseModel):
+    backend: str = Field(..., description="LLM_BACKEND que respondeu (ex: openai:gpt-4o-mini, stub)")
+    origem: str = Field(..., description="modelo (chamada feita agora) ou cache (mesmo prompt já respondido)")
+    concorda: bool = Field(..., description="cClasTrib do modelo igual ao das regras")
+    cclastrib: Optional[BlocoResultado] = None
+    cst_ibs_cbs: Optional[str] = None
+    cclass_trib: Optional[str] = None
+    fundamento: List[FundamentoItem] = []
+    pendencias: List[str] = []
+
+
 # -------------------------
 # RESPOSTA DA API
 # -------------------------
@@ -345,6 +417,19 @@ class ClassifyResponse(BaseModel):
     pendencias: List[str]
     xml: XmlPayload
     fundamentos_gerais: List[FundamentoItem]
+    simples: Optional[SimplesResultado] = None
+    # só com revisao_llm=true e confianca abaixo de LLM_CONFIANCA_MIN; não entra no cache
+    revisao_llm: Optional[RevisaoLLM] = None
+
+class SugestaoNcmCandidato(BaseModel):
+    ncm: str
+    descricao: str
+    similaridade: float = Field(..., description="Cosseno TF-IDF (n-gramas) entre deitem e a descrição do NCM")
+
+class SugestaoNcm(BaseModel):
+    divergente: bool = Field(..., description="deitem aponta para outra posição (4 dígitos) que não a do NCM declarado")
+    similaridade_declarado: Optional[float] = Field(None, description="Similaridade com o NCM declarado (None: fora da Tabela NCM)")
+    candidatos: List[SugestaoNcmCandidato]
 
 class ClassifyLoteItem(BaseModel):
     item: int = Field(..., description="Sequencial do item no documento")
@@ -380,6 +465,9 @@ class ClassifyLoteRequest(BaseModel):
     cadastro_suframa_destinatario_ativo: Optional[str] = Field(None, description="S/N se cadastro SUFRAMA do destinatário está ativo")
 
     fornecimento_alimentacao: Optional[bool] = Field(False, description="S se for fornecimento de alimentaÇõÇœ por bares/restaurantes (art. 273 LC 214/2025)")
+    anexo_simples: Optional[str] = Field(None, description="Anexo do Simples Nacional do emitente (I a V)")
+    rbt12: Optional[float] = Field(None, ge=0, description="Receita bruta dos últimos 12 meses (Simples Nacional)")
+    sugerir_ncm: bool = Field(False, description="Confere o NCM declarado com o deitem e sugere candidatos")
 
     itens: List[ClassifyLoteItem]
 
@@ -396,6 +484,7 @@ class ClassifyLoteItemResponse(BaseModel):
     cfop: str
     produzido_zfm: str
     resultado: ClassifyResponse
+    sugestao_ncm: Optional[SugestaoNcm] = None
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -404,3 +493,78 @@ class ClassifyLoteResponse(BaseModel):
     itens: List[ClassifyLoteItemResponse]
 
 
+# -------------------------
+# SIMULAÇÃO MULTI-ANO (transição 2026-2033)
+# -------------------------
+class SimulacaoRequest(ClassifyLoteRequest):
+    # uma operação = lote com um item
+    ano_emissao: Optional[int] = None
+    ano_inicio: int = Field(2026, description="Primeiro ano simulado")
+    ano_fim: int = Field(2033, description="Último ano simulado (inclusive)")
+
+
+class SimulacaoItem(BaseModel):
+    item: int
+    cditem: Optional[Union[str, int]] = None
+    deitem: Optional[str] = None
+    ncm: str
+    cfop: str
+    cst_icms: str
+    valor_item: Optional[float] = None
+    cclastrib: str
+    cst_ibs_cbs: str
+    cclass_trib: str
+    categoria: Optional[str] = None
+    alertas: List[str] = []
+    pendencias: List[str] = []
+
+
+class SimulacaoCelula(BaseModel):
+    aliquota_ibs: float             # percentual
+    aliquota_cbs: float             # percentual
+    valor_ibs: Optional[float] = None
+    valor_cbs: Optional[float] = None
+    total_tributos: Optional[float] = None
+    aplicar_is: bool = False
+    aliquota_efetiva_simples: Optional[float] = None
+
+
+class SimulacaoResponse(BaseModel):
+    anos: List[int]
+    itens: List[SimulacaoItem]
+    matriz: List[List[SimulacaoCelula]] = Field(..., description="matriz[i_ano][i_item], na ordem de anos e itens")
+
+
+# -------------------------
+# AUDITORIA DE CATÁLOGO (NCM)
+# -------------------------
+class AuditoriaItem(BaseModel):
+    sku: Union[str, int]
+    ncm: str
+
+
+class AuditoriaRequest(BaseModel):
+    data_referencia: Optional[date] = Field(None, description="Data da vigência verificada (default: hoje)")
+    itens: List[AuditoriaItem]
+
+
+# -------------------------
+# BUSCA DE NCM POR DESCRIÇÃO
+# -------------------------
+class NcmBuscaItem(BaseModel):
+    ncm: str
+    descricao: str
+    caminho: List[str] = Field(default_factory=list, description="Descrições dos níveis acima (capítulo -> item)")
+    categoria: Optional[str] = None
+    score: float
+
+
+class NcmBuscaResponse(BaseModel):
+    consulta: str
+    pagina: int
+    tamanho: int
+    total: int
+    itens: List[NcmBuscaItem]
+    correcoes: Dict[str, List[str]] = Field(
+        default_factory=dict, description="Termos fora do vocabulário e os termos usados no lugar"
+    )
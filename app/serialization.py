@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+from . import metrics
+
+try:
+    import brotli  # opcional: só é usado se o cliente aceitar "br"
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+try:
+    import msgpack  # opcional: application/msgpack
+except ImportError:  # pragma: no cover - depende do ambiente
+    msgpack = None
+
+try:
+    import cbor2  # opcional: application/cbor
+except ImportError:  # pragma: no cover - depende do ambiente
+    cbor2 = None
+
+
+# Abaixo disso comprimir não compensa (cabeçalhos gzip/br + CPU)
+COMPRESS_MIN_BYTES = 1024
+
+
+# -------------------------
+# Modo compacto
+# -------------------------
+def prune_empty(value: Any) -> Any:
+    """
+    Remove recursivamente chaves None e blocos que ficaram vazios
+    (ex: gMono/gEstornoCred sem nenhum valor preenchido).
+    """
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if v is None:
+                continue
+            v = prune_empty(v)
+            if isinstance(v, dict) and not v:
+                continue
+            out[k] = v
+        return out
+    if isinstance(value, list):
+        return [prune_empty(v) for v in value]
+    return value
+
+
+def compact_dump(model: BaseModel) -> Any:
+    """
+    Serializa sem campos None nem campos com valor default.
+    Usa os aliases (ex: qtde), como o response_model do FastAPI.
+    """
+    data = model.model_dump(mode="json", by_alias=True, exclude_none=True, exclude_defaults=True)
+    return prune_empty(data)
+
+
+def compact_json(model: BaseModel) -> bytes:
+    return json.dumps(
+        compact_dump(model),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+# -------------------------
+# Compressão (Accept-Encoding)
+# -------------------------
+def _itens_q(header: str) -> Iterator[Tuple[str, float]]:
+    """
+    (token, q) de um Accept/Accept-Encoding. O q vale em qualquer posição
+    entre os parâmetros (ex: "br;level=5;q=0"); ausente ou inválido -> 1.
+    """
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            nome, _, valor = param.partition("=")
+            if nome.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 1.0
+        yield token.strip().lower(), q
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Escolhe "br" ou "gzip" conforme o Accept-Encoding do cliente (maior q;
+    no empate, br). "*" só vale para as codificações não listadas: q=0
+    explícito recusa mesmo com o curinga ("br;q=0, *" -> gzip).
+    Brotli só se o pacote estiver instalado.
+    """
+    if not accept_encoding:
+        return None
+
+    qs: Dict[str, float] = {token: q for token, q in _itens_q(accept_encoding) if token}
+    curinga = qs.get("*", 0.0)
+
+    escolhida, melhor_q = None, 0.0
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        q = qs.get(encoding, curinga)
+        if q > melhor_q:
+            escolhida, melhor_q = encoding, q
+    return escolhida
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    raise ValueError(f"Codificação não suportada: {encoding}")
+
+
+def compact_response(model: BaseModel, accept_encoding: Optional[str] = None) -> Response:
+    return encoded_response(compact_dump(model), MEDIA_JSON, accept_encoding)
+
+
+# -------------------------
+# Formatos binários (MessagePack / CBOR)
+# -------------------------
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+MEDIA_CBOR = "application/cbor"
+
+MEDIA_ALIASES = {
+    "application/x-msgpack": MEDIA_MSGPACK,
+    "application/vnd.msgpack": MEDIA_MSGPACK,
+}
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _codecs() -> Dict[str, Dict[str, Callable[..., Any]]]:
+    codecs: Dict[str, Dict[str, Callable[..., Any]]] = {
+        MEDIA_JSON: {"dumps": _json_dumps, "loads": json.loads},
+    }
+    if msgpack is not None:
+        codecs[MEDIA_MSGPACK] = {
+            "dumps": lambda data: msgpack.packb(data, use_bin_type=True),
+            "loads": lambda body: msgpack.unpackb(body, raw=False),
+        }
+    if cbor2 is not None:
+        codecs[MEDIA_CBOR] = {"dumps": cbor2.dumps, "loads": cbor2.loads}
+    return codecs
+
+
+CODECS = _codecs()
+BINARY_MEDIA_TYPES = (MEDIA_MSGPACK, MEDIA_CBOR)
+
+
+def media_type_of(content_type: Optional[str]) -> str:
+    media = (content_type or "").split(";", 1)[0].strip().lower()
+    return MEDIA_ALIASES.get(media, media)
+
+
+def _accept_entries(accept: str) -> Iterator[Tuple[str, float]]:
+    for media, q in _itens_q(accept):
+        yield media_type_of(media), q
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Escolhe o formato de resposta pelo Accept (maior q entre os disponíveis).
+    JSON é o default: Accept ausente ou */*.
+    """
+    if not accept:
+        return MEDIA_JSON
+
+    best, best_q = MEDIA_JSON, 0.0
+    for media, q in _accept_entries(accept):
+        # em empate de q, o JSON (já escolhido) tem preferência
+        if media in CODECS and q > best_q:
+            best, best_q = media, q
+    return best
+
+
+def accepts_any(accept: Optional[str]) -> bool:
+    """
+    False quando o Accept só lista formatos que não geramos (ex: só
+    application/cbor sem o cbor2 instalado): a rota responde 406.
+    """
+    if not accept:
+        return True
+    return any(
+        q > 0 and (media in CODECS or media in ("*/*", "application/*")) for media, q in _accept_entries(accept)
+    )
+
+
+def encode_body(data: Any, media_type: str) -> bytes:
+    return CODECS[media_type]["dumps"](data)
+
+
+def decode_body(body: bytes, media_type: str) -> Any:
+    codec = CODECS.get(media_type)
+    if codec is None:
+        raise HTTPException(status_code=415, detail=f"Content-Type não suportado: {media_type}")
+    try:
+        return codec["loads"](body)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Corpo {media_type} inválido: {e}")
+
+
+def encoded_response(data: Any, media_type: str, accept_encoding: Optional[str] = None) -> Response:
+    body = encode_body(data, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def render_response(model: BaseModel, request: Request, compacto: bool = False) -> Response:
+    """
+    Resposta conforme Accept (JSON/MessagePack/CBOR) e o modo compacto.
+    A serialização é feita aqui (e não pelo response_model) para ser medida
+    na etapa "serialize" das métricas; o JSON resultante é o mesmo.
+    """
+    t = time.perf_counter()
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    if media_type == MEDIA_JSON and not compacto:
+        resp = Response(content=model.model_dump_json(by_alias=True), media_type=MEDIA_JSON)
+    else:
+        data = compact_dump(model) if compacto else model.model_dump(mode="json", by_alias=True)
+        # sem compacto, só comprime se o cliente pediu formato binário e aceita gzip/br
+        resp = encoded_response(data, media_type, request.headers.get("accept-encoding"))
+    metrics.lap("serialize", t)
+    return resp
+
+
+class BinaryBodyRequest(Request):
+    """
+    Request cujo json() decodifica o corpo MessagePack/CBOR original.
+    O FastAPI só chama json() para content-type JSON, por isso a rota troca o header.
+    """
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = decode_body(await self.body(), self.scope["body_media_type"])
+        return self._json
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Aceita o corpo da requisição em MessagePack ou CBOR (Content-Type),
+    validando contra os mesmos schemas pydantic das rotas JSON. Formato sem
+    codec instalado: 415 no Content-Type, 406 se for o único no Accept.
+    """
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+        # 406 só nas rotas com response_model (as que respondem via render_response);
+        # /metrics, /health etc. ignoram o Accept
+        negotiated = self.response_model is not None
+
+        async def handler(request: Request) -> Response:
+            if negotiated and not accepts_any(request.headers.get("accept")):
+                raise HTTPException(status_code=406, detail=f"Accept não suportado: {request.headers.get('accept')}")
+            media_type = media_type_of(request.headers.get("content-type"))
+            if media_type in BINARY_MEDIA_TYPES:
+                if media_type not in CODECS:
+                    raise HTTPException(status_code=415, detail=f"Content-Type não suportado: {media_type}")
+                scope = dict(request.scope)
+                scope["headers"] = [
+                    (k, v) for k, v in request.scope["headers"] if k != b"content-type"
+                ] + [(b"content-type", MEDIA_JSON.encode())]
+                scope["body_media_type"] = media_type
+                request = BinaryBodyRequest(scope, request.receive)
+            return await original_handler(request)
+
+        return handler
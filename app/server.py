@@ -0,0 +1,134 @@
+"""
+Servidor pre-fork: carrega e indexa as tabelas uma vez no processo pai e faz
+fork dos workers, que herdam o heap por copy-on-write.
+
+    python -m app.server [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Com `uvicorn --workers N` cada worker é um processo novo (spawn) que reimporta
+app.main e relê todos os CSVs: N cargas e N cópias do heap. Aqui:
+
+  1. o pai importa app.main (CClastribAgent + load_sources), materializa as
+     tabelas sob demanda e abre o socket;
+  2. gc.collect() + gc.freeze(): os objetos já carregados vão para a geração
+     permanente e o GC dos workers não encosta neles (sem escrever nos cabeçalhos
+     das páginas compartilhadas);
+  3. fork de N workers, todos aceitando no mesmo socket;
+  4. o pai só supervisiona: recria worker que morrer e repassa SIGTERM/SIGINT.
+
+Só funciona onde há os.fork (Linux/macOS). Workers: --workers ou WEB_CONCURRENCY.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import uvicorn
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, app, log_level: str) -> None:
+    # sinais voltam ao padrão; o uvicorn instala os dele dentro de run()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, app, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, app, log_level)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            # nunca volta para o loop do pai
+            os._exit(code)
+    return pid
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info") -> None:
+    sock = bind_socket(host, port)
+
+    t0 = time.perf_counter()
+    from .main import agent, app  # carrega e indexa DataSources aqui, uma vez
+
+    # tabelas sob demanda também: senão cada worker leria a sua cópia no primeiro uso
+    agent.materializar_fontes()
+    gc.collect()
+    gc.freeze()
+    print(
+        f"🚀 Tabelas carregadas em {time.perf_counter() - t0:.2f}s; "
+        f"{workers} worker(s) em http://{host}:{port} (pid pai {os.getpid()})",
+        file=sys.stderr,
+    )
+
+    children: Dict[int, int] = {}  # pid -> índice
+    for i in range(workers):
+        children[_spawn(sock, app, log_level)] = i
+
+    encerrando = False
+
+    def parar(signum, frame) -> None:
+        nonlocal encerrando
+        encerrando = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, parar)
+    signal.signal(signal.SIGINT, parar)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        i = children.pop(pid, None)
+        if i is None or encerrando:
+            continue
+        print(f"⚠️ Worker {pid} saiu (status {status}); recriando", file=sys.stderr)
+        children[_spawn(sock, app, log_level)] = i
+
+    sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.server", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        print("❌ Pre-fork exige os.fork; use uvicorn app.main:app", file=sys.stderr)
+        sys.exit(1)
+    serve(args.host, args.port, max(1, args.workers), args.log_level)
+
+
+if __name__ == "__main__":
+    main()
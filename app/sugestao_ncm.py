@@ -0,0 +1,229 @@
+"""
+Sugestão de NCM pela descrição do item (deitem), sem rede e sem embeddings.
+
+TF-IDF de n-gramas de caracteres (3 e 4, dentro das palavras) sobre a
+descrição de cada NCM de 8 dígitos da Tabela NCM (+ ncm_master), com a
+descrição dos níveis acima entrando com peso menor. Vetores normalizados
+(L2): o score é o cosseno entre o item e o NCM.
+
+A matriz dos NCMs fica esparsa por coluna (n-grama -> NCMs e pesos). Um lote
+inteiro vira uma matriz esparsa de consultas e o produto consultas x NCMs sai
+de uma operação vetorizada (np.bincount sobre os pares expandidos), em blocos
+de linhas para limitar a memória.
+
+Divergência: a descrição aponta com confiança para outros NCMs, a posição
+(4 dígitos) do declarado não aparece entre os melhores candidatos e o
+declarado fica bem abaixo do melhor. Descrições de item raramente trazem o
+detalhe que separa subitens da mesma posição; isso não conta como divergência.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter as _Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .rules import norm_ncm, normalize_text
+
+try:
+    import numpy as np  # opcional
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+if TYPE_CHECKING:
+    from .records import NcmOficialRow, NcmRow
+
+NGRAMAS = (3, 4)
+PESO_CONTEXTO = 0.5
+# n-gramas presentes em mais que esta fração dos NCMs são descartados (quase não discriminam
+# e são os que mais custam no produto esparso)
+MAX_DF = 0.10
+# linhas do lote por bloco do produto (bloco x NCMs em float32)
+BLOCO = 256
+TOP_K = 3
+# divergência: melhor candidato com cosseno >= CONFIANCA_MIN, posição do declarado fora dos
+# CONFERE_K melhores e declarado abaixo de RAZAO x melhor
+CONFIANCA_MIN = 0.3
+CONFERE_K = 10
+RAZAO = 0.6
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def ngramas(texto: str) -> _Counter:
+    out: _Counter = _Counter()
+    for w in _PALAVRA.findall(normalize_text(texto)):
+        w = f" {w} "
+        for n in NGRAMAS:
+            for i in range(len(w) - n + 1):
+                out[w[i:i + n]] += 1
+    return out
+
+
+@dataclass
+class Sugestao:
+    candidatos: List[Tuple[str, float]]          # (ncm, cosseno), melhor primeiro
+    similaridade_declarado: Optional[float]      # None: NCM declarado fora do índice
+    divergente: bool
+
+
+@dataclass
+class SugestorNcm:
+    codigos: List[str] = field(default_factory=list)
+    descricoes: List[str] = field(default_factory=list)
+    vocab: Dict[str, int] = field(default_factory=dict)
+    idf: Optional["np.ndarray"] = None
+    # CSC: coluna (n-grama) f -> docs[ptr[f]:ptr[f+1]], pesos[ptr[f]:ptr[f+1]]
+    ptr: Optional["np.ndarray"] = None
+    docs: Optional["np.ndarray"] = None
+    pesos: Optional["np.ndarray"] = None
+    _pos: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, oficial: Iterable["NcmOficialRow"], master: Iterable["NcmRow"] = ()) -> Optional["SugestorNcm"]:
+        if np is None:
+            return None
+        desc: Dict[str, str] = {}
+        for r in oficial:
+            if r.ncm:
+                desc[r.ncm] = r.descricao
+        extra: Dict[str, str] = {}
+        for r in master:
+            if len(r.ncm) == 8 and r.descricao and r.descricao != desc.get(r.ncm):
+                extra[r.ncm] = r.descricao
+
+        s = cls()
+        todos: Dict[str, int] = {}
+
+        def vetor(texto: str) -> Tuple["np.ndarray", "np.ndarray"]:
+            c = ngramas(texto)
+            ids = np.fromiter((todos.setdefault(g, len(todos)) for g in c), dtype=np.int64, count=len(c))
+            return ids, np.fromiter(c.values(), dtype=np.float32, count=len(c))
+
+        # níveis de cima (2 a 7 dígitos) se repetem em centenas de NCMs: vetoriza cada um uma vez
+        niveis = {c: vetor(d) for c, d in desc.items() if len(c) < 8}
+        partes_d, partes_f, partes_v = [], [], []
+        for codigo in sorted(c for c in set(desc) | set(extra) if len(c) == 8):
+            d = len(s.codigos)
+            s.codigos.append(codigo)
+            s.descricoes.append((desc.get(codigo) or extra.get(codigo, "")).lstrip("- ").strip())
+            ids, cont = vetor(f"{desc.get(codigo, '')} {extra.get(codigo, '')}")
+            partes_f.append(ids)
+            partes_v.append(cont)
+            partes_d.append(np.full(len(ids), d, dtype=np.int64))
+            for n in range(2, 8):
+                nivel = niveis.get(codigo[:n])
+                if nivel is not None:
+                    partes_f.append(nivel[0])
+                    partes_v.append(nivel[1] * PESO_CONTEXTO)
+                    partes_d.append(np.full(len(nivel[0]), d, dtype=np.int64))
+
+        # soma (doc, n-grama) repetidos: próprio + contexto
+        n_docs, n_grams = len(s.codigos), len(todos)
+        chave, inv = np.unique(np.concatenate(partes_d) * n_grams + np.concatenate(partes_f), return_inverse=True)
+        tf = np.bincount(inv, weights=np.concatenate(partes_v)).astype(np.float32)
+        d_arr, g_arr = chave // n_grams, chave % n_grams
+
+        # corta n-gramas frequentes demais e renumera o vocabulário
+        df = np.bincount(g_arr, minlength=n_grams)
+        manter = df <= MAX_DF * n_docs
+        novo_id = np.cumsum(manter) - 1
+        nomes = np.empty(n_grams, dtype=object)
+        nomes[list(todos.values())] = list(todos.keys())
+        s.vocab = {g: int(i) for g, i in zip(nomes[manter], novo_id[manter])}
+        s.idf = (np.log((1 + n_docs) / (1 + df[manter])) + 1).astype(np.float32)
+
+        sel = manter[g_arr]
+        d_arr, f_arr, tf = d_arr[sel].astype(np.int32), novo_id[g_arr[sel]], tf[sel]
+        # tf sublinear (contexto com peso < 1 fica como está) x idf, normalizado por NCM
+        v_arr = np.where(tf >= 1, 1 + np.log(np.maximum(tf, 1)), tf).astype(np.float32) * s.idf[f_arr]
+        normas = np.sqrt(np.bincount(d_arr, weights=v_arr * v_arr, minlength=n_docs)).astype(np.float32)
+        v_arr /= np.where(normas > 0, normas, 1)[d_arr]
+        ordem = np.argsort(f_arr, kind="stable")
+        s.docs, s.pesos = d_arr[ordem], v_arr[ordem]
+        s.ptr = np.concatenate(([0], np.cumsum(np.bincount(f_arr, minlength=len(s.vocab))))).astype(np.int64)
+        s._pos = {c: i for i, c in enumerate(s.codigos)}
+        return s
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def _vetor(self, texto: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        feats, vals = [], []
+        for g, c in ngramas(texto).items():
+            f = self.vocab.get(g)
+            if f is not None:
+                feats.append(f)
+                vals.append(1 + math.log(c))
+        f_arr = np.asarray(feats, dtype=np.int64)
+        v = np.asarray(vals, dtype=np.float32) * self.idf[f_arr]
+        norma = float(np.sqrt((v * v).sum()))
+        return f_arr, (v / norma if norma else v)
+
+    def _produto(self, vetores: Sequence[Tuple["np.ndarray", "np.ndarray"]]) -> "np.ndarray":
+        """
+        Consultas (esparsas) x NCMs: cada par (linha, n-grama) é expandido nos NCMs
+        da coluna do n-grama e somado por (linha, NCM) num único bincount.
+        """
+        n_docs = len(self.codigos)
+        linhas = np.repeat(np.arange(len(vetores)), [len(f) for f, _ in vetores])
+        feats = np.concatenate([f for f, _ in vetores])
+        qv = np.concatenate([v for _, v in vetores])
+        ini_col = self.ptr[feats]
+        tam = self.ptr[feats + 1] - ini_col
+        total = int(tam.sum())
+        # posição de cada elemento expandido dentro de docs/pesos
+        desloc = np.repeat(ini_col - (np.cumsum(tam) - tam), tam) + np.arange(total)
+        chave = np.repeat(linhas, tam) * n_docs + self.docs[desloc]
+        peso = np.repeat(qv, tam) * self.pesos[desloc]
+        return np.bincount(chave, weights=peso, minlength=len(vetores) * n_docs).reshape(len(vetores), n_docs)
+
+    def blocos(self, textos: Sequence[str]) -> Iterator[Tuple[int, "np.ndarray"]]:
+        # (início, matriz bloco x NCMs de cossenos), BLOCO linhas por vez
+        for ini in range(0, len(textos), BLOCO):
+            yield ini, self._produto([self._vetor(t or "") for t in textos[ini:ini + BLOCO]])
+
+    def scores(self, textos: Sequence[str]) -> "np.ndarray":
+        """
+        Matriz (len(textos) x NCMs) de cossenos. Para lotes grandes prefira `blocos`.
+        """
+        if not textos:
+            return np.zeros((0, len(self.codigos)))
+        return np.vstack([m for _, m in self.blocos(textos)])
+
+    def sugerir(self, itens: Sequence[Tuple[str, str]], k: int = TOP_K) -> List[Optional[Sugestao]]:
+        """
+        Para cada (descrição, NCM declarado): candidatos e se o declarado diverge.
+        Descrição vazia -> None.
+        """
+        validos = [i for i, (texto, _) in enumerate(itens) if (texto or "").strip()]
+        out: List[Optional[Sugestao]] = [None] * len(itens)
+        if not validos or not self.codigos:
+            return out
+        n = min(max(k, CONFERE_K), len(self.codigos))
+        for ini, matriz in self.blocos([itens[i][0] for i in validos]):
+            top = np.argpartition(-matriz, n - 1, axis=1)[:, :n]
+            for linha in range(matriz.shape[0]):
+                i = validos[ini + linha]
+                row = matriz[linha]
+                ordem = [d for d in top[linha][np.argsort(-row[top[linha]], kind="stable")] if row[d] > 0]
+                candidatos = [(self.codigos[d], round(float(row[d]), 4)) for d in ordem[:k]]
+                ncm_declarado = norm_ncm(itens[i][1])[:8]
+                pos = self._pos.get(ncm_declarado)
+                declarado = round(float(row[pos]), 4) if pos is not None else None
+                melhor = candidatos[0][1] if candidatos else 0.0
+                divergente = (
+                    melhor >= CONFIANCA_MIN
+                    and all(self.codigos[d][:4] != ncm_declarado[:4] for d in ordem)
+                    and (declarado is None or declarado < RAZAO * melhor)
+                )
+                out[i] = Sugestao(candidatos=candidatos, similaridade_declarado=declarado, divergente=divergente)
+        return out
+
+    def descricao(self, ncm: str) -> str:
+        pos = self._pos.get(ncm)
+        return self.descricoes[pos] if pos is not None else ""
@@ -0,0 +1,271 @@
+"""
+Trilha de auditoria: toda decisão de classificação (entrada, versão dos dados,
+cClassTrib, alíquotas, fundamentos) gravada em disco sem custo na requisição.
+
+  - handle/handle_lote só enfileiram (deque.append, atômico no CPython: sem lock
+    no caminho da requisição); montar o registro e serializar fica com o gravador;
+  - uma thread por processo drena a fila em lotes (AUDIT_LOTE) a cada
+    AUDIT_FLUSH_S ou quando o lote enche;
+  - destino: diretório com NDJSON gzip rotativo (por tamanho e por dia, um
+    arquivo por processo) ou arquivo .sqlite/.db (tabela decisoes);
+  - memória limitada: com AUDIT_FILA_MAX decisões pendentes (disco atrasado),
+    as novas são descartadas e contadas em cclastrib_trilha_total{result="descartada"}.
+
+Decisões do warm-up não entram (não são operações reais).
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from .schemas import ClassifyRequest, ClassifyResponse
+
+
+# -------------------------
+# Configuração (variáveis de ambiente)
+# -------------------------
+# AUDIT_LOG=data/trilha         diretório (NDJSON .gz rotativo) ou arquivo .sqlite/.db; vazio = desligada
+# AUDIT_FILA_MAX=100000         decisões pendentes na memória; acima disso descarta (e conta)
+# AUDIT_LOTE=1000               decisões por escrita
+# AUDIT_FLUSH_S=1               intervalo máximo entre escritas
+# AUDIT_ROTACAO_MB=64           tamanho (antes da compressão) de cada arquivo NDJSON
+@dataclass
+class TrilhaConfig:
+    destino: str = ""
+    fila_max: int = 100_000
+    lote: int = 1000
+    flush_s: float = 1.0
+    rotacao_mb: float = 64.0
+
+    @classmethod
+    def from_env(cls) -> "TrilhaConfig":
+        return cls(
+            destino=os.getenv("AUDIT_LOG", "").strip(),
+            fila_max=max(1, int(os.getenv("AUDIT_FILA_MAX", "100000") or 100_000)),
+            lote=max(1, int(os.getenv("AUDIT_LOTE", "1000") or 1000)),
+            flush_s=float(os.getenv("AUDIT_FLUSH_S", "1") or 1),
+            rotacao_mb=float(os.getenv("AUDIT_ROTACAO_MB", "64") or 64),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.destino)
+
+    @property
+    def sqlite(self) -> bool:
+        return self.destino.lower().endswith((".sqlite", ".sqlite3", ".db"))
+
+
+# -------------------------
+# Gravadores
+# -------------------------
+class GravadorNdjson:
+    """
+    decisoes-<data/hora UTC>-<pid>-<seq>.ndjson.gz no diretório. Cada lote é
+    seguido de um flush do gzip: o que já foi gravado continua legível mesmo
+    se o processo morrer antes de fechar o arquivo.
+    """
+    def __init__(self, diretorio: str, rotacao_bytes: int):
+        self.diretorio = diretorio
+        self.rotacao_bytes = rotacao_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._arq: Optional[gzip.GzipFile] = None
+        self._bytes = 0
+        self._dia = ""
+        self._seq = 0
+
+    def _rotacionar(self, agora: datetime) -> None:
+        self.fechar()
+        self._seq += 1
+        nome = f"decisoes-{agora:%Y%m%dT%H%M%S}-{os.getpid()}-{self._seq}.ndjson.gz"
+        self._arq = gzip.open(os.path.join(self.diretorio, nome), "wb", compresslevel=6)
+        self._bytes = 0
+        self._dia = agora.strftime("%Y%m%d")
+
+    def gravar(self, registros: List[Dict[str, Any]]) -> None:
+        agora = datetime.now(timezone.utc)
+        if self._arq is None or self._bytes >= self.rotacao_bytes or agora.strftime("%Y%m%d") != self._dia:
+            self._rotacionar(agora)
+        dados = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in registros).encode("utf-8")
+        self._arq.write(dados)
+        self._arq.flush()
+        self._bytes += len(dados)
+
+    def fechar(self) -> None:
+        if self._arq is not None:
+            self._arq.close()
+            self._arq = None
+
+
+class GravadorSqlite:
+    """
+    Tabela decisoes (ts, versao_dados, cclastrib, registro JSON); um INSERT em
+    lote por transação. WAL: os workers gravam no mesmo arquivo.
+    """
+    def __init__(self, path: str):
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        # só a thread do gravador usa a conexão
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS decisoes ("
+            " id INTEGER PRIMARY KEY, ts TEXT NOT NULL, versao_dados TEXT NOT NULL,"
+            " cclastrib TEXT, registro TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS decisoes_ts ON decisoes (ts)")
+
+    def gravar(self, registros: List[Dict[str, Any]]) -> None:
+        rows = [
+            (r["ts"], r["versao_dados"], r["cclastrib"], json.dumps(r, ensure_ascii=False, default=str))
+            for r in registros
+        ]
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT INTO decisoes (ts, versao_dados, cclastrib, registro) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def fechar(self) -> None:
+        self._conn.close()
+
+
+# -------------------------
+# Trilha
+# -------------------------
+# (epoch, versão dos dados, origem, requisição, resposta)
+_Decisao = Tuple[float, str, str, "ClassifyRequest", "ClassifyResponse"]
+
+
+def registro(decisao: _Decisao) -> Dict[str, Any]:
+    ts, versao, origem, req, resp = decisao
+    fundamentos = [
+        *resp.cclastrib.fundamento, *resp.ibs.fundamento, *resp.cbs.fundamento, *resp.fundamentos_gerais
+    ]
+    return {
+        "ts": datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds"),
+        "versao_dados": versao,
+        "origem": origem,
+        "entrada": req.model_dump(mode="json", exclude_none=True),
+        "cclastrib": resp.cclastrib.codigo,
+        "cst_ibs_cbs": resp.cst_ibs_cbs,
+        "cclass_trib": resp.cclass_trib,
+        "aliquota_ibs": resp.ibs.aliquota,
+        "aliquota_cbs": resp.cbs.aliquota,
+        "confianca": resp.confianca,
+        "fundamentos": [f.model_dump(exclude_none=True) for f in fundamentos],
+        "alertas": resp.alertas,
+        "pendencias": resp.pendencias,
+    }
+
+
+class TrilhaAuditoria:
+    def __init__(self, config: TrilhaConfig, versao_dados: str = ""):
+        self.config = config
+        # atualizada pelo agente no /reload; cada decisão guarda a versão do momento
+        self.versao_dados = versao_dados
+        self._fila: Deque[_Decisao] = deque()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()     # só para iniciar/parar a thread
+        self._thread: Optional[threading.Thread] = None
+        self.gravadas = 0
+        self.descartadas = 0
+        if hasattr(os, "register_at_fork"):
+            # thread não atravessa fork (app.server): cada worker começa com fila e gravador próprios
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    @classmethod
+    def from_env(cls, versao_dados: str = "") -> Optional["TrilhaAuditoria"]:
+        config = TrilhaConfig.from_env()
+        return cls(config, versao_dados) if config.enabled else None
+
+    def _apos_fork(self) -> None:
+        self._fila = deque()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.gravadas = self.descartadas = 0
+
+    # -------------------------
+    # Caminho da requisição
+    # -------------------------
+    def registrar(self, req: "ClassifyRequest", resp: "ClassifyResponse", origem: str) -> None:
+        if self._thread is None:
+            self.iniciar()
+        fila = self._fila
+        if len(fila) >= self.config.fila_max:
+            self.descartadas += 1
+            metrics.TRILHA_TOTAL.inc("descartada")
+            return
+        fila.append((time.time(), self.versao_dados, origem, req, resp))
+        if len(fila) == self.config.lote:
+            self._acordar.set()
+
+    # -------------------------
+    # Gravador (thread)
+    # -------------------------
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, name="trilha-auditoria", daemon=True)
+            self._thread.start()
+
+    def parar(self, timeout: float = 10.0) -> None:
+        """
+        Grava o que estiver na fila e encerra a thread (shutdown do worker).
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._parar.set()
+        self._acordar.set()
+        thread.join(timeout)
+
+    def _gravador(self):
+        if self.config.sqlite:
+            return GravadorSqlite(self.config.destino)
+        return GravadorNdjson(self.config.destino, int(self.config.rotacao_mb * 1024 * 1024))
+
+    def _loop(self) -> None:
+        gravador = self._gravador()
+        try:
+            while not self._parar.is_set():
+                self._acordar.wait(self.config.flush_s)
+                self._acordar.clear()
+                self._drenar(gravador)
+            self._drenar(gravador)
+        finally:
+            gravador.fechar()
+
+    def _drenar(self, gravador) -> None:
+        fila = self._fila
+        while fila:
+            lote = []
+            while fila and len(lote) < self.config.lote:
+                lote.append(fila.popleft())
+            try:
+                gravador.gravar([registro(d) for d in lote])
+            except Exception:
+                # disco cheio, SQLite travado...: o lote se perde, mas fica contado
+                self.descartadas += len(lote)
+                metrics.TRILHA_TOTAL.inc("erro", amount=len(lote))
+                continue
+            self.gravadas += len(lote)
+            metrics.TRILHA_TOTAL.inc("gravada", amount=len(lote))
@@ -0,0 +1,257 @@
+"""
+Warm-up do cache na subida (e após /reload), antes de /health/ready responder 200.
+
+Fontes, nesta ordem:
+  - WARMUP_KEYLOG: requisições reais gravadas (NDJSON, uma por chave de cache nova);
+    as que mais se repetem entre execuções vêm primeiro
+  - WARMUP_PROFILES: CSV com os perfis (NCM, CFOP, UF, regime) mais usados
+
+As requisições passam pelo próprio CClastribAgent.handle em paralelo até acabar
+a lista ou o orçamento de tempo; o que não couber fica para o tráfego real.
+"""
+from __future__ import annotations
+
+import csv
+import os
+import threading
+import time
+from collections import Counter as _Counter
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .schemas import ClassifyRequest
+
+if TYPE_CHECKING:
+    from .agent import CClastribAgent
+
+
+# -------------------------
+# Configuração (variáveis de ambiente)
+# -------------------------
+# WARMUP_KEYLOG=data/warmup_keys.ndjson   requisições gravadas (uma por chave de cache), reexecutadas no warm-up
+# WARMUP_RECORD=1                         grava no WARMUP_KEYLOG cada chave nova (miss) do /classificar
+# WARMUP_PROFILES=data/warmup_perfis.csv  perfis ncm;cfop;uf_emitente;uf_destinatario;regime;cst_icms[;ano_emissao]
+# WARMUP_BUDGET_S=30                      tempo máximo do warm-up (o que sobrar fica para o tráfego real)
+# WARMUP_WORKERS=4                        threads classificando em paralelo
+# WARMUP_MAX=5000                         máximo de requisições reexecutadas (as mais frequentes primeiro)
+@dataclass
+class WarmupConfig:
+    keylog: str = ""
+    record: bool = False
+    profiles: str = ""
+    budget_s: float = 30.0
+    workers: int = 4
+    max_requests: int = 5000
+
+    @classmethod
+    def from_env(cls) -> "WarmupConfig":
+        return cls(
+            keylog=os.getenv("WARMUP_KEYLOG", "").strip(),
+            record=os.getenv("WARMUP_RECORD", "").strip().lower() in ("1", "true", "s", "sim"),
+            profiles=os.getenv("WARMUP_PROFILES", "").strip(),
+            budget_s=float(os.getenv("WARMUP_BUDGET_S", "30") or 30),
+            workers=max(1, int(os.getenv("WARMUP_WORKERS", "4") or 4)),
+            max_requests=int(os.getenv("WARMUP_MAX", "5000") or 5000),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keylog or self.profiles)
+
+
+# threads do warm-up não gravam no keylog (senão o replay vira "tráfego") nem na trilha de auditoria
+_local = threading.local()
+
+
+def em_warmup() -> bool:
+    return getattr(_local, "warmup", False)
+
+
+# -------------------------
+# Gravação das chaves (tráfego real -> WARMUP_KEYLOG)
+# -------------------------
+class KeyLogRecorder:
+    """
+    Acrescenta ao arquivo a requisição de cada chave de cache nova neste processo.
+    Repetições entre processos/deploys ficam no arquivo e viram peso (frequência)
+    na hora de ordenar o warm-up.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._seen: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def record(self, cache_key: str, req: ClassifyRequest) -> None:
+        if cache_key in self._seen or em_warmup():
+            return
+        line = req.model_dump_json(exclude_none=True) + "\n"
+        with self._lock:
+            if cache_key in self._seen:
+                return
+            self._seen.add(cache_key)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+# -------------------------
+# Fontes do warm-up
+# -------------------------
+def read_keylog(path: str) -> List[ClassifyRequest]:
+    """
+    Requisições distintas do log, das mais frequentes para as menos frequentes.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    contagem: _Counter = _Counter()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                contagem[line] += 1
+    out = []
+    for line, _ in contagem.most_common():
+        try:
+            out.append(ClassifyRequest.model_validate_json(line))
+        except ValueError:
+            continue  # linha truncada (processo morto no meio da escrita)
+    return out
+
+
+def read_profiles(path: str, ano: Optional[int] = None) -> List[ClassifyRequest]:
+    if not path or not os.path.exists(path):
+        return []
+    ano = ano or date.today().year
+    out = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for r in csv.DictReader(f, delimiter=";"):
+            r = {(k or "").strip().lower(): (v or "").strip() for k, v in r.items()}
+            if not r.get("ncm"):
+                continue
+            out.append(ClassifyRequest(
+                ano_emissao=int(r.get("ano_emissao") or ano),
+                regime_fiscal_emitente=r.get("regime") or r.get("regime_fiscal_emitente") or "SN",
+                cfop=r.get("cfop") or "5102",
+                uf_emitente=r.get("uf_emitente") or r.get("uf") or "SP",
+                uf_destinatario=r.get("uf_destinatario") or r.get("uf_emitente") or r.get("uf") or "SP",
+                cst_icms=r.get("cst_icms") or "000",
+                ncm=r["ncm"],
+            ))
+    return out
+
+
+def warmup_requests(config: WarmupConfig) -> List[ClassifyRequest]:
+    # tráfego gravado primeiro (é o que o ERP vai pedir de novo); perfis completam
+    out: List[ClassifyRequest] = []
+    vistos: Set[str] = set()
+    for req in read_keylog(config.keylog) + read_profiles(config.profiles):
+        k = req.model_dump_json()
+        if k not in vistos:
+            vistos.add(k)
+            out.append(req)
+    return out[: config.max_requests]
+
+
+# -------------------------
+# Execução e prontidão
+# -------------------------
+@dataclass
+class WarmupReport:
+    status: str = "pendente"       # pendente | aquecendo | pronto
+    total: int = 0
+    executadas: int = 0
+    erros: int = 0
+    puladas: int = 0               # não couberam no orçamento de tempo
+    segundos: float = 0.0
+    iniciado_em: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["segundos"] = round(self.segundos, 3)
+        return d
+
+
+def run_warmup(
+    agent: "CClastribAgent",
+    requests: Iterable[ClassifyRequest],
+    budget_s: float,
+    workers: int,
+    report: Optional[WarmupReport] = None,
+) -> WarmupReport:
+    """
+    Classifica as requisições em `workers` threads (o cache é do processo) até
+    acabar a lista ou o orçamento de tempo. Nenhuma requisição nova começa
+    depois do prazo.
+    """
+    report = report or WarmupReport()
+    reqs = list(requests)
+    report.total = len(reqs)
+    report.status = "aquecendo"
+    report.iniciado_em = time.time()
+    t0 = time.monotonic()
+    deadline = t0 + budget_s
+    it: Iterator[ClassifyRequest] = iter(reqs)
+    lock = threading.Lock()
+
+    def worker() -> None:
+        _local.warmup = True
+        while time.monotonic() < deadline:
+            with lock:
+                req = next(it, None)
+            if req is None:
+                return
+            try:
+                agent.handle(req)
+                ok = True
+            except Exception:
+                ok = False
+            with lock:
+                report.executadas += 1
+                if not ok:
+                    report.erros += 1
+
+    threads = [threading.Thread(target=worker, name=f"warmup-{i}", daemon=True) for i in range(max(1, workers))]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    report.puladas = report.total - report.executadas
+    report.segundos = time.monotonic() - t0
+    report.status = "pronto"
+    return report
+
+
+@dataclass
+class Readiness:
+    """
+    Liveness (/health) responde sempre; readiness (/health/ready) só depois do warm-up.
+    """
+    config: WarmupConfig = field(default_factory=WarmupConfig.from_env)
+    report: WarmupReport = field(default_factory=WarmupReport)
+    _thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.report.status == "pronto"
+
+    def start(self, agent: "CClastribAgent", background: bool = True) -> None:
+        """
+        (Re)inicia o warm-up. Sem WARMUP_KEYLOG/WARMUP_PROFILES fica pronto na hora.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            # reload durante um warm-up: o em andamento termina contra as novas fontes
+            return
+        report = self.report = WarmupReport()
+        if not self.config.enabled:
+            report.status = "pronto"
+            return
+
+        def target() -> None:
+            run_warmup(agent, warmup_requests(self.config), self.config.budget_s, self.config.workers, report)
+
+        if background:
+            self._thread = threading.Thread(target=target, name="warmup", daemon=True)
+            self._thread.start()
+        else:
+            target()
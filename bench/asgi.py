@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Optional[Dict[str, str]] = None,
+    query: str = "",
+) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Chama a app ASGI em processo, sem socket nem cliente HTTP.
+    Retorna (status, headers, corpo).
+    """
+    raw_headers: List[Tuple[bytes, bytes]] = [
+        (k.lower().encode("latin-1"), v.encode("latin-1"))
+        for k, v in (headers or {}).items()
+    ]
+    raw_headers.append((b"content-length", str(len(body)).encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method.upper(),
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    status = 0
+    resp_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for k, v in message.get("headers", []):
+                resp_headers[k.decode("latin-1")] = v.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, resp_headers, b"".join(chunks)
@@ -0,0 +1,103 @@
+"""
+JSON x MessagePack x CBOR em /classificar-lote.
+
+    python -m bench.bench_codecs --itens 1000 --repeat 5
+
+1) Round-trip: para cada formato, envia o ClassifyLoteRequest codificado pela app ASGI
+   (em processo), decodifica a resposta e valida contra ClassifyLoteResponse; o
+   resultado tem de ser idêntico ao da resposta JSON.
+2) Throughput: encode/decode do request e da response em cada formato.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from typing import Any, Dict
+
+from app.schemas import ClassifyLoteRequest, ClassifyLoteResponse
+from app.serialization import CODECS, MEDIA_JSON, decode_body, encode_body
+
+from .asgi import asgi_request
+from .timing import best_of, quiet
+from .workload import Workload
+
+
+def round_trip(app, lote: Dict[str, Any]) -> Dict[str, bool]:
+    """
+    Envia o mesmo lote em cada formato e compara com a resposta JSON.
+    """
+    async def call(media_type: str) -> ClassifyLoteResponse:
+        status, headers, body = await asgi_request(
+            app,
+            "POST",
+            "/classificar-lote",
+            body=encode_body(lote, media_type),
+            headers={"content-type": media_type, "accept": media_type},
+        )
+        assert status == 200, (media_type, status, body[:300])
+        assert headers["content-type"].startswith(media_type), headers["content-type"]
+        return ClassifyLoteResponse.model_validate(decode_body(body, media_type))
+
+    async def all_formats() -> Dict[str, bool]:
+        ref = await call(MEDIA_JSON)
+        return {media_type: (await call(media_type)) == ref for media_type in CODECS}
+
+    return asyncio.run(all_formats())
+
+
+def throughput(lote: Dict[str, Any], resp: ClassifyLoteResponse, repeat: int) -> Dict[str, Any]:
+    resp_data = resp.model_dump(mode="json", by_alias=True)
+    n = len(lote["itens"])
+
+    out: Dict[str, Any] = {}
+    for media_type in CODECS:
+        req_body = encode_body(lote, media_type)
+        resp_body = encode_body(resp_data, media_type)
+        t = {
+            "request_encode": best_of(lambda: encode_body(lote, media_type), repeat),
+            "request_decode": best_of(lambda: decode_body(req_body, media_type), repeat),
+            "response_encode": best_of(lambda: encode_body(resp_data, media_type), repeat),
+            "response_decode": best_of(lambda: decode_body(resp_body, media_type), repeat),
+        }
+        out[media_type] = {
+            "request_bytes": len(req_body),
+            "response_bytes": len(resp_body),
+            **{f"{k}_ms": round(v * 1000, 3) for k, v in t.items()},
+            "response_itens_por_s": round(n / (t["response_encode"] + t["response_decode"])),
+        }
+    return out
+
+
+def run(n_itens: int, repeat: int) -> Dict[str, Any]:
+    wl = Workload()
+    lote = wl.lote(n_itens, ano=2027)
+
+    with quiet():
+        from app.main import agent, app
+
+        roundtrip = round_trip(app, lote)
+        resp = agent.handle_lote(ClassifyLoteRequest(**lote))
+
+    return {
+        "itens": n_itens,
+        "formatos": list(CODECS),
+        "round_trip_ok": roundtrip,
+        "throughput": throughput(lote, resp, repeat),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--itens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = run(args.itens, args.repeat)
+    print(json.dumps(result, indent=2))
+    if not all(result["round_trip_ok"].values()):
+        raise SystemExit("round-trip divergente")
+
+
+if __name__ == "__main__":
+    main()
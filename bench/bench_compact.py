@@ -0,0 +1,81 @@
+"""
+Compara o payload atual de /classificar-lote com o modo compacto.
+
+    python -m bench.bench_compact --itens 1000 --repeat 5
+
+Mede bytes no fio e tempo de serializar (servidor) + descomprimir/parsear (cliente).
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+from typing import Any, Callable, Dict
+
+from app.agent import CClastribAgent
+from app.schemas import ClassifyLoteRequest
+from app.serialization import brotli, compact_json, compress
+
+from .timing import best_of, quiet
+from .workload import DATA_ANEXOS_DIR, Workload
+
+
+def default_json(model) -> bytes:
+    # mesmo formato que o FastAPI devolve hoje para response_model
+    return json.dumps(
+        model.model_dump(mode="json", by_alias=True),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def run(n_itens: int, repeat: int) -> Dict[str, Any]:
+    wl = Workload()
+    with quiet():
+        agent = CClastribAgent(data_anexos_dir=DATA_ANEXOS_DIR)
+        resp = agent.handle_lote(ClassifyLoteRequest(**wl.lote(n_itens, ano=2027)))
+
+    variantes: Dict[str, Dict[str, Callable[..., Any]]] = {
+        "default": {"encode": lambda: default_json(resp), "decode": json.loads},
+        "compact": {"encode": lambda: compact_json(resp), "decode": json.loads},
+        "compact+gzip": {
+            "encode": lambda: compress(compact_json(resp), "gzip"),
+            "decode": lambda b: json.loads(gzip.decompress(b)),
+        },
+    }
+    if brotli is not None:
+        variantes["compact+br"] = {
+            "encode": lambda: compress(compact_json(resp), "br"),
+            "decode": lambda b: json.loads(brotli.decompress(b)),
+        }
+
+    resultados: Dict[str, Any] = {}
+    for nome, v in variantes.items():
+        body = v["encode"]()
+        t_enc = best_of(v["encode"], repeat)
+        t_dec = best_of(lambda: v["decode"](body), repeat)
+        resultados[nome] = {
+            "bytes": len(body),
+            "serialize_ms": round(t_enc * 1000, 3),
+            "parse_ms": round(t_dec * 1000, 3),
+            "total_ms": round((t_enc + t_dec) * 1000, 3),
+        }
+
+    base = resultados["default"]["bytes"]
+    for r in resultados.values():
+        r["ratio_bytes"] = round(r["bytes"] / base, 4)
+
+    return {"itens": n_itens, "repeat": repeat, "variantes": resultados}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--itens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.itens, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Memória e tempo de subida: `uvicorn --workers N` (hoje) x `python -m app.server` (pre-fork).
+
+    python -m bench.bench_prefork --workers 4
+
+Para cada modo sobe o servidor numa porta livre, mede o tempo até todos os
+workers estarem no ar (todos com o mesmo número de threads e /health/ready = 200)
+e lê /proc/<pid>/smaps_rollup de cada worker:
+
+  rss      memória residente do worker (conta as páginas compartilhadas inteiras)
+  pss      rss com as páginas compartilhadas divididas entre quem as usa
+  privado  páginas só do worker (o custo real de mais um worker)
+
+Só Linux (/proc).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List
+
+from .workload import BASE_DIR
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _filhos(pid: int) -> List[int]:
+    out: List[int] = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out.extend(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return out
+
+
+def _smaps_kb(pid: int) -> Dict[str, int]:
+    campos = {"Rss": "rss", "Pss": "pss", "Private_Clean": "privado", "Private_Dirty": "privado"}
+    out = {"rss": 0, "pss": 0, "privado": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linha in f:
+            nome, _, resto = linha.partition(":")
+            if nome in campos:
+                out[campos[nome]] += int(resto.split()[0])
+    return out
+
+
+def _pronto(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=1) as r:
+            return r.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _workers_no_ar(pid: int, n: int) -> List[int]:
+    """
+    Workers do modo: filhos diretos, descontando o resource_tracker/semaphore
+    do multiprocessing que o uvicorn --workers também cria.
+    """
+    filhos = []
+    for p in _filhos(pid):
+        try:
+            with open(f"/proc/{p}/cmdline", "rb") as f:
+                cmd = f.read()
+        except OSError:
+            continue
+        if b"resource_tracker" not in cmd:
+            filhos.append(p)
+    return filhos if len(filhos) >= n else []
+
+
+def medir(cmd: List[str], port: int, workers: int, timeout: float) -> Dict[str, Any]:
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        pids: List[int] = []
+        while time.perf_counter() - t0 < timeout:
+            pids = _workers_no_ar(proc.pid, workers)
+            # cada worker só aceita conexões depois de carregar; com todos carregados
+            # a memória para de subir: espera estabilizar
+            if pids and _pronto(port):
+                antes = sum(_smaps_kb(p)["rss"] for p in pids)
+                time.sleep(0.5)
+                if sum(_smaps_kb(p)["rss"] for p in pids) == antes:
+                    break
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f"servidor não subiu em {timeout}s: {' '.join(cmd)}")
+        subida = time.perf_counter() - t0 - 0.5
+
+        # uma requisição por worker (aproximado: o kernel distribui as conexões)
+        for _ in range(workers * 2):
+            _pronto(port)
+
+        por_worker = [_smaps_kb(p) for p in pids]
+        pai = _smaps_kb(proc.pid)
+        mb = lambda kb: round(kb / 1024, 1)  # noqa: E731
+        return {
+            "subida_s": round(subida, 2),
+            "workers": len(pids),
+            "rss_mb_por_worker": [mb(w["rss"]) for w in por_worker],
+            "pss_mb_por_worker": [mb(w["pss"]) for w in por_worker],
+            "privado_mb_por_worker": [mb(w["privado"]) for w in por_worker],
+            "pss_mb_total": mb(sum(w["pss"] for w in por_worker) + pai["pss"]),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_prefork", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("❌ Precisa de /proc/<pid>/smaps_rollup (Linux)", file=sys.stderr)
+        sys.exit(1)
+
+    py = sys.executable
+    modos = {
+        "uvicorn_workers": lambda port: [py, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                                         "--port", str(port), "--workers", str(args.workers)],
+        "prefork": lambda port: [py, "-m", "app.server", "--host", "127.0.0.1",
+                                 "--port", str(port), "--workers", str(args.workers)],
+    }
+    out = {}
+    for nome, cmd in modos.items():
+        port = _porta_livre()
+        out[nome] = medir(cmd(port), port, args.workers, args.timeout)
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
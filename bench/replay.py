@@ -0,0 +1,246 @@
+"""
+Replay do tráfego gravado (app/gravacao.py, REPLAY_RECORD) contra a app.
+
+    python -m bench.replay data/trafego.ndjson.gz                       # em processo (ASGI), o mais rápido possível
+    python -m bench.replay data/trafego.ndjson.gz --rps 200 --concorrencia 16
+    python -m bench.replay data/trafego.ndjson.gz --velocidade 2        # ritmo original, 2x mais rápido
+    python -m bench.replay data/trafego.ndjson.gz --url http://127.0.0.1:8000
+
+Ritmo: sem --rps/--velocidade, cada uma das N tarefas manda a próxima requisição
+assim que a anterior volta (carga fechada). Com --rps ou --velocidade, cada
+requisição tem um horário de saída (i/rps ou o "ts" gravado / velocidade) e a
+latência conta a partir desse horário: fila por falta de concorrência aparece
+como latência, como para um cliente real.
+
+Relatório (JSON): req/s, percentis de latência por endpoint, erros, taxa de
+acerto do cache (cclastrib_cache_total antes x depois; via --url é a do worker
+que respondeu o /metrics) e o perfil das chaves (NCMs distintos, fatia dos
+mais frequentes), para comparar com o tráfego sintético do bench.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import re
+import sys
+import time
+from collections import Counter as _Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .asgi import asgi_request
+from .timing import quiet, summarize
+
+try:
+    import httpx  # opcional (só para --url)
+except ImportError:  # pragma: no cover - depende do ambiente
+    httpx = None
+
+
+def ler_gravacao(path: str) -> Iterator[Dict[str, Any]]:
+    # .gz com vários membros (um por lote gravado) é lido direto pelo gzip.open
+    abrir = gzip.open if path.endswith(".gz") else open
+    with abrir(path, "rt", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue  # linha truncada (processo morto no meio da escrita)
+
+
+def perfil_chaves(registros: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ncms: _Counter = _Counter()
+    for r in registros:
+        corpo = r["corpo"]
+        for ncm in ([i.get("ncm") for i in corpo.get("itens", [])] if "itens" in corpo else [corpo.get("ncm")]):
+            if ncm:
+                ncms[re.sub(r"\D", "", str(ncm))] += 1
+    total = sum(ncms.values())
+    fatia = lambda n: round(sum(c for _, c in ncms.most_common(n)) / total, 3) if total else 0.0  # noqa: E731
+    return {
+        "itens": total,
+        "ncms_distintos": len(ncms),
+        "fatia_top_10": fatia(10),
+        "fatia_top_100": fatia(100),
+        "ncms_uma_vez": sum(1 for c in ncms.values() if c == 1),
+    }
+
+
+# -------------------------
+# Alvos: app em processo ou servidor via HTTP
+# -------------------------
+_CACHE_HIT = re.compile(r'^cclastrib_cache_total\{result="(hit|miss)"\} (\S+)$', re.M)
+
+
+class AlvoAsgi:
+    def __init__(self) -> None:
+        with quiet():
+            from app.main import app
+        self.app = app
+
+    async def enviar(self, path: str, corpo: bytes) -> int:
+        status, _, _ = await asgi_request(self.app, "POST", path, body=corpo, headers={"content-type": "application/json"})
+        return status
+
+    async def cache(self) -> Tuple[float, float]:
+        from app import metrics
+
+        return metrics.CACHE_TOTAL.value("hit"), metrics.CACHE_TOTAL.value("miss")
+
+    async def fechar(self) -> None:
+        pass
+
+
+class AlvoHttp:
+    def __init__(self, url: str, concorrencia: int) -> None:
+        if httpx is None:
+            raise RuntimeError("--url exige o pacote httpx")
+        self.client = httpx.AsyncClient(
+            base_url=url.rstrip("/"), timeout=60.0,
+            limits=httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia),
+        )
+
+    async def enviar(self, path: str, corpo: bytes) -> int:
+        r = await self.client.post(path, content=corpo, headers={"content-type": "application/json"})
+        return r.status_code
+
+    async def cache(self) -> Tuple[float, float]:
+        valores = {"hit": 0.0, "miss": 0.0}
+        try:
+            r = await self.client.get("/metrics")
+            for nome, v in _CACHE_HIT.findall(r.text):
+                valores[nome] = float(v)
+        except httpx.HTTPError:
+            pass
+        return valores["hit"], valores["miss"]
+
+    async def fechar(self) -> None:
+        await self.client.aclose()
+
+
+# -------------------------
+# Replay
+# -------------------------
+async def replay(
+    alvo,
+    registros: List[Dict[str, Any]],
+    concorrencia: int,
+    rps: float = 0.0,
+    velocidade: float = 0.0,
+) -> Dict[str, Any]:
+    # horário de saída de cada requisição (segundos desde o início), ou None = assim que der
+    saidas: List[Optional[float]]
+    if rps > 0:
+        saidas = [i / rps for i in range(len(registros))]
+    elif velocidade > 0 and registros:
+        t0_gravado = registros[0]["ts"]
+        saidas = [(r["ts"] - t0_gravado) / velocidade for r in registros]
+    else:
+        saidas = [None] * len(registros)
+    corpos = [(r["path"], json.dumps(r["corpo"]).encode("utf-8")) for r in registros]
+
+    latencias: Dict[str, List[float]] = {}
+    erros: _Counter = _Counter()
+    proxima = 0
+    hit0, miss0 = await alvo.cache()
+    inicio = time.perf_counter()
+
+    async def tarefa() -> None:
+        nonlocal proxima
+        while proxima < len(corpos):
+            i = proxima
+            proxima += 1
+            path, corpo = corpos[i]
+            saida = saidas[i]
+            if saida is not None:
+                espera = inicio + saida - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                t0 = inicio + saida
+            else:
+                t0 = time.perf_counter()
+            try:
+                status = await alvo.enviar(path, corpo)
+            except Exception:
+                status = 0
+            latencias.setdefault(path, []).append(time.perf_counter() - t0)
+            if status != 200:
+                erros[f"{path} {status}"] += 1
+
+    await asyncio.gather(*(tarefa() for _ in range(max(1, concorrencia))))
+    duracao = time.perf_counter() - inicio
+    hit1, miss1 = await alvo.cache()
+    hits, misses = hit1 - hit0, miss1 - miss0
+
+    return {
+        "requisicoes": len(corpos),
+        "duracao_s": round(duracao, 3),
+        "req_per_s": round(len(corpos) / duracao, 1) if duracao else 0.0,
+        "concorrencia": concorrencia,
+        "rps_alvo": rps or None,
+        "velocidade": velocidade or None,
+        # ops_per_s do summarize não faz sentido com requisições simultâneas
+        "latencia": {
+            path: {k: v for k, v in summarize(ls).items() if k != "ops_per_s"} for path, ls in sorted(latencias.items())
+        },
+        "erros": dict(erros),
+        "cache": {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("gravacao", help="arquivo gravado com REPLAY_RECORD (.ndjson ou .ndjson.gz)")
+    parser.add_argument("--url", default="", help="servidor no ar (ex: http://127.0.0.1:8000); vazio = app em processo")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=0.0, help="taxa fixa de requisições por segundo")
+    parser.add_argument("--velocidade", type=float, default=0.0,
+                        help="respeita os intervalos gravados, acelerados por este fator")
+    parser.add_argument("--limite", type=int, default=0, help="usa só as N primeiras requisições")
+    parser.add_argument("--repetir", type=int, default=1, help="passadas sobre a gravação (a 2ª já pega cache quente)")
+    parser.add_argument("--out", default="", help="grava o relatório JSON neste arquivo")
+    args = parser.parse_args(argv)
+
+    registros = list(ler_gravacao(args.gravacao))
+    if args.limite:
+        registros = registros[: args.limite]
+    if not registros:
+        print(f"❌ Nenhuma requisição em {args.gravacao}", file=sys.stderr)
+        sys.exit(1)
+
+    async def rodar() -> List[Dict[str, Any]]:
+        alvo = AlvoHttp(args.url, args.concorrencia) if args.url else AlvoAsgi()
+        try:
+            return [
+                await replay(alvo, registros, args.concorrencia, args.rps, args.velocidade)
+                for _ in range(max(1, args.repetir))
+            ]
+        finally:
+            await alvo.fechar()
+
+    with quiet():
+        passadas = asyncio.run(rodar())
+    out = {
+        "gravacao": args.gravacao,
+        "alvo": args.url or "asgi (em processo)",
+        "chaves": perfil_chaves(registros),
+        "passadas": passadas,
+    }
+    texto = json.dumps(out, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+"""
+Suíte de benchmark do pipeline de classificação.
+
+    python -m bench                         # roda tudo, grava bench/results/<commit>.json
+    python -m bench --only classify,handle  # só algumas seções
+    python -m bench --compare bench/results/abc1234.json
+
+Seções:
+  load_sources  cold start de load_sources(data/anexos): em processo novo (import +
+                carga, como na subida do servidor; com RSS) e em processo, sequencial x
+                paralelo x tudo carregado (sem as tabelas sob demanda)
+  classify      rules.classify por etapa (CFOP, lookup NCM, cclastrib, alíquotas) e total
+  handle        CClastribAgent.handle com cache frio e quente
+  lote          handle_lote em vários tamanhos de lote
+  http          throughput da app ASGI em processo (/classificar e /classificar-lote)
+  herd          rajada de misses simultâneos na mesma chave (thundering herd), com e
+                sem single-flight: classificações executadas e latência
+  ncm_search    montagem do índice de busca por descrição e latência das consultas
+  revisao_llm   revisão por LLM (backend local com latência simulada) de um lote de
+                itens de baixa confiança: concorrência 1 x LLM_CONCORRENCIA, cache frio e quente
+  trilha        custo da trilha de auditoria no handle (cache quente): desligada x
+                NDJSON gzip x SQLite, decisões gravadas e descartadas
+  ncm_sugestao  montagem do sugestor de NCM (TF-IDF de n-gramas) e conferência de
+                lotes inteiros (deitem x NCM declarado) por tamanho de lote
+
+As operações são sintéticas, geradas a partir das tabelas reais (bench/workload.py),
+com seed fixa para que rodadas em commits diferentes sejam comparáveis.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from app import rules
+from app.schemas import ClassifyLoteRequest, ClassifyRequest
+
+from .asgi import asgi_request
+from .timing import quiet, summarize, time_each
+from .workload import BASE_DIR, DATA_ANEXOS_DIR, Workload
+
+RESULTS_DIR = os.path.join(BASE_DIR, "bench", "results")
+SECTIONS = ("load_sources", "classify", "handle", "lote", "http", "herd", "ncm_search", "ncm_sugestao", "revisao_llm", "trilha")
+
+
+# -------------------------
+# Metadados da rodada
+# -------------------------
+def git_info() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.check_output(
+                ["git", *args], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except Exception:
+            return ""
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def meta(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        **git_info(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {"ops": args.ops, "seed": args.seed, "lote_sizes": args.lote_sizes},
+    }
+
+
+# -------------------------
+# Seções
+# -------------------------
+_COLD_START = (
+    "import resource, time; t0 = time.perf_counter(); from app import rules; "
+    "s = rules.load_sources({dir!r}, {workers}); {eager}"
+    "print(time.perf_counter() - t0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+
+def bench_load_sources(repeat: int) -> Dict[str, Any]:
+    paralelo = max(2, rules.load_workers())
+    out: Dict[str, Any] = {"workers_paralelo": paralelo}
+    modos = (("sequencial", 1, False), ("paralelo", paralelo, False), ("tudo_carregado", 1, True))
+    for nome, workers, eager in modos:
+        # processo novo: inclui import e caches frios (parse de datas, interning)
+        code = _COLD_START.format(dir=DATA_ANEXOS_DIR, workers=workers, eager="s.materializar(); " if eager else "")
+        frio, rss_kb = [], []
+        for _ in range(repeat):
+            t, rss = subprocess.check_output([sys.executable, "-c", code], cwd=BASE_DIR, text=True).split()
+            frio.append(float(t))
+            rss_kb.append(int(rss))
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            sources = rules.load_sources(DATA_ANEXOS_DIR, workers)
+            if eager:
+                sources.materializar()
+            samples.append(time.perf_counter() - t0)
+        out[f"cold_start_{nome}"] = summarize(frio)
+        out[f"rss_mb_{nome}"] = round(max(rss_kb) / 1024, 1)
+        out[f"em_processo_{nome}"] = summarize(samples)
+    return out
+
+
+def _classify_kwargs(op: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        regime=op["regime_fiscal_emitente"],
+        cfop=op["cfop"],
+        uf_emit=op["uf_emitente"],
+        uf_dest=op["uf_destinatario"],
+        cst_icms=op["cst_icms"],
+        ncm=op["ncm"],
+        data_emissao=date(op["ano_emissao"], 1, 1),
+        compra_gov=False,
+        ind_doacao=False,
+        produzido_zfm=False,
+        emitente_zfm=False,
+        destinatario_zfm=False,
+        cadastro_suframa_emitente="",
+        cadastro_suframa_emitente_ativo=None,
+        cadastro_suframa_destinatario="",
+        cadastro_suframa_destinatario_ativo=None,
+    )
+
+
+def bench_classify(sources: rules.DataSources, ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def stage_cfop(op):
+        code = rules.norm_code(op["cfop"])
+        row = sources.cfop_map.get(code)
+        rules.detect_producao_emitente(code, row)
+        rules.detect_venda_industrializada(code, row)
+
+    def stage_ncm(op):
+        digits = rules.norm_ncm(op["ncm"])
+        d = date(op["ano_emissao"], 1, 1)
+        rules.is_ncm_beneficiado_zfm(sources, digits)
+        row = rules.find_excecao(sources, digits, d) or rules.find_in_master(sources, digits, d)
+        if not row:
+            rules.find_in_oficial(sources, digits, d)
+
+    def stage_cclastrib(op):
+        codigo, _, _ = rules.pick_cclastrib(
+            sources,
+            op["regime_fiscal_emitente"],
+            op["cfop"],
+            op["uf_emitente"],
+            op["uf_destinatario"],
+            op["cst_icms"],
+        )
+        rules.map_cst_ibs_cbs_from_cclastrib(sources, codigo)
+
+    def stage_rates(op):
+        rules.compute_ibs_cbs(
+            sources,
+            ncm=op["ncm"],
+            data_emissao=date(op["ano_emissao"], 1, 1),
+            categoria_hint=None,
+        )
+
+    def total(op):
+        rules.classify(sources, **_classify_kwargs(op))
+
+    stages: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+        "cfop": stage_cfop,
+        "ncm_lookup": stage_ncm,
+        "cclastrib_pick": stage_cclastrib,
+        "rate_compute": stage_rates,
+        "total": total,
+    }
+    with quiet():
+        return {name: summarize(time_each(fn, ops)) for name, fn in stages.items()}
+
+
+def bench_handle(agent, ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    reqs = [ClassifyRequest(**op) for op in ops]
+
+    def cold(req):
+        agent._cache.clear()
+        agent.handle(req)
+
+    with quiet():
+        cold_samples = time_each(cold, reqs)
+        for req in reqs:
+            agent.handle(req)
+        warm_samples = time_each(agent.handle, reqs)
+    return {"cold_cache": summarize(cold_samples), "warm_cache": summarize(warm_samples)}
+
+
+def bench_trilha(agent, ops: List[Dict[str, Any]], rodadas: int = 10) -> Dict[str, Any]:
+    import tempfile
+
+    from app.trilha import TrilhaAuditoria, TrilhaConfig
+
+    reqs = [ClassifyRequest(**op) for op in ops] * rodadas
+    original = agent.trilha
+    out: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as d, quiet():
+        for req in reqs[:len(ops)]:
+            agent.handle(req)
+        try:
+            for nome, destino in (("desligada", ""), ("ndjson", os.path.join(d, "trilha")),
+                                  ("sqlite", os.path.join(d, "trilha.sqlite"))):
+                trilha = TrilhaAuditoria(TrilhaConfig(destino=destino)) if destino else None
+                agent.trilha = trilha
+                stats = summarize(time_each(agent.handle, reqs))
+                if trilha is not None:
+                    t0 = time.perf_counter()
+                    trilha.parar()
+                    stats["flush_final_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                    stats["gravadas"] = trilha.gravadas
+                    stats["descartadas"] = trilha.descartadas
+                out[nome] = stats
+        finally:
+            agent.trilha = original
+    return out
+
+
+def bench_lote(agent, wl: Workload, sizes: List[int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for n in sizes:
+        req = ClassifyLoteRequest(**wl.lote(n, ano=2027))
+        with quiet():
+            agent._cache.clear()
+            t0 = time.perf_counter()
+            agent.handle_lote(req)
+            cold = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            agent.handle_lote(req)
+            warm = time.perf_counter() - t0
+        out[str(n)] = {
+            "cold_ms": round(cold * 1000, 3),
+            "warm_ms": round(warm * 1000, 3),
+            "cold_itens_por_s": round(n / cold, 1),
+            "warm_itens_por_s": round(n / warm, 1),
+        }
+    return out
+
+
+def bench_http(ops: List[Dict[str, Any]], wl: Workload, concurrency: int) -> Dict[str, Any]:
+    with quiet():
+        from app.main import agent, app
+
+    async def drive(path: str, bodies: List[bytes]) -> Dict[str, Any]:
+        latencies: List[float] = []
+        errors = 0
+        queue = list(reversed(bodies))
+
+        async def worker():
+            nonlocal errors
+            while queue:
+                body = queue.pop()
+                t0 = time.perf_counter()
+                status, _, _ = await asgi_request(
+                    app, "POST", path, body=body, headers={"content-type": "application/json"}
+                )
+                latencies.append(time.perf_counter() - t0)
+                if status != 200:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+        # ops_per_s de summarize não faz sentido com requisições simultâneas
+        stats = {k: v for k, v in summarize(latencies).items() if k != "ops_per_s"}
+        return {
+            **stats,
+            "req_per_s": round(len(bodies) / elapsed, 1),
+            "errors": errors,
+            "concurrency": concurrency,
+        }
+
+    single = [json.dumps(op).encode() for op in ops]
+    lotes = [json.dumps(wl.lote(50, ano=2027)).encode() for _ in range(max(1, len(ops) // 50))]
+
+    with quiet():
+        agent._cache.clear()
+        cold = asyncio.run(drive("/classificar", single))
+        warm = asyncio.run(drive("/classificar", single))
+        agent._cache.clear()
+        lote = asyncio.run(drive("/classificar-lote", lotes))
+
+    return {"classificar_cold": cold, "classificar_warm": warm, "classificar_lote_50": lote}
+
+
+class _SemCoalescencia:
+    # mesmo contrato do SingleFlight, sem coalescer (linha de base da seção herd)
+    def do(self, key, fn):
+        return fn(), False
+
+
+def bench_herd(
+    agent, ops: List[Dict[str, Any]], threads: int, rodadas: int, atraso_ms: float = 5.0
+) -> Dict[str, Any]:
+    """
+    Para cada rodada: cache vazio, `threads` threads liberadas juntas por uma
+    barreira, todas com a mesma requisição (nota do ERP espalhada em threads).
+    `atraso_ms` soma um sleep a cada classify: o classify real leva ~0,2 ms e a
+    primeira thread termina antes de as outras chegarem, sem miss simultâneo
+    para coalescer. Com o atraso (classify lento: tabelas frias, GIL disputado)
+    os misses se sobrepõem como em produção; 0 mede o classify puro.
+    """
+    import app.agent as agent_mod
+
+    classify_original = agent_mod.classify
+    execucoes = [0]
+    lock = threading.Lock()
+
+    def classify_contado(*a, **kw):
+        with lock:
+            execucoes[0] += 1
+        if atraso_ms:
+            time.sleep(atraso_ms / 1000.0)
+        return classify_original(*a, **kw)
+
+    reqs = [ClassifyRequest(**op) for op in ops[:rodadas]]
+
+    def rajada(req: ClassifyRequest) -> List[float]:
+        barreira = threading.Barrier(threads)
+        latencias: List[float] = []
+
+        def worker():
+            barreira.wait()
+            t0 = time.perf_counter()
+            agent.handle(req)
+            with lock:
+                latencias.append(time.perf_counter() - t0)
+
+        ts = [threading.Thread(target=worker) for _ in range(threads)]
+        for th in ts:
+            th.start()
+        for th in ts:
+            th.join()
+        return latencias
+
+    def medir() -> Dict[str, Any]:
+        execucoes[0] = 0
+        latencias: List[float] = []
+        t0 = time.perf_counter()
+        for req in reqs:
+            agent._cache.clear()
+            latencias.extend(rajada(req))
+        elapsed = time.perf_counter() - t0
+        stats = {k: v for k, v in summarize(latencias).items() if k != "ops_per_s"}
+        return {
+            **stats,
+            "classificacoes": execucoes[0],
+            "classificacoes_por_rajada": round(execucoes[0] / len(reqs), 2),
+            "req_per_s": round(len(latencias) / elapsed, 1),
+        }
+
+    inflight = agent._inflight
+    agent_mod.classify = classify_contado
+    try:
+        with quiet():
+            agent._inflight = _SemCoalescencia()
+            sem = medir()
+            agent._inflight = inflight
+            com = medir()
+    finally:
+        agent_mod.classify = classify_original
+        agent._inflight = inflight
+    return {
+        "threads": threads, "rodadas": len(reqs), "atraso_ms": atraso_ms,
+        "sem_single_flight": sem, "single_flight": com,
+    }
+
+
+def bench_ncm_search(sources: rules.DataSources, wl: Workload, n: int) -> Dict[str, Any]:
+    from app.busca_ncm import IndiceNcm
+
+    t0 = time.perf_counter()
+    indice = IndiceNcm.build(sources.ncm_oficial, sources.ncm_master)
+    build_s = time.perf_counter() - t0
+    consultas = [wl.consulta_ncm() for _ in range(n)]
+    return {
+        "build_ms": round(build_s * 1000, 1),
+        "documentos": len(indice),
+        "termos": len(indice.vocabulario),
+        "primeira_pagina": summarize(time_each(lambda q: indice.buscar(q, 20), consultas)),
+        "pagina_5": summarize(time_each(lambda q: indice.buscar(q, 20, 80), consultas)),
+    }
+
+
+def bench_ncm_sugestao(sources: rules.DataSources, wl: Workload, lote_sizes: List[int]) -> Dict[str, Any]:
+    from app.sugestao_ncm import SugestorNcm
+
+    t0 = time.perf_counter()
+    sugestor = SugestorNcm.build(sources.ncm_oficial, sources.ncm_master)
+    build_s = time.perf_counter() - t0
+    if sugestor is None:
+        return {"erro": "numpy indisponível"}
+    out: Dict[str, Any] = {
+        "build_ms": round(build_s * 1000, 1),
+        "documentos": len(sugestor),
+        "ngramas": len(sugestor.vocab),
+    }
+    for n in lote_sizes:
+        lotes = [[(wl.consulta_ncm(), wl.ncm()) for _ in range(n)] for _ in range(10)]
+        stats = summarize(time_each(sugestor.sugerir, lotes))
+        stats["itens_per_s"] = round(n * stats["ops_per_s"], 1)
+        out[f"lote_{n}"] = stats
+    return out
+
+
+def bench_revisao_llm(agent, wl: Workload, n_itens: int, atraso: float = 0.05) -> Dict[str, Any]:
+    import tempfile
+
+    from app.cache import SQLiteCache
+    from app.revisao_llm import LLM_CONCORRENCIA, LLM_LOTE, RevisorLLM, StubBackend
+
+    # operações que caem na REGRA-GERAL com NCM desconhecido (confiança 0.6), todas distintas
+    pares = []
+    for i in range(n_itens):
+        op = {**wl.operacao(), "cfop": "5949", "ncm": f"99{i:06d}"}
+        req = ClassifyRequest(**op)
+        pares.append((req, agent.handle(req), None))
+    out: Dict[str, Any] = {"itens": n_itens, "lote": LLM_LOTE, "atraso_ms": atraso * 1000}
+    original = agent.revisor
+    with tempfile.TemporaryDirectory() as d:
+        try:
+            for conc in sorted({1, LLM_CONCORRENCIA}):
+                backend = StubBackend(atraso=atraso)
+                cache = SQLiteCache(os.path.join(d, f"llm-{conc}.sqlite"))
+                agent.revisor = RevisorLLM(backend, cache, concorrencia=conc)
+                for fase in ("frio", "quente"):
+                    t0 = time.perf_counter()
+                    asyncio.run(agent.revisar_llm(pares))
+                    ms = (time.perf_counter() - t0) * 1000
+                    out[f"concorrencia_{conc}_{fase}"] = {"total_ms": round(ms, 1), "chamadas": backend.chamadas}
+        finally:
+            agent.revisor = original
+    return out
+
+
+# -------------------------
+# Comparação entre rodadas
+# -------------------------
+def flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Linhas "métrica  base -> atual  (x razão)" para tempos e throughputs.
+    Razão > 1 = mais lento (tempos) / mais rápido (throughputs).
+    """
+    base = flatten(baseline.get("results", {}))
+    cur = flatten(current.get("results", {}))
+    lines = [f"baseline {baseline['meta']['commit']} -> atual {current['meta']['commit']}"]
+    for key in sorted(base.keys() & cur.keys()):
+        if not key.endswith(("_us", "_ms", "_per_s")):
+            continue
+        b, c = base[key], cur[key]
+        ratio = (c / b) if b else float("inf")
+        lines.append(f"{key:<55} {b:>14.2f} -> {c:>14.2f}  (x{ratio:.2f})")
+    return lines
+
+
+# -------------------------
+# CLI
+# -------------------------
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    only = set(args.only.split(",")) if args.only else set(SECTIONS)
+    wl = Workload(seed=args.seed)
+    ops = [wl.operacao() for _ in range(args.ops)]
+    results: Dict[str, Any] = {}
+
+    if "load_sources" in only:
+        results["load_sources"] = bench_load_sources(args.repeat)
+
+    agent = None
+    if only & {"classify", "handle", "lote", "herd", "ncm_search", "ncm_sugestao", "revisao_llm", "trilha"}:
+        from app.agent import CClastribAgent
+
+        with quiet():
+            agent = CClastribAgent(data_anexos_dir=DATA_ANEXOS_DIR)
+
+    if "classify" in only:
+        results["classify"] = bench_classify(agent._sources, ops)
+    if "handle" in only:
+        results["handle"] = bench_handle(agent, ops)
+    if "lote" in only:
+        results["lote"] = bench_lote(agent, wl, args.lote_sizes)
+    if "http" in only:
+        results["http"] = bench_http(ops, wl, args.concurrency)
+    if "herd" in only:
+        results["herd"] = bench_herd(agent, ops, args.herd_threads, args.herd_rodadas, args.herd_atraso_ms)
+    if "ncm_search" in only:
+        results["ncm_search"] = bench_ncm_search(agent._sources, wl, args.ops * 10)
+    if "ncm_sugestao" in only:
+        results["ncm_sugestao"] = bench_ncm_sugestao(agent._sources, wl, args.lote_sizes)
+    if "trilha" in only:
+        results["trilha"] = bench_trilha(agent, ops)
+    if "revisao_llm" in only:
+        results["revisao_llm"] = bench_revisao_llm(agent, wl, args.ops)
+
+    return {"meta": meta(args), "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--only", default="", help=f"seções separadas por vírgula: {','.join(SECTIONS)}")
+    parser.add_argument("--ops", type=int, default=300, help="operações sintéticas por seção")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="repetições do cold start")
+    parser.add_argument("--lote-sizes", type=lambda s: [int(x) for x in s.split(",")], default=[1, 10, 100, 1000])
+    parser.add_argument("--concurrency", type=int, default=8, help="requisições simultâneas na seção http")
+    parser.add_argument("--herd-threads", type=int, default=32, help="threads por rajada na seção herd")
+    parser.add_argument("--herd-rodadas", type=int, default=20, help="rajadas (chaves distintas) na seção herd")
+    parser.add_argument("--herd-atraso-ms", type=float, default=5.0,
+                        help="atraso artificial em cada classify da seção herd, para os misses se sobreporem")
+    parser.add_argument("--out", default="", help="arquivo JSON de saída (default bench/results/<commit>.json)")
+    parser.add_argument("--compare", default="", help="JSON de uma rodada anterior para comparar")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(report["results"], indent=2, ensure_ascii=False))
+    print(f"✔ Resultado gravado em: {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, report)))
+
+
+if __name__ == "__main__":
+    main()
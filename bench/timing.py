@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import math
+import time
+from typing import Any, Callable, Dict, Iterator, List
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * (p / 100.0)
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    """
+    Resumo em microssegundos de uma lista de tempos (segundos).
+    """
+    values = sorted(samples_s)
+    n = len(values)
+    total = sum(values)
+    return {
+        "n": n,
+        "mean_us": round(total / n * 1e6, 2) if n else 0.0,
+        "p50_us": round(percentile(values, 50) * 1e6, 2),
+        "p95_us": round(percentile(values, 95) * 1e6, 2),
+        "p99_us": round(percentile(values, 99) * 1e6, 2),
+        "max_us": round(values[-1] * 1e6, 2) if n else 0.0,
+        "ops_per_s": round(n / total, 1) if total else 0.0,
+    }
+
+
+def time_each(fn: Callable[[Any], Any], inputs: List[Any]) -> List[float]:
+    samples = []
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """
+    Engole o stdout do código medido (prints de debug distorcem os tempos do terminal).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+from app.rules import read_csv_semicolon, norm_ncm
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_ANEXOS_DIR = os.path.join(BASE_DIR, "data", "anexos")
+
+UFS = ["SP", "RJ", "MG", "PR", "SC", "RS", "BA", "PE", "CE", "GO", "AM", "PA", "DF", "ES"]
+REGIMES = ["REGIME_NORMAL", "REGIME_SIMPLES", "SN", "RPA"]
+CSTS_ICMS = ["000", "010", "020", "040", "060", "090", "101", "102", "500"]
+
+
+class Workload:
+    """
+    Gera operações sintéticas a partir das tabelas reais de data/anexos.
+    - NCMs: mistura de ncm_master (categorizados), tabela oficial e alguns inválidos
+    - CFOPs: os que têm regra em cclastrib.csv + CFOPs de saída de cfop.csv
+    Sempre determinístico para a mesma seed.
+    """
+
+    def __init__(self, data_anexos_dir: str = DATA_ANEXOS_DIR, seed: int = 42):
+        self.rng = random.Random(seed)
+
+        master = read_csv_semicolon(os.path.join(data_anexos_dir, "ncm_master.csv"))
+        oficial = read_csv_semicolon(os.path.join(data_anexos_dir, "Tabela_NCM_Vigente_20251227.csv"))
+        cclastrib = read_csv_semicolon(os.path.join(data_anexos_dir, "cclastrib.csv"))
+        cfops = read_csv_semicolon(os.path.join(data_anexos_dir, "cfop.csv"))
+
+        self.ncms_master = [r["ncm"] for r in master if r.get("ncm")]
+        # palavras das descrições (Tabela NCM), para consultas do /ncm/search
+        self.palavras = sorted({
+            w.strip(".,;:()").lower()
+            for r in oficial
+            for w in (r.get("Descrição") or "").split()
+            if len(w.strip(".,;:()")) >= 4 and w.strip(".,;:()").isalpha()
+        })
+        self.ncms_oficial = [
+            norm_ncm(r.get("Código") or "")
+            for r in oficial
+            if len(norm_ncm(r.get("Código") or "")) == 8
+        ]
+        self.cfops_regra = sorted({
+            r["cfop"] for r in cclastrib if (r.get("cfop") or "*") != "*"
+        })
+        self.cfops_saida = [
+            r["CFOP"] for r in cfops
+            if (r.get("CFOP") or "")[:1] in ("5", "6", "7")
+        ]
+
+    def ncm(self) -> str:
+        x = self.rng.random()
+        if x < 0.80:
+            ncm = self.rng.choice(self.ncms_master)
+        elif x < 0.97:
+            ncm = self.rng.choice(self.ncms_oficial)
+        else:
+            ncm = f"{self.rng.randint(0, 99999999):08d}"
+        # parte dos clientes manda com pontos
+        if self.rng.random() < 0.5:
+            ncm = f"{ncm[:4]}.{ncm[4:6]}.{ncm[6:8]}"
+        return ncm
+
+    def consulta_ncm(self) -> str:
+        """
+        1 a 3 palavras das descrições; parte com erro de digitação (troca de
+        letras vizinhas) ou só o começo da última palavra (digitação na UI).
+        """
+        palavras = [self.rng.choice(self.palavras) for _ in range(self.rng.randint(1, 3))]
+        x = self.rng.random()
+        if x < 0.15:
+            w = palavras[-1]
+            i = self.rng.randrange(len(w) - 1)
+            palavras[-1] = w[:i] + w[i + 1] + w[i] + w[i + 2:]
+        elif x < 0.30:
+            palavras[-1] = palavras[-1][: self.rng.randint(3, len(palavras[-1]))]
+        return " ".join(palavras)
+
+    def cfop(self) -> str:
+        if self.rng.random() < 0.7:
+            return self.rng.choice(self.cfops_regra)
+        return self.rng.choice(self.cfops_saida)
+
+    def operacao(self, ano: Optional[int] = None) -> Dict[str, Any]:
+        uf_e = self.rng.choice(UFS)
+        uf_d = uf_e if self.rng.random() < 0.6 else self.rng.choice(UFS)
+        return {
+            "ano_emissao": ano or self.rng.randint(2026, 2033),
+            "regime_fiscal_emitente": self.rng.choice(REGIMES),
+            "cfop": self.cfop(),
+            "uf_emitente": uf_e,
+            "uf_destinatario": uf_d,
+            "cst_icms": self.rng.choice(CSTS_ICMS),
+            "ncm": self.ncm(),
+            "valor_item": round(self.rng.uniform(1, 5000), 2),
+        }
+
+    def lote(self, n_itens: int, ano: Optional[int] = None) -> Dict[str, Any]:
+        uf_e = self.rng.choice(UFS)
+        itens: List[Dict[str, Any]] = []
+        for i in range(1, n_itens + 1):
+            preco = round(self.rng.uniform(1, 500), 2)
+            itens.append({
+                "item": i,
+                "cditem": f"SKU{self.rng.randint(1, 99999):05d}",
+                "deitem": f"Produto sintetico {i}",
+                "und": "UN",
+                "preco": preco,
+                "qtde": self.rng.randint(1, 20),
+                "ncm": self.ncm(),
+                "cst_icms": self.rng.choice(CSTS_ICMS),
+                "cfop": self.cfop(),
+                "produzido_zfm": "N",
+            })
+        return {
+            "ano_emissao": ano or self.rng.randint(2026, 2033),
+            "regime_fiscal_emitente": self.rng.choice(REGIMES),
+            "uf_emitente": uf_e,
+            "uf_destinatario": self.rng.choice(UFS),
+            "itens": itens,
+        }
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+os.environ["DATA_DIR"] = os.path.join(RAIZ, "data", "anexos")
+# a app de teste sobe sem nada opcional ligado, seja qual for o ambiente de quem roda
+for var in (
+    "CACHE_L2_PATH", "AUDIT_LOG", "REPLAY_RECORD", "LLM_BACKEND",
+    "PROFILE_ENABLED", "WARMUP_KEYLOG", "WARMUP_RECORD", "WARMUP_PROFILES",
+):
+    os.environ.pop(var, None)
+
+DATA_ANEXOS_DIR = os.environ["DATA_DIR"]
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def agent():
+    from app.main import agent
+
+    return agent
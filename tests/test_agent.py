@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+import shutil
+
+from app import agent as agent_mod
+
+
+def test_versao_do_l2_muda_com_o_codigo_das_regras(agent, monkeypatch, tmp_path):
+    copia = tmp_path / "rules.py"
+    shutil.copy(agent_mod.CODIGO_DECISAO[1], copia)
+    monkeypatch.setattr(agent_mod, "CODIGO_DECISAO", (*agent_mod.CODIGO_DECISAO[:1], str(copia)))
+
+    antes = agent._data_version()
+    assert agent._data_version() == antes
+    copia.write_text(copia.read_text(encoding="utf-8") + "\n# regra nova\n", encoding="utf-8")
+    assert agent._data_version() != antes
+
+
+def test_versao_do_l2_cobre_regras_e_motores_fiscais():
+    nomes = {os.path.basename(p) for p in agent_mod.CODIGO_DECISAO}
+    assert {"rules.py", "agent.py", "fiscal_simples.py", "fiscal_conversao.py"} <= nomes
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.normalize_anexos import COMPILED_HEADER, compile_beneficios, condicao_item
+from app.records import BeneficioRow, read_records
+from app.rules import build_beneficios_index, find_beneficio_anexo
+
+OPERACAO = {
+    "ano_emissao": 2033,
+    "regime_fiscal_emitente": "RPA",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "cst_icms": "000",
+}
+
+
+def _classificar(client, ncm):
+    r = client.post("/classificar", json={**OPERACAO, "ncm": ncm})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.mark.parametrize("ncm,anexo", [
+    ("85235110", "ANEXO XI"),   # SSD: 8523.51 citado em "unidades de armazenamento criptografadas"
+    ("87012100", "ANEXO XI"),   # trator: 8701 citado para uso das Forças Armadas
+    ("88062200", "ANEXO XI"),   # drone: 8806 citado para uso pela segurança nacional
+    ("30049069", "ANEXO XIV"),  # 3004.90.69 abrange medicamentos fora da lista de princípios ativos
+])
+def test_item_condicionado_nao_reduz_aliquota(client, ncm, anexo):
+    res = _classificar(client, ncm)
+
+    assert res["ibs"]["aliquota"] == 100.0 and res["cbs"]["aliquota"] == 100.0
+    assert res["confianca"] < 1.0
+    assert any(p.startswith(f"Possível benefício do {anexo}") for p in res["pendencias"])
+    assert not any("aplicado pelo NCM" in a for a in res["alertas"])
+
+
+@pytest.mark.parametrize("ncm", ["07019000", "90181100"])
+def test_item_incondicional_continua_aplicado(client, ncm):
+    res = _classificar(client, ncm)
+
+    assert res["ibs"]["aliquota"] == 0.0 and res["cbs"]["aliquota"] == 0.0
+    assert res["confianca"] == 1.0
+    assert not any(p.startswith("Possível benefício") for p in res["pendencias"])
+
+
+def _row(anexo, item, ncm, condicao="", excecoes=""):
+    return BeneficioRow.parse(anexo, item, ncm, excecoes, "reducao", "100", f"item {item}", condicao)
+
+
+def test_incondicional_vence_condicionado_mais_especifico():
+    sources = SimpleNamespace(beneficios_anexos=build_beneficios_index([
+        _row("ANEXO XIV", "1", "30049069", "substancia"),
+        _row("ANEXO XII", "9", "3004"),
+    ]))
+    assert find_beneficio_anexo(sources, "30049069").item == "9"
+
+    sources = SimpleNamespace(beneficios_anexos=build_beneficios_index([
+        _row("ANEXO XIV", "1", "30049069", "substancia"),
+        _row("ANEXO XIV", "2", "3004", "substancia"),
+    ]))
+    assert find_beneficio_anexo(sources, "30049069").item == "1"
+
+
+@pytest.mark.parametrize("anexo,ncm,descricao,esperado", [
+    ("ANEXO XI", "87100000", "Carro blindado e carro de combate", "destinacao"),
+    ("ANEXO XIV", "30049079", "ABACAVIR", "substancia"),
+    ("ANEXO XIII", "87142000", "Partes e acessórios destinados exclusivamente a cadeiras de rodas", "destinacao"),
+    ("ANEXO XII", "90181980", "Eletroencefalógrafos", "ncm_residual"),
+    ("ANEXO XII", "90181100", "Eletrocardiógrafos", ""),
+    ("ANEXO XV", "0701", "Produtos hortícolas das posições 07.01", ""),
+])
+def test_condicao_item(anexo, ncm, descricao, esperado):
+    descricoes_ncm = {"90181980": "Outros", "90181100": "-- Eletrocardiógrafos"}
+    assert condicao_item({"anexo": anexo, "ncm": ncm, "descricao": descricao}, descricoes_ncm) == esperado
+
+
+def test_compilado_preserva_a_condicao(tmp_path):
+    norm = tmp_path / "ANEXO_XI.csv"
+    norm.write_text(
+        "anexo;item;ncm;excecoes;descricao;linha_origem\n"
+        "ANEXO XI;2.5;8701;;Tratores para uso pelas Forças Armadas;10\n"
+        "ANEXO XV;2;0701;;Produtos hortícolas;11\n",
+        encoding="utf-8",
+    )
+    out = tmp_path / "beneficios_anexos.csv"
+
+    prov = compile_beneficios([str(norm)], out_path=str(out), tabela_ncm=str(tmp_path / "sem_tabela.csv"))
+
+    assert prov[str(out)] == {"linhas": 2, "condicionadas": 1}
+    assert out.read_text(encoding="utf-8").splitlines()[0] == ";".join(COMPILED_HEADER)
+    rows = read_records(str(out), BeneficioRow)
+    assert [(r.ncm, r.condicao) for r in rows] == [("8701", "destinacao"), ("0701", "")]
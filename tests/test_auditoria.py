@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app import auditoria
+from app.auditoria import CatalogoNcm, auditar_catalogo
+from app.records import BeneficioRow, NcmOficialRow, NcmRow
+from app.rules import build_beneficios_index
+
+DATA_REF = date(2027, 6, 1)
+
+OFICIAL = [
+    NcmOficialRow.parse("0101.21.00", "-- Reprodutores de raça pura", "01/04/2022", ""),
+    NcmOficialRow.parse("0101.29.00", "-- Outros", "01/04/2022", ""),
+    NcmOficialRow.parse("0101.30.00", "- Asininos", "01/04/2022", ""),
+    NcmOficialRow.parse("0101.90.00", "- Outros", "01/04/2022", "31/12/2026"),
+    NcmOficialRow.parse("0102.21.00", "-- Reprodutores de raça pura", "01/01/2030", ""),
+    # níveis acima de 8 dígitos ficam fora do índice
+    NcmOficialRow.parse("01.01", "Cavalos, asininos e muares, vivos", "01/04/2022", ""),
+]
+MASTER = [
+    NcmRow.parse("01012100", "Reprodutores", "GERAL", "", "", "", ""),
+    NcmRow.parse("01013000", "Asininos", "GERAL", "", "", "", ""),
+]
+
+
+@pytest.fixture
+def catalogo():
+    sources = SimpleNamespace(
+        ncm_oficial=OFICIAL,
+        ncm_master=MASTER,
+        ncm_excecoes=[],
+        beneficios_anexos=build_beneficios_index([
+            BeneficioRow.parse("ANEXO I", "1", "010121", "", "reducao", "60", "Reprodutores", ""),
+        ]),
+    )
+    return CatalogoNcm.build(sources, DATA_REF)
+
+
+@pytest.mark.parametrize("ncm,problema,sugestoes,anexo", [
+    ("0101", "formato_invalido", "01012100,01013000,01012900", ""),
+    ("01012200", "inexistente", "01012100,01013000,01012900", ""),
+    ("01019000", "expirado", "01013000,01012100,01012900", ""),
+    ("01022100", "nao_vigente", "01013000,01012100,01012900", ""),
+    ("01012900", "sem_categoria", "", ""),
+])
+def test_problemas(catalogo, ncm, problema, sugestoes, anexo):
+    res = catalogo.auditar(ncm)
+    assert (res["problema"], res["sugestoes"], res["anexo"]) == (problema, sugestoes, anexo)
+
+
+def test_detalhes(catalogo):
+    assert catalogo.auditar("0101")["detalhe"] == "NCM com 4 dígitos"
+    assert catalogo.auditar("0101.90.00")["detalhe"] == "Vigência encerrada em 2026-12-31"
+    assert catalogo.auditar("01022100")["detalhe"] == "Fora da vigência em 2027-06-01"
+    assert "-- Outros" in catalogo.auditar("01012900")["detalhe"]
+
+
+@pytest.mark.parametrize("ncm", ["0101.21.00", "01013000"])
+def test_ncm_vigente_e_categorizado_sem_problema(catalogo, ncm):
+    assert catalogo.auditar(ncm) is None
+
+
+def test_sugestoes_do_nivel_mais_especifico(catalogo):
+    # mesma subposição (010129) antes dos categorizados da posição
+    assert catalogo.sugestoes("01012950") == ["01012900"]
+    # mesma posição (0101): categorizados primeiro, depois pela distância numérica
+    assert catalogo.sugestoes("01012800") == ["01013000", "01012100", "01012900"]
+    assert catalogo.sugestoes("01012800", limite=1) == ["01013000"]
+    # capítulo 01 sem posição 0103 vigente: cai para o capítulo
+    assert catalogo.sugestoes("01031000") == ["01013000", "01012100", "01012900"]
+    assert catalogo.sugestoes("99999999") == []
+
+
+def test_anexo_do_beneficio(catalogo):
+    assert catalogo.auditar("01012100") is None
+    # o anexo vem junto do problema
+    sem_cat = CatalogoNcm.build(
+        SimpleNamespace(**{**vars(catalogo.sources), "ncm_master": MASTER[1:]}), DATA_REF
+    )
+    assert sem_cat.auditar("01012100")["anexo"] == "ANEXO I"
+
+
+def test_workers_1_e_2_mesma_saida(catalogo, monkeypatch):
+    monkeypatch.setattr(auditoria, "_catalogo", None)
+    ncms = ["0101", "01012100", "01012200", "01019000", "01022100", "01012900", "01013000"]
+    itens = [(f"SKU{i}", ncms[i % len(ncms)]) for i in range(50)]
+
+    um = list(auditar_catalogo(iter(itens), "", DATA_REF, workers=1, bloco=4, catalogo=catalogo))
+    dois = list(auditar_catalogo(iter(itens), "", DATA_REF, workers=2, bloco=4, catalogo=catalogo))
+
+    assert um == dois
+    assert [r["sku"] for r in um] == [s for s, n in itens if n not in ("01012100", "01013000")]
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from app import build_anexos
+from app.build_anexos import BASE_DIR, MANIFEST_PATH, destino_csv
+
+
+@pytest.mark.parametrize("secao,rel", [
+    ("ANEXO I", "data/csv/ANEXO_I.csv"),
+    ("ANEXO VII", "data/csv/ANEXO_VII.csv"),
+    ("ANEXO XIV", "data/reservas/ANEXO_XIV.csv"),
+    ("LC 123 ANEXO I", "data/simples/ANEXO_I.csv"),
+    ("LC 123 ANEXO VII", "data/conversao/ANEXO_VII.csv"),
+])
+def test_destino_pela_identidade_da_secao(secao, rel):
+    assert destino_csv(secao) == os.path.join(BASE_DIR, rel)
+
+
+def _git_status(*paths):
+    r = subprocess.run(
+        ["git", "status", "--porcelain", "--", *paths],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    return r.stdout
+
+
+def test_build_sem_mudanca_nao_altera_o_repositorio():
+    if shutil.which("git") is None or not os.path.isdir(os.path.join(BASE_DIR, ".git")):
+        pytest.skip("fora de um checkout git")
+    if _git_status("data"):
+        pytest.skip("data/ com alterações locais")
+
+    report = build_anexos.build(manifest_path=MANIFEST_PATH)
+
+    assert report.gerados == [] and report.removidos == []
+    assert all(not entradas for entradas in report.etapas.values())
+    assert _git_status("data") == ""
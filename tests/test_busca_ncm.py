@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pytest
+
+from app.serialization import CODECS, MEDIA_MSGPACK, decode_body
+
+
+def _buscar(client, q, **params):
+    r = client.get("/ncm/search", params={"q": q, **params})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _ncms(res):
+    return [i["ncm"] for i in res["itens"]]
+
+
+def test_paginacao(client):
+    inteira = _buscar(client, "escova de dentes", tamanho=10)
+    p1 = _buscar(client, "escova de dentes", tamanho=5)
+    p2 = _buscar(client, "escova de dentes", tamanho=5, pagina=2)
+
+    assert p1["total"] == p2["total"] == inteira["total"] > 10
+    assert (p2["pagina"], p2["tamanho"]) == (2, 5)
+    assert _ncms(p1) + _ncms(p2) == _ncms(inteira)
+    assert _ncms(p1)[0] == "96032100"
+
+    alem = _buscar(client, "escova de dentes", tamanho=100, pagina=50)
+    assert alem["itens"] == [] and alem["total"] == inteira["total"]
+
+
+@pytest.mark.parametrize("com_acento,sem_acento", [
+    ("pão de forma", "pao de forma"),
+    ("ESCOVAS DE DENTES", "escova dente"),
+])
+def test_acentos_maiusculas_e_plural(client, com_acento, sem_acento):
+    a, b = _buscar(client, com_acento), _buscar(client, sem_acento)
+    assert _ncms(a) == _ncms(b)
+    assert a["total"] == b["total"]
+
+
+def test_correcao_de_digitacao(client):
+    res = _buscar(client, "escvoa de dentes")
+
+    assert "escova" in res["correcoes"]["escvoa"]
+    assert _ncms(res)[0] == "96032100"
+
+
+@pytest.mark.skipif(MEDIA_MSGPACK not in CODECS, reason="msgpack não instalado")
+def test_accept_msgpack(client):
+    ref = _buscar(client, "escova de dentes", tamanho=3)
+    r = client.get("/ncm/search", params={"q": "escova de dentes", "tamanho": 3}, headers={"accept": MEDIA_MSGPACK})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith(MEDIA_MSGPACK)
+    assert decode_body(r.content, MEDIA_MSGPACK) == ref
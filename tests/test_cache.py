@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.agent import CClastribAgent
+from app.cache import SingleFlight
+from app.schemas import ClassifyRequest
+
+N = 8
+
+
+def _rajada(sf: SingleFlight, fn):
+    """
+    N threads chamam sf.do com a mesma chave; fn é lenta o bastante para
+    todas chegarem enquanto a primeira ainda roda.
+    """
+    barreira = threading.Barrier(N)
+
+    def chamar():
+        barreira.wait()
+        try:
+            return sf.do("chave", fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(N) as pool:
+        return [f.result() for f in [pool.submit(chamar) for _ in range(N)]]
+
+
+def test_single_flight_executa_fn_uma_vez():
+    execucoes = []
+
+    def lenta():
+        execucoes.append(1)
+        time.sleep(0.2)
+        return {"ok": True}
+
+    resultados = _rajada(SingleFlight(), lenta)
+
+    assert len(execucoes) == 1
+    valores = [v for v, _ in resultados]
+    assert all(v is valores[0] for v in valores)
+    coalescidas = sorted(c for _, c in resultados)
+    assert coalescidas == [False] + [True] * (N - 1)
+
+
+def test_single_flight_propaga_a_mesma_excecao():
+    execucoes = []
+    erro = ValueError("falhou")
+
+    def lenta():
+        execucoes.append(1)
+        time.sleep(0.2)
+        raise erro
+
+    resultados = _rajada(SingleFlight(), lenta)
+
+    assert len(execucoes) == 1
+    assert all(r is erro for r in resultados)
+
+
+def test_single_flight_nao_guarda_resultado():
+    sf = SingleFlight()
+    assert sf.do("k", lambda: 1) == (1, False)
+    assert sf.do("k", lambda: 2) == (2, False)
+    with pytest.raises(KeyError):
+        sf.do("k", lambda: {}["x"])
+    assert sf.do("k", lambda: 3) == (3, False)
+
+
+OPERACAO = {
+    "ano_emissao": 2033,
+    "regime_fiscal_emitente": "RPA",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "cst_icms": "000",
+    "ncm": "22030000",
+}
+
+
+def _valores(res):
+    xml = res["xml"]
+    return (
+        xml["produto"]["vItem"],
+        xml["imposto"]["ibscbs"]["gIBSCBS"]["vBC"],
+        xml["imposto"]["ibscbs"]["gIBSCBS"]["vIBS"],
+        xml["imposto"]["ibscbs"]["gIBSCBS"]["gCBS"]["vCBS"],
+        xml["totais"]["ibscbsTot"]["vBCIBSCBS"],
+        xml["totais"]["vNFTot"],
+        res["total_debito"],
+    )
+
+
+def test_valor_do_item_nao_vem_do_cache(client):
+    a = client.post("/classificar", json={**OPERACAO, "valor_item": 100, "cod_municipio_fg_ibs": 3550308}).json()
+    b = client.post("/classificar", json={**OPERACAO, "valor_item": 5000}).json()
+
+    assert _valores(a) == (100.0, 100.0, 100.0, 100.0, 100.0, 300.0, 200.0)
+    assert _valores(b) == (5000.0, 5000.0, 5000.0, 5000.0, 5000.0, 15000.0, 10000.0)
+    assert a["xml"]["ide"]["cMunFGIBS"] == 3550308 and b["xml"]["ide"]["cMunFGIBS"] is None
+    assert {k: v for k, v in a.items() if k not in ("xml", "total_debito")} == \
+        {k: v for k, v in b.items() if k not in ("xml", "total_debito")}
+
+
+def test_l2_guarda_so_a_classificacao(tmp_path):
+    l2 = str(tmp_path / "l2.sqlite")
+    CClastribAgent(os.environ["DATA_DIR"], l2_path=l2).handle(ClassifyRequest(**OPERACAO, valor_item=100))
+
+    # outro worker: L1 vazio, hit no L2
+    res = CClastribAgent(os.environ["DATA_DIR"], l2_path=l2).handle(ClassifyRequest(**OPERACAO, valor_item=5000))
+
+    assert _valores(res.model_dump()) == (5000.0, 5000.0, 5000.0, 5000.0, 5000.0, 15000.0, 10000.0)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import pytest
+
+from app import serialization
+from app.serialization import CODECS, MEDIA_CBOR, MEDIA_JSON, MEDIA_MSGPACK, decode_body, encode_body
+
+OPERACAO = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "RJ",
+    "cst_icms": "000",
+    "ncm": "2202.10.00",
+    "valor_item": 150.0,
+}
+
+LOTE = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "itens": [
+        {"item": 1, "cditem": "A1", "deitem": "Refrigerante lata", "und": "UN", "preco": 5.0, "qtde": 3,
+         "ncm": "22021000", "valor_item": 15.0, "cst_icms": "000", "cfop": "5102", "produzido_zfm": "N"},
+        {"item": 2, "ncm": "8523.51.10", "valor_item": 300.0, "cst_icms": "000", "cfop": "5102",
+         "produzido_zfm": "N"},
+    ],
+}
+
+FORMATOS = [
+    pytest.param(m, marks=pytest.mark.skipif(m not in CODECS, reason=f"codec {m} não instalado"))
+    for m in (MEDIA_MSGPACK, MEDIA_CBOR)
+]
+
+
+def _post(client, path, corpo, media_type, params=None):
+    r = client.post(
+        path,
+        params=params,
+        content=encode_body(corpo, media_type),
+        headers={"content-type": media_type, "accept": media_type},
+    )
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith(media_type)
+    return decode_body(r.content, media_type)
+
+
+@pytest.mark.parametrize("media_type", FORMATOS)
+@pytest.mark.parametrize("path,corpo", [("/classificar", OPERACAO), ("/classificar-lote", LOTE)])
+def test_binario_igual_ao_json(client, media_type, path, corpo):
+    ref = client.post(path, json=corpo).json()
+    assert _post(client, path, corpo, media_type) == ref
+
+
+@pytest.mark.parametrize("media_type", [MEDIA_JSON] + FORMATOS)
+def test_compacto_igual_em_todos_os_formatos(client, media_type):
+    ref = _post(client, "/classificar-lote", LOTE, MEDIA_JSON, params={"compacto": "true"})
+    assert _post(client, "/classificar-lote", LOTE, media_type, params={"compacto": "true"}) == ref
+
+
+@pytest.mark.parametrize("compacto", ["false", "true"])
+@pytest.mark.parametrize("media_type", [MEDIA_JSON] + FORMATOS)
+def test_lote_usa_alias_qtde(client, media_type, compacto):
+    itens = _post(client, "/classificar-lote", LOTE, media_type, params={"compacto": compacto})["itens"]
+    assert itens[0]["qtde"] == 3
+    assert all("quantidade" not in i for i in itens)
+
+
+def test_content_type_sem_codec_415(client, monkeypatch):
+    corpo = encode_body(OPERACAO, MEDIA_CBOR) if MEDIA_CBOR in CODECS else b"\xa0"
+    monkeypatch.delitem(serialization.CODECS, MEDIA_CBOR, raising=False)
+    r = client.post("/classificar", content=corpo, headers={"content-type": MEDIA_CBOR})
+    assert r.status_code == 415
+
+
+@pytest.mark.parametrize("media_type", FORMATOS)
+def test_corpo_binario_invalido_400(client, media_type):
+    r = client.post("/classificar", content=b"\xc1\xff\x00", headers={"content-type": media_type})
+    assert r.status_code == 400
+
+
+def test_accept_sem_formato_disponivel_406(client, monkeypatch):
+    r = client.post("/classificar", json=OPERACAO, headers={"accept": "application/xml"})
+    assert r.status_code == 406
+
+    monkeypatch.delitem(serialization.CODECS, MEDIA_CBOR, raising=False)
+    r = client.post("/classificar-lote", json=LOTE, headers={"accept": MEDIA_CBOR})
+    assert r.status_code == 406
+
+
+@pytest.mark.parametrize("accept", ["text/html, */*;q=0.1", "application/*", f"{MEDIA_CBOR};q=0, {MEDIA_JSON}"])
+def test_accept_com_json_aceitavel(client, accept):
+    r = client.post("/classificar", json=OPERACAO, headers={"accept": accept})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith(MEDIA_JSON)
+
+
+def test_metrics_ignora_accept(client):
+    r = client.get("/metrics", headers={"accept": "text/plain"})
+    assert r.status_code == 200
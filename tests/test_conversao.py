@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import math
+
+import pytest
+
+from app import fiscal_conversao
+
+
+@pytest.fixture(scope="module")
+def engine(agent):
+    return agent._sources.conversao
+
+
+@pytest.mark.parametrize("ano,origem,destino,ano_base,esperado", [
+    (2027, "ICMS", "CBS", None, 0.994),
+    (2029, "icms", "ibs", None, 0.20 / 0.90),
+    (2030, "ICMS", "IBS", 2027, 0.40),
+    (2040, "ISS", "TOTAL", None, None),   # 2033 em diante: ISS zerado
+    (2026, "ICMS", "ISS", None, 5.0),
+    (2026, "ICMS", "CBS", None, 0.0),
+    (2033, "CBS", "IBS", 2026, None),     # CBS zerada em 2026
+])
+def test_fator(engine, ano, origem, destino, ano_base, esperado):
+    if esperado is None:
+        with pytest.raises(ValueError, match="zerad"):
+            engine.fator(ano, origem, destino, ano_base)
+    else:
+        assert engine.fator(ano, origem, destino, ano_base) == pytest.approx(esperado)
+
+
+@pytest.mark.parametrize("origem", ["PIS", "cofins", "PIS/COFINS"])
+def test_pis_cofins_sem_valor_fixo(engine, origem):
+    with pytest.raises(ValueError, match="PIS/COFINS"):
+        engine.fator(2027, origem, "CBS")
+
+
+@pytest.mark.parametrize("com_numpy", [True, False])
+def test_converter_por_ano(engine, monkeypatch, com_numpy):
+    if com_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(fiscal_conversao, "np", None)
+
+    out = list(engine.converter_por_ano([90, 90, 90, 90, 90], [2026, 2027, 2029, 2033, 2040], "ICMS", "IBS"))
+
+    assert out[:3] == pytest.approx([0.0, 0.54, 20.0])
+    # ICMS zerado a partir de 2033: sem fator só nos valores desses anos
+    assert math.isnan(out[3]) and math.isnan(out[4])
+
+    assert list(engine.converter_por_ano([10, 10], [2027, 2031], "ICMS", "ISS", ano_base=2027)) == \
+        pytest.approx([50.0, 35.0])
+
+    with pytest.raises(ValueError, match="2025"):
+        engine.converter_por_ano([1, 1], [2027, 2025], "ICMS", "IBS")
+
+
+def test_endpoint_converter(client):
+    r = client.post("/converter", json={"ano": 2029, "origem": "icms", "destino": "ibs", "valores": [90, 9]})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert (body["origem"], body["destino"], body["ano"]) == ("ICMS", "IBS", 2029)
+    assert body["fator"] == pytest.approx(0.222222, abs=1e-6)
+    assert body["valores"] == [20.0, 2.0]
+
+    r = client.post("/converter", json={"anos": [2026, 2033], "origem": "ICMS", "destino": "CBS", "valores": [1, 1]})
+    assert r.status_code == 200, r.text
+    assert r.json()["fator"] is None and r.json()["valores"] == [0.0, None]
+
+
+@pytest.mark.parametrize("corpo", [
+    {"ano": 2025, "valores": [1]},
+    {"anos": [2027, 2025], "valores": [1, 1]},
+    {"ano": 2027, "origem": "PIS", "destino": "CBS", "valores": [1]},
+    {"anos": [2027], "valores": [1, 1]},
+    {"valores": [1]},
+])
+def test_endpoint_converter_400(client, corpo):
+    r = client.post("/converter", json=corpo)
+    assert r.status_code == 400
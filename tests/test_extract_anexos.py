@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from app.extract_anexos import BASE_DIR, is_data_row, scan_anexos
+from app.rules import read_csv_semicolon
+
+# CSVs versionados: saída do extract_anexos.py sobre o HTML do Planalto
+CSV_HTML = {
+    "ANEXO XII": "data/csv/ANEXO_XII.csv",
+    "ANEXO XIII": "data/reservas/ANEXO_XIII.csv",
+    "LC 123 ANEXO VII": "data/conversao/ANEXO_VII.csv",
+}
+
+HTML = """<html><body>
+<p>Art. 138. Ficam reduzidas a zero as alíquotas dos produtos do</p>
+<p>ANEXO I desta Lei Complementar.</p>
+<table><tr><td>1</td><td>tabela do corpo da lei</td></tr></table>
+<p>ANEXO I</p>
+<p>PRODUTOS DESTINADOS À ALIMENTAÇÃO HUMANA</p>
+<table><tr><td>1</td><td>Arroz</td><td>1006.20</td></tr></table>
+<p>ANEXO VII</p>
+<table><tr><td>1</td><td>tabela sem título de anexo</td></tr></table>
+<p>ANEXO XXIII <a href="#">Produção de efeitos</a></p>
+<p>(Lei Complementar nº 123, de 14 de dezembro de 2006)</p>
+<p>ANEXO VII</p>
+<p>Valores fixos do Microempreendedor Individual (MEI)</p>
+<table><tr><td>ICMS</td><td>ISS</td><td>CBS</td></tr></table>
+</body></html>
+"""
+
+
+def _linhas(rows):
+    return [(r.cols + ["", ""])[:3] for r in rows if is_data_row(r.cols)]
+
+
+def _linhas_csv(rel):
+    return [
+        [" ".join(r[k].split()) for k in ("ncm", "descricao", "aliquota")]
+        for r in read_csv_semicolon(os.path.join(BASE_DIR, rel))
+    ]
+
+
+@pytest.mark.parametrize("use_lxml", [False, None])
+def test_html_so_abre_anexo_no_titulo_com_nome(tmp_path, use_lxml):
+    html = tmp_path / "lei.html"
+    html.write_text(HTML, encoding="latin-1")
+
+    por_anexo, hashes = scan_anexos(str(html), use_lxml=use_lxml)
+
+    assert list(por_anexo) == ["ANEXO I", "LC 123 ANEXO VII"]
+    # "ANEXO VII" sem nome logo abaixo não abre seção: a tabela fica no anexo corrente
+    assert _linhas(por_anexo["ANEXO I"]) == [["1", "Arroz", "1006.20"], ["1", "tabela sem título de anexo", ""]]
+    assert [r.anexo for r in por_anexo["LC 123 ANEXO VII"]] == ["ANEXO VII"]
+    assert set(hashes) == {"ANEXO I", "ANEXO XXIII", "LC 123 ANEXO VII"}
+
+
+@pytest.mark.parametrize("paginas,secoes", [
+    ("132-133", ["ANEXO XII", "ANEXO XIII"]),
+    ("150-150", ["LC 123 ANEXO VII"]),
+])
+def test_pdf_igual_ao_html_nas_mesmas_secoes(paginas, secoes):
+    pytest.importorskip("pdfplumber")
+    from app.extract_anexos_pdf import PDF_FILE, scan_anexos_pdf
+
+    por_anexo, _ = scan_anexos_pdf(PDF_FILE, workers=1, paginas=paginas)
+
+    assert "ANEXO VII" not in por_anexo
+    for secao in secoes:
+        pdf = _linhas(por_anexo[secao])
+        # o HTML do Planalto traz o cabeçalho da mensagem de veto como tabela depois do MEI
+        assert pdf == _linhas_csv(CSV_HTML[secao])[:len(pdf)]
+        assert len(pdf) >= len(_linhas_csv(CSV_HTML[secao])) - 2
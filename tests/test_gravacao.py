@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import gzip
+import json
+
+from app import metrics
+from app.gravacao import GravacaoConfig, GravadorTrafego, anonimizar
+from app.schemas import ClassifyLoteRequest, ClassifyRequest
+
+CHAVE = "35250112345678000195550010000012341000012345"
+
+OPERACAO = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "RJ",
+    "cst_icms": "000",
+    "ncm": "22021000",
+    "cod_municipio_fg_ibs": 3550308,
+    "valor_item": 1234.56,
+    "dfe_referenciado_chave": CHAVE,
+    "refs_pag_antecipado": [CHAVE],
+}
+LOTE = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "rbt12": 987654.0,
+    "itens": [
+        {"item": 1, "cditem": "A1", "deitem": "Refrigerante lata", "preco": 5.49, "ncm": "22021000",
+         "cst_icms": "000", "cfop": "5102", "produzido_zfm": "N"},
+        {"item": 2, "cditem": "A1", "deitem": "Refrigerante lata", "ncm": "22021000",
+         "cst_icms": "000", "cfop": "5102", "produzido_zfm": "N"},
+    ],
+}
+CHAVE_CACHE = ("ano_emissao", "regime_fiscal_emitente", "cfop", "uf_emitente", "uf_destinatario",
+               "cst_icms", "ncm", "cod_municipio_fg_ibs")
+
+
+def test_anonimizar_deterministico_e_preserva_a_chave_de_cache():
+    a = anonimizar(OPERACAO, "sal")
+
+    assert a == anonimizar(OPERACAO, "sal")
+    assert a != anonimizar(OPERACAO, "outro sal")
+    assert {k: a[k] for k in CHAVE_CACHE} == {k: OPERACAO[k] for k in CHAVE_CACHE}
+    # chave de NF-e: mesmo tamanho, só dígitos, outro valor; a mesma chave vira o mesmo hash
+    assert a["dfe_referenciado_chave"] != CHAVE
+    assert len(a["dfe_referenciado_chave"]) == len(CHAVE) and a["dfe_referenciado_chave"].isdigit()
+    assert a["refs_pag_antecipado"] == [a["dfe_referenciado_chave"]]
+    assert a["valor_item"] == 1200.0
+    # a entrada não é alterada
+    assert OPERACAO["dfe_referenciado_chave"] == CHAVE
+
+
+def test_anonimizar_itens_do_lote():
+    a = anonimizar(LOTE, "sal")
+    i1, i2 = a["itens"]
+
+    assert i1["cditem"].startswith("SKU-") and i1["deitem"].startswith("ITEM-")
+    assert (i1["cditem"], i1["deitem"]) == (i2["cditem"], i2["deitem"])
+    assert "A1" not in json.dumps(a) and "Refrigerante" not in json.dumps(a)
+    assert (i1["ncm"], i1["cfop"], i1["cst_icms"]) == ("22021000", "5102", "000")
+    assert (i1["preco"], a["rbt12"]) == (5.5, 990000.0)
+
+
+def _gravador(tmp_path, **kw):
+    config = GravacaoConfig(destino=str(tmp_path / "trafego.ndjson.gz"), sample_rate=1.0, salt="sal", flush_s=60, **kw)
+    return GravadorTrafego(config)
+
+
+def test_drena_lote_para_ndjson_gz(tmp_path):
+    gravador = _gravador(tmp_path)
+    gravador.registrar("/classificar", ClassifyRequest(**OPERACAO))
+    gravador.registrar("/classificar-lote", ClassifyLoteRequest(**LOTE))
+    gravador.parar()
+
+    with gzip.open(tmp_path / "trafego.ndjson.gz", "rt", encoding="utf-8") as f:
+        linhas = [json.loads(linha) for linha in f]
+    assert [linha["path"] for linha in linhas] == ["/classificar", "/classificar-lote"]
+    assert linhas[0]["corpo"]["ncm"] == "22021000"
+    assert linhas[0]["corpo"]["dfe_referenciado_chave"] == anonimizar(OPERACAO, "sal")["dfe_referenciado_chave"]
+    assert linhas[1]["corpo"]["itens"][0]["cditem"].startswith("SKU-")
+
+
+def test_fila_cheia_descarta_e_conta(tmp_path):
+    gravador = _gravador(tmp_path, fila_max=2)
+    antes = metrics.GRAVACAO_TOTAL.value("descartada")
+
+    for _ in range(5):
+        gravador.registrar("/classificar", ClassifyRequest(**OPERACAO))
+    gravador.parar()
+
+    assert metrics.GRAVACAO_TOTAL.value("descartada") == antes + 3
+    with gzip.open(tmp_path / "trafego.ndjson.gz", "rt", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
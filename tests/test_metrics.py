@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from app.metrics import Counter, Histogram
+
+LINHA = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def _series(texto):
+    """
+    {(nome, labels): valor} das linhas de amostra do formato texto do Prometheus.
+    """
+    out = {}
+    for linha in texto.splitlines():
+        if not linha or linha.startswith("#"):
+            continue
+        m = LINHA.match(linha)
+        assert m, linha
+        out[(m.group(1), m.group(2) or "")] = float(m.group(3))
+    return out
+
+
+def test_histograma_buckets_cumulativos():
+    h = Histogram("teste_seconds", "teste", ["stage"], buckets=(0.1, 0.5, 1.0))
+    for v in (0.05, 0.1, 0.3, 0.7, 2.0):
+        h.observe(v, "a")
+    h.observe(0.2, "b")
+
+    linhas = h.render()
+    assert linhas[:2] == ["# HELP teste_seconds teste", "# TYPE teste_seconds histogram"]
+    s = _series("\n".join(linhas))
+    # le é "menor ou igual": 0.1 cai no bucket 0.1
+    assert [s[("teste_seconds_bucket", f'stage="a",le="{le}"')] for le in ("0.1", "0.5", "1.0", "+Inf")] == \
+        [2, 3, 4, 5]
+    assert s[("teste_seconds_count", 'stage="a"')] == 5
+    assert s[("teste_seconds_sum", 'stage="a"')] == pytest.approx(3.15)
+    assert [s[("teste_seconds_bucket", f'stage="b",le="{le}"')] for le in ("0.1", "0.5", "1.0", "+Inf")] == \
+        [0, 1, 1, 1]
+
+
+def test_contador():
+    c = Counter("teste_total", "teste", ["result"])
+    c.inc("hit")
+    c.inc("hit", amount=2)
+    c.inc("miss")
+    assert c.value("hit") == 3 and c.value("erro") == 0
+    assert c.render()[2:] == ['teste_total{result="hit"} 3', 'teste_total{result="miss"} 1']
+
+
+def test_endpoint_metrics(client):
+    for ncm in ("22021000", "07019000", "85235110"):
+        r = client.post("/classificar", json={
+            "ano_emissao": 2031, "regime_fiscal_emitente": "RPA", "cfop": "5102",
+            "uf_emitente": "SP", "uf_destinatario": "MG", "cst_icms": "000", "ncm": ncm,
+        })
+        assert r.status_code == 200
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    s = _series(r.text)
+
+    assert s[("cclastrib_cache_total", 'result="miss"')] >= 3
+    for stage in ("classify", "build_response", "serialize"):
+        buckets = [
+            v for (nome, labels), v in s.items()
+            if nome == "cclastrib_stage_seconds_bucket" and labels.startswith(f'stage="{stage}",')
+        ]
+        # cumulativos: não decrescem e o último (+Inf) é o total de observações
+        assert buckets == sorted(buckets)
+        assert buckets[-1] == s[("cclastrib_stage_seconds_count", f'stage="{stage}"')] >= 3
+        assert f'cclastrib_stage_seconds_bucket{{stage="{stage}",le="+Inf"}}' in r.text
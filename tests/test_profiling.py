@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.profiling import ProfilingConfig, install_profiling, profiled
+
+TOKEN = "segredo"
+
+
+def _app(**config):
+    app = FastAPI()
+    store = install_profiling(app, ProfilingConfig(enabled=True, token=TOKEN, **config))
+
+    @app.get("/lento")
+    @profiled
+    def lento():
+        return {"ok": True}
+
+    @app.get("/outro")
+    @profiled
+    def outro():
+        return {"ok": True}
+
+    @app.get("/sem-decorator")
+    def sem_decorator():
+        return {"ok": True}
+
+    return app, store
+
+
+ADMIN = {"authorization": f"Bearer {TOKEN}"}
+
+
+def test_sem_token_nao_instala(capsys):
+    assert install_profiling(FastAPI(), ProfilingConfig(enabled=True, sample_rate=1.0)) is None
+    assert "PROFILE_TOKEN" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("valor,perfis", [("1", 0), ("errado", 0), (TOKEN, 1)])
+def test_header_exige_token(valor, perfis):
+    app, store = _app()
+    TestClient(app).get("/lento", headers={"x-profile": valor})
+    assert len(store.list()) == perfis
+
+
+def test_filtro_de_path_vem_antes_do_header():
+    app, store = _app(paths=("/outro",))
+    c = TestClient(app)
+    c.get("/lento", headers={"x-profile": TOKEN})
+    assert store.list() == []
+    c.get("/outro", headers={"x-profile": TOKEN})
+    assert [r.path for r in store.list()] == ["/outro"]
+
+
+def test_paths_default_sao_os_endpoints_com_profiled():
+    app, store = _app(sample_rate=1.0)
+    c = TestClient(app)
+    for path in ("/sem-decorator", "/lento", "/outro"):
+        c.get(path)
+    assert sorted(r.path for r in store.list()) == ["/lento", "/outro"]
+
+
+def test_path_sem_profiled_avisa(capsys):
+    app, store = _app(sample_rate=1.0, paths=("/sem-decorator",))
+    TestClient(app).get("/sem-decorator")
+    assert store.list() == []
+    assert "/sem-decorator" in capsys.readouterr().err
+
+
+def test_admin_exige_token():
+    app, store = _app(sample_rate=1.0)
+    c = TestClient(app)
+    c.get("/lento")
+    (perfil,) = store.list()
+
+    for headers in ({}, {"authorization": "Bearer errado"}, {"x-profile": TOKEN}):
+        assert c.get("/admin/profiles", headers=headers).status_code == 401
+        assert c.get(f"/admin/profiles/{perfil.id}", headers=headers).status_code == 401
+        assert c.delete("/admin/profiles", headers=headers).status_code == 401
+    assert len(store.list()) == 1
+
+    assert [p["id"] for p in c.get("/admin/profiles", headers=ADMIN).json()] == [perfil.id]
+    r = c.get(f"/admin/profiles/{perfil.id}", headers=ADMIN)
+    assert r.status_code == 200 and r.content == perfil.data
+    assert c.delete("/admin/profiles", headers=ADMIN).status_code == 200
+    assert store.list() == []
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from app.records import BeneficioRow, CfopRow, NcmOficialRow, NcmRow, load_tables, read_records
+
+DATA = os.environ["DATA_DIR"]
+SPECS = {
+    "ncm_master": (os.path.join(DATA, "ncm_master.csv"), NcmRow),
+    "oficial": (os.path.join(DATA, "Tabela_NCM_Vigente_20251227.csv"), NcmOficialRow),
+    "cfop": (os.path.join(DATA, "cfop.csv"), CfopRow),
+    "beneficios": (os.path.join(DATA, "beneficios_anexos.csv"), BeneficioRow),
+    "inexistente": (os.path.join(DATA, "nao_existe.csv"), NcmRow),
+}
+
+OFICIAL_CSV = (
+    "Código;Descrição;Data Início;Data Fim\n"
+    "0101.21.00;-- Reprodutores de raça pura;01/04/2022;\n"
+    '0402.10.10;"Leite em pó; teor de gordura até 1,5 %";01/04/2022;31/12/2026\n'
+    "\n"
+    "1905.90.10;Pão de forma;01/04/2022;\n"
+)
+ESPERADO = [
+    NcmOficialRow("01012100", "-- Reprodutores de raça pura", date(2022, 4, 1), None),
+    NcmOficialRow("04021010", "Leite em pó; teor de gordura até 1,5 %", date(2022, 4, 1), date(2026, 12, 31)),
+    NcmOficialRow("19059010", "Pão de forma", date(2022, 4, 1), None),
+]
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 97, 100_000])
+def test_pool_igual_ao_sequencial(chunk_rows):
+    sequencial = load_tables(SPECS)
+    with ThreadPoolExecutor(4) as pool:
+        paralelo = load_tables(SPECS, pool, chunk_rows=chunk_rows)
+
+    assert list(paralelo) == list(sequencial)
+    for nome, rows in sequencial.items():
+        assert paralelo[nome] == rows, nome
+    assert len(sequencial["oficial"]) > 10_000 and sequencial["inexistente"] == []
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp1252"])
+def test_decodifica_utf8_e_cp1252(tmp_path, encoding):
+    # cp1252 não decodifica como utf-8: cai no fallback, sobre o mesmo buffer
+    path = tmp_path / "tabela.csv"
+    path.write_bytes(OFICIAL_CSV.encode(encoding))
+
+    assert read_records(str(path), NcmOficialRow) == ESPERADO
+    with ThreadPoolExecutor(2) as pool:
+        assert load_tables({"t": (str(path), NcmOficialRow)}, pool, chunk_rows=1)["t"] == ESPERADO
+
+
+def test_cabecalho_com_variantes_de_encoding(tmp_path):
+    # Tabela NCM gravada em cp850 e lida como cp1252: "C¢digo", "Descri‡Æo", "Data In¡cio"
+    path = tmp_path / "tabela.csv"
+    path.write_bytes(
+        "C¢digo;Descri‡Æo;Data In¡cio;Data Fim\n0101.21.00;Reprodutores;01/04/2022;\n".encode("cp1252")
+    )
+    assert read_records(str(path), NcmOficialRow) == [
+        NcmOficialRow("01012100", "Reprodutores", date(2022, 4, 1), None)
+    ]
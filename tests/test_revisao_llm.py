@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.prompt import ITENS_JSON
+from app.revisao_llm import StubBackend, revisor_from_env
+
+# confiança 1.0 (NCM do master, CFOP com regra) e 0.6 (NCM inexistente, CFOP sem regra)
+ALTA = {"ncm": "22021000", "cfop": "5102"}
+BAIXA = {"ncm": "99999999", "cfop": "5949"}
+
+
+def _lote(*itens, deitem=None):
+    return {
+        "ano_emissao": 2027,
+        "regime_fiscal_emitente": "RPA",
+        "uf_emitente": "SP",
+        "uf_destinatario": "SP",
+        "itens": [
+            {"item": n, "deitem": deitem, "cst_icms": "000", "produzido_zfm": "N", **i}
+            for n, i in enumerate(itens, 1)
+        ],
+    }
+
+
+class StubGravado(StubBackend):
+    """StubBackend que guarda os contextos de cada prompt recebido."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    async def completar(self, system, user):
+        self.prompts.append([i["contexto"] for i in json.loads(user.split(ITENS_JSON, 1)[1])])
+        return await super().completar(system, user)
+
+
+class StubQuebrado(StubBackend):
+    def __init__(self, resposta):
+        super().__init__()
+        self.resposta = resposta
+
+    async def completar(self, system, user):
+        self.chamadas += 1
+        return self.resposta
+
+
+@pytest.fixture
+def revisor(agent, monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm.sqlite"))
+    rev = revisor_from_env()
+    assert isinstance(rev.backend, StubBackend)
+    monkeypatch.setattr(agent, "revisor", rev)
+    return rev
+
+
+def _revisar(client, lote):
+    r = client.post("/classificar-lote", params={"revisao_llm": "true"}, json=lote)
+    assert r.status_code == 200, r.text
+    return [i["resultado"] for i in r.json()["itens"]]
+
+
+def test_so_itens_abaixo_do_limiar_vao_ao_modelo(client, revisor, monkeypatch):
+    backend = StubGravado()
+    monkeypatch.setattr(revisor, "backend", backend)
+
+    alta, baixa = _revisar(client, _lote(ALTA, BAIXA, deitem="limiar"))
+
+    assert alta["confianca"] >= revisor.limiar and alta["revisao_llm"] is None
+    assert baixa["confianca"] < revisor.limiar
+    assert baixa["revisao_llm"]["origem"] == "modelo"
+    assert baixa["revisao_llm"]["backend"] == "stub"
+    enviados = [ctx for prompt in backend.prompts for ctx in prompt]
+    assert [ctx["ncm"] for ctx in enviados] == [BAIXA["ncm"]]
+
+
+def test_itens_repetidos_viram_uma_entrada_no_prompt(client, revisor, monkeypatch):
+    backend = StubGravado()
+    monkeypatch.setattr(revisor, "backend", backend)
+
+    resultados = _revisar(client, _lote(BAIXA, BAIXA, BAIXA, deitem="repetido"))
+
+    assert backend.chamadas == 1
+    assert len(backend.prompts[0]) == 1
+    assert all(r["revisao_llm"]["origem"] == "modelo" for r in resultados)
+
+
+def test_segunda_chamada_vem_do_cache(client, revisor):
+    lote = _lote(BAIXA, deitem="cache")
+    primeira = _revisar(client, lote)
+    chamadas = revisor.backend.chamadas
+    segunda = _revisar(client, lote)
+
+    assert primeira[0]["revisao_llm"]["origem"] == "modelo"
+    assert segunda[0]["revisao_llm"]["origem"] == "cache"
+    assert revisor.backend.chamadas == chamadas
+    sem_origem = lambda r: {k: v for k, v in r["revisao_llm"].items() if k != "origem"}  # noqa: E731
+    assert sem_origem(segunda[0]) == sem_origem(primeira[0])
+
+
+@pytest.mark.parametrize("resposta", [
+    "isto não é JSON",
+    '{"itens": [{"id": "1", "cclastrib": "sem codigo"}]}',
+    '{"resultado": []}',
+])
+def test_json_invalido_do_modelo_deixa_item_sem_revisao(client, revisor, monkeypatch, resposta):
+    backend = StubQuebrado(resposta)
+    monkeypatch.setattr(revisor, "backend", backend)
+
+    resultados = _revisar(client, _lote(BAIXA, ALTA, deitem="quebrado"))
+
+    assert backend.chamadas == 1
+    assert all(r["revisao_llm"] is None for r in resultados)
+    # nada foi para o cache: a próxima chamada tenta o modelo de novo
+    _revisar(client, _lote(BAIXA, ALTA, deitem="quebrado"))
+    assert backend.chamadas == 2
+
+
+def test_revisao_sem_backend_400(client, agent, monkeypatch):
+    monkeypatch.setattr(agent, "revisor", None)
+    r = client.post("/classificar-lote", params={"revisao_llm": "true"}, json=_lote(BAIXA))
+    assert r.status_code == 400
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import pytest
+
+from app import serialization
+from app.serialization import choose_encoding, compact_dump, prune_empty
+
+LOTE = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "itens": [
+        {"item": i, "ncm": "22021000", "valor_item": 10.0 * i, "cst_icms": "000", "cfop": "5102", "produzido_zfm": "N"}
+        for i in range(1, 11)
+    ],
+}
+
+
+@pytest.mark.parametrize("accept_encoding,esperado", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip;q=1, br;q=0.5", "gzip"),
+    ("*", "br"),
+    ("br;q=0, *", "gzip"),
+    ("gzip;q=0, *", "br"),
+    ("br;q=0, gzip;q=0, *", None),
+    ("br;level=5;q=0, gzip", "gzip"),
+    ("br; Q=0 , gzip;q=0.2", "gzip"),
+    ("gzip;q=abc", "gzip"),
+])
+def test_choose_encoding(monkeypatch, accept_encoding, esperado):
+    # com o pacote brotli "instalado": choose_encoding só consulta se ele existe
+    monkeypatch.setattr(serialization, "brotli", object())
+    assert choose_encoding(accept_encoding) == esperado
+
+
+@pytest.mark.parametrize("accept_encoding,esperado", [
+    ("br", None),
+    ("*", "gzip"),
+    ("gzip;q=0, *", None),
+    ("br, gzip;q=0.1", "gzip"),
+])
+def test_choose_encoding_sem_brotli(monkeypatch, accept_encoding, esperado):
+    monkeypatch.setattr(serialization, "brotli", None)
+    assert choose_encoding(accept_encoding) == esperado
+
+
+def test_prune_empty():
+    assert prune_empty({"a": None, "b": {"c": None}, "d": [{"e": None, "f": 1}], "g": 0, "h": ""}) == \
+        {"d": [{"f": 1}], "g": 0, "h": ""}
+
+
+def _contido(compacto, completo):
+    # tudo que o modo compacto devolve está igual na resposta completa
+    if isinstance(compacto, dict):
+        return all(k in completo and _contido(v, completo[k]) for k, v in compacto.items())
+    if isinstance(compacto, list):
+        return len(compacto) == len(completo) and all(_contido(a, b) for a, b in zip(compacto, completo))
+    return compacto == completo
+
+
+def _sem_vazios(valor):
+    if isinstance(valor, dict):
+        return bool(valor) and all(v is not None and _sem_vazios(v) for v in valor.values())
+    if isinstance(valor, list):
+        return all(_sem_vazios(v) for v in valor)
+    return True
+
+
+def test_compacto_e_subconjunto_da_resposta_completa(client):
+    completo = client.post("/classificar-lote", json=LOTE).json()
+    r = client.post("/classificar-lote", params={"compacto": "true"}, json=LOTE)
+    assert r.status_code == 200
+    compacto = r.json()
+
+    assert _contido(compacto, completo)
+    assert _sem_vazios(compacto)
+    item = compacto["itens"][0]["resultado"]
+    assert "gMono" not in item["xml"]["totais"]["ibscbsTot"]
+    assert item["cclass_trib"] == completo["itens"][0]["resultado"]["cclass_trib"]
+    assert len(r.content) < len(client.post("/classificar-lote", json=LOTE).content)
+
+
+@pytest.mark.parametrize("accept_encoding,esperado", [
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0, *", None if serialization.brotli is None else "br"),
+    ("br;level=5;q=0, gzip;q=0", None),
+])
+def test_compacto_comprimido(client, accept_encoding, esperado):
+    ref = client.post("/classificar-lote", params={"compacto": "true"}, json=LOTE, headers={"accept-encoding": "identity"})
+    r = client.post("/classificar-lote", params={"compacto": "true"}, json=LOTE, headers={"accept-encoding": accept_encoding})
+
+    assert len(ref.content) >= serialization.COMPRESS_MIN_BYTES
+    assert "content-encoding" not in ref.headers
+    assert r.headers.get("content-encoding") == esperado
+    assert "Accept-Encoding" in r.headers["vary"]
+    # o httpx descomprime: o corpo é o mesmo JSON compacto
+    assert r.json() == ref.json()
+
+
+def test_compact_dump_usa_alias(agent):
+    from app.schemas import ClassifyLoteRequest
+
+    resp = agent.handle_lote(ClassifyLoteRequest(**{**LOTE, "itens": [{**LOTE["itens"][0], "quantidade": 3}]}))
+    data = compact_dump(resp)
+    assert data["itens"][0]["qtde"] == 3 and "quantidade" not in data["itens"][0]
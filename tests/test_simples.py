@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import pytest
+
+OPERACAO = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "SN",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "cst_icms": "102",
+    "ncm": "22021000",
+    "anexo_simples": "I",
+}
+LOTE = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "SN",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "anexo_simples": "I",
+    "itens": [{"item": 1, "ncm": "22021000", "cst_icms": "102", "cfop": "5102", "produzido_zfm": "N"}],
+}
+
+
+@pytest.mark.parametrize("path,corpo", [
+    ("/classificar", {**OPERACAO, "rbt12": -5}),
+    ("/classificar-lote", {**LOTE, "rbt12": -5}),
+    ("/simular", {**LOTE, "rbt12": -5, "ano_inicio": 2027, "ano_fim": 2027}),
+    ("/simples/carteira", {"ano": 2027, "empresas": [{"anexo": "I", "rbt12": -5}]}),
+])
+def test_rbt12_negativo_422(client, path, corpo):
+    r = client.post(path, json=corpo)
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"][-1] == "rbt12"
+
+
+def test_rbt12_zero_aceito(client):
+    r = client.post("/simples/carteira", json={"ano": 2027, "empresas": [{"anexo": "I", "rbt12": 0}]})
+    assert r.status_code == 200
+    assert r.json()["empresas"][0]["resultado"]["faixa"] == 1
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+
+from app import metrics
+
+ANOS = list(range(2026, 2034))
+NCMS = ["22021000", "07019000", "85235110", "24022000", "30049069"]
+
+
+def _lote(regime, **extra):
+    return {
+        "regime_fiscal_emitente": regime,
+        "uf_emitente": "SP",
+        "uf_destinatario": "RJ",
+        "itens": [
+            {"item": i, "ncm": ncm, "valor_item": 123.45 * i, "cst_icms": "000", "cfop": "6102", "produzido_zfm": "N"}
+            for i, ncm in enumerate(NCMS, start=1)
+        ],
+        **extra,
+    }
+
+
+def _classificar(client, lote, item, ano):
+    corpo = {
+        k: v for k, v in lote.items() if k not in ("itens", "ano_inicio", "ano_fim")
+    }
+    corpo.update({k: item[k] for k in ("ncm", "valor_item", "cst_icms", "cfop", "produzido_zfm")}, ano_emissao=ano)
+    r = client.post("/classificar", json=corpo)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.mark.parametrize("lote", [
+    _lote("RPA"),
+    _lote("SN", anexo_simples="I", rbt12=450000.0),
+])
+def test_matriz_igual_ao_classificar_por_ano(client, lote):
+    r = client.post("/simular", json={**lote, "ano_inicio": ANOS[0], "ano_fim": ANOS[-1]})
+    assert r.status_code == 200, r.text
+    sim = r.json()
+
+    assert sim["anos"] == ANOS
+    for a, ano in enumerate(ANOS):
+        for i, item in enumerate(lote["itens"]):
+            cel = sim["matriz"][a][i]
+            res = _classificar(client, lote, item, ano)
+            gibscbs = res["xml"]["imposto"]["ibscbs"]["gIBSCBS"]
+
+            assert (ano, item["ncm"], cel["aliquota_ibs"], cel["aliquota_cbs"]) == \
+                (ano, item["ncm"], res["ibs"]["aliquota"], res["cbs"]["aliquota"])
+            assert (cel["valor_ibs"], cel["valor_cbs"]) == (gibscbs["vIBS"], gibscbs["gCBS"]["vCBS"])
+            assert cel["total_tributos"] == pytest.approx(res["total_debito"])
+            assert cel["aplicar_is"] == (res["xml"]["imposto"]["isel"] is not None)
+            efetiva = res["simples"]["aliquota_efetiva"] if res.get("simples") else None
+            assert cel["aliquota_efetiva_simples"] == efetiva
+            if a == 0:
+                assert sim["itens"][i]["cclass_trib"] == res["cclass_trib"]
+                assert sim["itens"][i]["cst_ibs_cbs"] == res["cst_ibs_cbs"]
+
+
+def test_simular_tem_serie_propria_no_histograma_de_lote(client):
+    antes = metrics.LOTE_ITENS._series.get(("/simular",), [None, 0.0, 0])[2]
+    r = client.post("/simular", json={**_lote("RPA"), "ano_inicio": 2027, "ano_fim": 2027})
+    assert r.status_code == 200
+
+    assert metrics.LOTE_ITENS._series[("/simular",)][2] == antes + 1
+    assert 'cclastrib_lote_itens_count{rota="/simular"}' in client.get("/metrics").text
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from app import fiscal_conversao, rules
+from app.agent import CClastribAgent
+from app.schemas import ClassifyRequest
+
+SOB_DEMANDA = {"ncm_oficial", "ncm_oficial_idx", "ncm_busca", "anexos_models", "conversao", "ncm_sugestor"}
+N = 8
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    monkeypatch.delenv("LOAD_EAGER", raising=False)
+    return rules.load_sources(os.environ["DATA_DIR"], workers=1)
+
+
+def test_campos_sob_demanda_so_carregam_no_primeiro_acesso(sources):
+    assert set(sources.pendentes()) == SOB_DEMANDA
+
+    # NCM do master: o /classificar não precisa da Tabela NCM nem do resto
+    req = ClassifyRequest(
+        ano_emissao=2027, regime_fiscal_emitente="RPA", cfop="5102",
+        uf_emitente="SP", uf_destinatario="SP", cst_icms="000", ncm="22021000",
+    )
+    rules.classify(sources, data_emissao=date(2027, 1, 1), **CClastribAgent._classify_args(req))
+    assert set(sources.pendentes()) == SOB_DEMANDA
+
+    assert sources.conversao is not None
+    assert set(sources.pendentes()) == SOB_DEMANDA - {"conversao"}
+
+    # índice e tabela compartilham a mesma Carga da Tabela NCM
+    assert sources.ncm_oficial_idx
+    assert set(sources.pendentes()) == SOB_DEMANDA - {"conversao", "ncm_oficial_idx", "ncm_oficial"}
+
+    assert sources.materializar().pendentes() == []
+
+
+def test_primeiro_acesso_concorrente_carrega_uma_vez(monkeypatch):
+    monkeypatch.delenv("LOAD_EAGER", raising=False)
+    cargas = []
+    original = fiscal_conversao.load_conversao
+
+    def lenta(*args):
+        cargas.append(threading.get_ident())
+        time.sleep(0.2)
+        return original(*args)
+
+    monkeypatch.setattr(fiscal_conversao, "load_conversao", lenta)
+    sources = rules.load_sources(os.environ["DATA_DIR"], workers=1)
+    assert cargas == []
+
+    barreira = threading.Barrier(N)
+
+    def acessar():
+        barreira.wait()
+        return sources.conversao
+
+    with ThreadPoolExecutor(N) as pool:
+        engines = [f.result() for f in [pool.submit(acessar) for _ in range(N)]]
+
+    assert len(cargas) == 1
+    assert all(e is engines[0] for e in engines)
+    assert "conversao" not in sources.pendentes()
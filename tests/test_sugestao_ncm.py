@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pytest
+
+LOTE = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "sugerir_ncm": True,
+    "itens": [
+        {"item": 1, "deitem": "Refrigerante de cola lata 350ml", "ncm": "22021000",
+         "cst_icms": "000", "cfop": "5102", "produzido_zfm": "N"},
+    ],
+}
+
+
+def test_sugerir_ncm_sem_motor_400(client, agent, monkeypatch):
+    # sem numpy o SugestorNcm.build devolve None
+    monkeypatch.setitem(agent._sources.__dict__, "_ncm_sugestor", None)
+    r = client.post("/classificar-lote", json=LOTE)
+    assert r.status_code == 400
+    assert "numpy" in r.json()["detail"]
+
+    # sem sugerir_ncm o lote segue normal
+    assert client.post("/classificar-lote", json={**LOTE, "sugerir_ncm": False}).status_code == 200
+
+
+def test_sugerir_ncm_com_motor(client):
+    pytest.importorskip("numpy")
+    r = client.post("/classificar-lote", json=LOTE)
+    assert r.status_code == 200
+    sugestao = r.json()["itens"][0]["sugestao_ncm"]
+    assert sugestao is not None and sugestao["candidatos"]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app import metrics
+from app.schemas import ClassifyRequest
+from app.trilha import TrilhaAuditoria, TrilhaConfig
+
+OPERACAO = {
+    "ano_emissao": 2027,
+    "regime_fiscal_emitente": "RPA",
+    "cfop": "5102",
+    "uf_emitente": "SP",
+    "uf_destinatario": "SP",
+    "cst_icms": "000",
+}
+NCMS = ["22021000", "07019000", "85235110", "30049069", "10063021"]
+
+
+@pytest.fixture(scope="module")
+def decisoes(agent):
+    reqs = [ClassifyRequest(**OPERACAO, ncm=ncm) for ncm in NCMS]
+    return [(req, agent.handle(req)) for req in reqs]
+
+
+def _registrar(trilha, decisoes):
+    for req, resp in decisoes:
+        trilha.registrar(req, resp, "classificada")
+    trilha.parar()
+
+
+def _confere(registros, decisoes):
+    assert [r["entrada"]["ncm"] for r in registros] == NCMS
+    for r, (_, resp) in zip(registros, decisoes):
+        assert (r["versao_dados"], r["origem"]) == ("v1", "classificada")
+        assert (r["cclastrib"], r["cclass_trib"]) == (resp.cclastrib.codigo, resp.cclass_trib)
+        assert r["aliquota_ibs"] == resp.ibs.aliquota and r["fundamentos"]
+
+
+def test_drena_em_lotes_para_ndjson_gz(tmp_path, decisoes):
+    trilha = TrilhaAuditoria(TrilhaConfig(destino=str(tmp_path), lote=2, flush_s=0.01), versao_dados="v1")
+    _registrar(trilha, decisoes)
+
+    arquivos = sorted(os.listdir(tmp_path))
+    assert arquivos and all(a.startswith("decisoes-") and a.endswith(".ndjson.gz") for a in arquivos)
+    registros = []
+    for a in arquivos:
+        with gzip.open(tmp_path / a, "rt", encoding="utf-8") as f:
+            registros.extend(json.loads(linha) for linha in f)
+    _confere(registros, decisoes)
+    assert (trilha.gravadas, trilha.descartadas) == (len(NCMS), 0)
+
+
+def test_drena_para_sqlite(tmp_path, decisoes):
+    path = tmp_path / "trilha.sqlite"
+    trilha = TrilhaAuditoria(TrilhaConfig(destino=str(path), lote=2, flush_s=0.01), versao_dados="v1")
+    _registrar(trilha, decisoes)
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT versao_dados, cclastrib, registro FROM decisoes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    assert [(v, c) for v, c, _ in rows] == [("v1", resp.cclastrib.codigo) for _, resp in decisoes]
+    _confere([json.loads(r) for _, _, r in rows], decisoes)
+    assert trilha.gravadas == len(NCMS)
+
+
+def test_fila_cheia_descarta_e_conta(tmp_path, decisoes):
+    # flush longo: nada é drenado até o parar()
+    trilha = TrilhaAuditoria(TrilhaConfig(destino=str(tmp_path), fila_max=2, flush_s=60), versao_dados="v1")
+    antes = metrics.TRILHA_TOTAL.value("descartada")
+
+    _registrar(trilha, decisoes)
+
+    assert (trilha.gravadas, trilha.descartadas) == (2, len(NCMS) - 2)
+    assert metrics.TRILHA_TOTAL.value("descartada") == antes + len(NCMS) - 2